@@ -0,0 +1,15 @@
+from django import forms
+
+from crm.lookups import LazyModelChoiceField
+
+from .models import Advertising
+
+
+class AdvertisingForm(forms.ModelForm):
+    """Form for creating and updating the advertising."""
+
+    product = LazyModelChoiceField("services", help_text="advertised service")
+
+    class Meta:
+        model = Advertising
+        fields = "name", "channel", "budget", "product"
@@ -1,3 +1,7 @@
+from decimal import Decimal
+from typing import Any
+
+from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
 from services.models import Service
 
@@ -24,3 +28,26 @@ class Advertising(models.Model):
 
     def __str__(self) -> str:
         return f"{self.name} - {self.product.name} ({self.pk})"
+
+    def _funnel(self, field: str, default: Any) -> Any:
+        # The counters live in the CampaignStats rollup of my_statistics,
+        # select_related("stats") reads them with the campaign itself
+        try:
+            return getattr(self.stats, field)
+        except ObjectDoesNotExist:
+            return default
+
+    @property
+    def leads_count(self) -> int:
+        """Number of leads from the campaign."""
+        return self._funnel("leads_count", 0)
+
+    @property
+    def customers_count(self) -> int:
+        """Number of leads from the campaign who became customers."""
+        return self._funnel("customers_count", 0)
+
+    @property
+    def revenue(self) -> Decimal:
+        """Total cost of the contracts of the campaign customers."""
+        return self._funnel("income", Decimal(0))
@@ -1,5 +1,7 @@
 import random
+from decimal import Decimal
 
+from clients.factories import LeadFactory
 from django.contrib.auth.models import Group, User
 from django.test import TestCase
 from django.urls import reverse
@@ -9,6 +11,7 @@ from services.factories import ServiceFactory
 
 from .factories import AdvertisingFactory
 from .models import Advertising
+from .views import AdvertisingDetailView
 
 
 class AdvertisingListViewTest(TestCase):
@@ -77,6 +80,16 @@ class AdvertisingDetailViewTest(TestCase):
 
         self.assertEqual(response.status_code, 200)
 
+    def test_funnel_is_read_with_the_ads(self):
+        """Test that the funnel counters come from the rollup without queries."""
+        LeadFactory.create(ads=self.ads)
+        ads = AdvertisingDetailView.queryset.get(pk=self.ads.pk)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(ads.leads_count, 1)
+            self.assertEqual(ads.customers_count, 0)
+            self.assertEqual(ads.revenue, Decimal(0))
+
 
 class AdsCreateViewTest(TestCase):
     """Test case class for testing AdvertisingCreateView."""
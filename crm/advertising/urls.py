@@ -6,6 +6,7 @@ from .views import (
     AdvertisingDetailView,
     AdvertisingListView,
     AdvertisingUpdateView,
+    export_advertising,
 )
 
 app_name = "advertising"
@@ -13,6 +14,7 @@ app_name = "advertising"
 urlpatterns = [
     path("ads/", AdvertisingListView.as_view(), name="ads_list"),
     path("ads/new/", AdvertisingCreateView.as_view(), name="ads_create"),
+    path("ads/export/", export_advertising, name="ads_export"),
     path("ads/<int:pk>/", AdvertisingDetailView.as_view(), name="ads_detail"),
     path("ads/<int:pk>/edit/", AdvertisingUpdateView.as_view(), name="ads_update"),
     path("ads/<int:pk>/delete/", AdvertisingDeleteView.as_view(), name="ads_delete"),
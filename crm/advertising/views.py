@@ -1,4 +1,6 @@
+from django.contrib.auth.decorators import permission_required
 from django.contrib.auth.mixins import PermissionRequiredMixin
+from django.http import HttpRequest, HttpResponse
 from django.urls import reverse, reverse_lazy
 from django.views.generic import (
     CreateView,
@@ -8,14 +10,29 @@ from django.views.generic import (
     UpdateView,
 )
 
+from crm.exports import export_response, queryset_rows
+
+from .forms import AdvertisingForm
 from .models import Advertising
 
+# Column of the export -> lookup
+ADS_EXPORT_COLUMNS = {
+    "id": "pk",
+    "name": "name",
+    "channel": "channel",
+    "budget": "budget",
+    "product": "product__name",
+    "leads_count": "stats__leads_count",
+    "customers_count": "stats__customers_count",
+    "revenue": "stats__income",
+}
+
 
 class AdvertisingListView(PermissionRequiredMixin, ListView):
     """ListView class for getting list of advertising."""
 
     template_name = "advertising/ads-list.html"
-    queryset = Advertising.objects.select_related("product")
+    queryset = Advertising.objects.select_related("product", "stats")
     context_object_name = "ads"
     permission_required = ("advertising.view_advertising",)
 
@@ -24,7 +41,7 @@ class AdvertisingDetailView(PermissionRequiredMixin, DetailView):
     """DetailView class for getting details about the advertising."""
 
     template_name = "advertising/ads-detail.html"
-    queryset = Advertising.objects.select_related("product")
+    queryset = Advertising.objects.select_related("product", "stats")
     permission_required = ("advertising.view_advertising",)
 
 
@@ -33,7 +50,7 @@ class AdvertisingUpdateView(PermissionRequiredMixin, UpdateView):
 
     template_name = "advertising/ads-edit.html"
     model = Advertising
-    fields = "name", "channel", "budget", "product"
+    form_class = AdvertisingForm
     permission_required = ("advertising.change_advertising",)
 
     def get_success_url(self):
@@ -54,6 +71,15 @@ class AdvertisingCreateView(PermissionRequiredMixin, CreateView):
 
     template_name = "advertising/ads-create.html"
     model = Advertising
-    fields = "name", "channel", "budget", "product"
+    form_class = AdvertisingForm
     success_url = reverse_lazy("advertising:ads_list")
     permission_required = ("advertising.add_advertising",)
+
+
+@permission_required("advertising.view_advertising")
+def export_advertising(request: HttpRequest) -> HttpResponse:
+    """View func streaming the advertising with its funnel as CSV or NDJSON."""
+    rows = queryset_rows(
+        Advertising.objects.order_by("pk"), list(ADS_EXPORT_COLUMNS.values())
+    )
+    return export_response(request, "advertising", list(ADS_EXPORT_COLUMNS), rows)
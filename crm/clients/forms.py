@@ -1,13 +1,14 @@
 from datetime import date
 from typing import Any, Dict, List, Optional, Tuple
 
-from advertising.models import Advertising
+from contracts.forms import DocumentUploadForm
 from contracts.models import Contract
 from django import forms
 from django.forms import ValidationError
-from services.models import Service
 
-from .models import validate_phone_format
+from crm.lookups import LazyModelChoiceField
+
+from .models import Lead, validate_phone_format
 from .validators import (
     validate_unique_contract_name,
     validate_unique_email,
@@ -15,11 +16,26 @@ from .validators import (
 )
 
 
-class CustomerBaseForm(forms.Form):
+class LeadForm(forms.ModelForm):
+    """Form for creating and updating the lead."""
+
+    ads = LazyModelChoiceField(
+        "advertising",
+        help_text="the advertising campaign from which the"
+        " lead learned about the service",
+    )
+
+    class Meta:
+        model = Lead
+        fields = "first_name", "last_name", "phone", "email", "ads"
+
+
+class CustomerBaseForm(DocumentUploadForm):
     """
     Base form class for customers.
 
     The form is used to create an active client from a potential one.
+    The contract document is the doc file or a chunked upload.
     """
 
     first_name = forms.CharField(max_length=100, required=True, widget=forms.TextInput)
@@ -31,8 +47,8 @@ class CustomerBaseForm(forms.Form):
         widget=forms.TextInput,
     )
     email = forms.EmailField(widget=forms.EmailInput)
-    ads = forms.ModelChoiceField(
-        queryset=Advertising.objects.all(),
+    ads = LazyModelChoiceField(
+        "advertising",
         help_text="the advertising campaign from which the"
         " lead learned about the service",
     )
@@ -43,8 +59,8 @@ class CustomerBaseForm(forms.Form):
         widget=forms.TextInput,
         validators=[validate_unique_contract_name],
     )
-    product = forms.ModelChoiceField(
-        queryset=Service.objects.all(),
+    product = LazyModelChoiceField(
+        "services",
         help_text="the service provided",
     )
     doc = forms.FileField(
@@ -72,10 +88,12 @@ class CustomerBaseForm(forms.Form):
         contract_data = {
             "name": self.cleaned_data["name"],
             "product": self.cleaned_data["product"],
-            "doc": self.cleaned_data["doc"],
             "end_date": self.cleaned_data["end_date"],
             "cost": self.cleaned_data["cost"],
         }
+        # Without the file the document comes from the upload (see save_upload)
+        if self.cleaned_data["doc"]:
+            contract_data["doc"] = self.cleaned_data["doc"]
         return lead_data, contract_data
 
     def clean(self):
@@ -0,0 +1,270 @@
+"""
+Streaming import of leads from CSV and NDJSON exports of ad platforms.
+
+The file is processed by a pipeline of generators, so only one batch
+of rows is held in memory: records are read, turned into validated Lead
+objects, grouped into batches, checked for uniqueness of phone and email
+with two queries per batch and inserted with COPY (or bulk_create).
+"""
+
+import csv
+import json
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from io import StringIO
+from itertools import islice
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from advertising.models import Advertising
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, connection, transaction
+from my_statistics.business.statistics_cache import bump_table_version
+from my_statistics.signals import bump_campaign_stats
+
+from .models import Lead, validate_phone_format
+
+LEAD_FIELDS: Tuple[str, ...] = ("first_name", "last_name", "phone", "email", "ads")
+
+
+@dataclass
+class LeadRow:
+    """A record of the imported file and the lead built from it."""
+
+    line: int
+    record: Dict[str, Any]
+    lead: Optional[Lead] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class ImportStats:
+    """Counters of the import."""
+
+    read: int = 0
+    imported: int = 0
+    rejected: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def rows_per_second(self) -> float:
+        elapsed: float = time.monotonic() - self.started
+        return self.read / elapsed if elapsed else 0.0
+
+
+def read_records(file: IO[str], file_format: str) -> Iterator[Tuple[int, Any]]:
+    """Yield (line number, record) from a CSV file with a header or NDJSON."""
+    if file_format == "csv":
+        reader = csv.DictReader(file)
+        for record in reader:
+            yield reader.line_num, record
+    elif file_format == "ndjson":
+        for line_num, line in enumerate(file, start=1):
+            if line.strip():
+                try:
+                    yield line_num, json.loads(line)
+                except ValueError as exc:
+                    yield line_num, {"_error": f"invalid JSON: {exc}"}
+    else:
+        raise ValueError(f"Unknown format {file_format}")
+
+
+def load_ads_map() -> Dict[str, Optional[int]]:
+    """
+    Map advertising references (pk or name) to advertising pk.
+
+    A name shared by several campaigns maps to None and is rejected
+    as ambiguous.
+    """
+    ads_map: Dict[str, Optional[int]] = dict()
+    for pk, name in Advertising.objects.values_list("pk", "name").iterator():
+        ads_map[str(pk)] = pk
+        ads_map[name] = None if name in ads_map else pk
+    return ads_map
+
+
+def build_leads(
+    records: Iterable[Tuple[int, Any]], ads_map: Dict[str, Optional[int]]
+) -> Iterator[LeadRow]:
+    """Validate the records and build unsaved leads from them."""
+    for line, record in records:
+        row = LeadRow(line=line, record=record)
+        if not isinstance(record, dict):
+            row.error = "record is not an object"
+        elif "_error" in record:
+            row.error = record["_error"]
+        else:
+            row.error = _validate_record(record, ads_map)
+        if row.error is None:
+            ads_ref = str(record.get("ads") or "").strip()
+            row.lead = Lead(
+                first_name=record["first_name"].strip(),
+                last_name=record["last_name"].strip(),
+                phone=record["phone"].strip(),
+                email=record["email"].strip(),
+                ads_id=ads_map[ads_ref] if ads_ref else None,
+            )
+        yield row
+
+
+def _validate_record(
+    record: Dict[str, Any], ads_map: Dict[str, Optional[int]]
+) -> Optional[str]:
+    """Return the reason to reject the record or None if it is valid."""
+    for name in ("first_name", "last_name", "phone", "email"):
+        value = record.get(name)
+        if not isinstance(value, str) or not value.strip():
+            return f"{name} must be a non-empty string"
+        if len(value.strip()) > Lead._meta.get_field(name).max_length:
+            return f"{name} is too long"
+    try:
+        validate_phone_format(record["phone"].strip())
+        validate_email(record["email"].strip())
+    except ValidationError as exc:
+        return " ".join(exc.messages)
+
+    ads_ref = str(record.get("ads") or "").strip()
+    if ads_ref and ads_ref not in ads_map:
+        return f"unknown advertising {ads_ref}"
+    if ads_ref and ads_map[ads_ref] is None:
+        return f"ambiguous advertising {ads_ref}"
+    return None
+
+
+def batched(rows: Iterable[LeadRow], size: int) -> Iterator[List[LeadRow]]:
+    iterator = iter(rows)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def copy_leads(leads: List[Lead]) -> None:
+    """Insert the leads with COPY FROM STDIN."""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    for lead in leads:
+        # An unquoted empty value is NULL in the CSV format of COPY
+        writer.writerow(
+            [lead.first_name, lead.last_name, lead.phone, lead.email, lead.ads_id]
+        )
+    buffer.seek(0)
+
+    sql = (
+        f"COPY {Lead._meta.db_table} (first_name, last_name, phone, email, ads_id)"
+        " FROM STDIN WITH (FORMAT csv)"
+    )
+    with connection.cursor() as cursor:
+        if hasattr(cursor, "copy_expert"):  # psycopg2
+            cursor.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+
+class LeadImporter:
+    """Import leads batch by batch and report the rejected rows."""
+
+    def __init__(
+        self,
+        rejects: IO[str],
+        batch_size: int = 5000,
+        use_copy: bool = True,
+    ) -> None:
+        self.batch_size = batch_size
+        self.use_copy = use_copy
+        self.stats = ImportStats()
+        self.rejects = csv.writer(rejects)
+        self.rejects.writerow(["line", "error", *LEAD_FIELDS])
+        # phones and emails already imported from the file
+        self.seen_phones: Set[str] = set()
+        self.seen_emails: Set[str] = set()
+
+    def run(self, records: Iterable[Tuple[int, Any]]) -> Iterator[ImportStats]:
+        """Import the records, yielding the stats after every batch."""
+        rows = build_leads(records, load_ads_map())
+        for batch in batched(rows, self.batch_size):
+            self.import_batch(batch)
+            yield self.stats
+
+    def import_batch(self, batch: List[LeadRow]) -> None:
+        self.stats.read += len(batch)
+        for row in batch:
+            if row.error is not None:
+                self.reject(row)
+
+        valid: List[LeadRow] = [row for row in batch if row.error is None]
+        for attempt in range(2):
+            leads: List[Lead] = self.filter_unique(valid)
+            try:
+                with transaction.atomic():
+                    self.insert(leads)
+            except IntegrityError:
+                # A concurrent writer took some of the phones or emails
+                # after the check, check the batch once more
+                if attempt:
+                    raise
+            else:
+                break
+
+        for lead in leads:
+            self.seen_phones.add(lead.phone)
+            self.seen_emails.add(lead.email)
+        for row in valid:
+            if row.error is not None:
+                self.reject(row)
+        self.stats.imported += len(leads)
+
+    def filter_unique(self, rows: List[LeadRow]) -> List[Lead]:
+        """
+        Mark the rows duplicating a phone or an email as rejected.
+
+        :return: Leads of the remaining rows.
+        """
+        phones: Set[str] = {row.lead.phone for row in rows if row.lead}
+        emails: Set[str] = {row.lead.email for row in rows if row.lead}
+        taken_phones: Set[str] = set(
+            Lead.objects.filter(phone__in=phones).values_list("phone", flat=True)
+        )
+        taken_emails: Set[str] = set(
+            Lead.objects.filter(email__in=emails).values_list("email", flat=True)
+        )
+        taken_phones |= self.seen_phones
+        taken_emails |= self.seen_emails
+
+        leads: List[Lead] = []
+        batch_phones: Set[str] = set()
+        batch_emails: Set[str] = set()
+        for row in rows:
+            row.error = None
+            lead = row.lead
+            if lead is None:
+                continue
+            if lead.phone in taken_phones or lead.phone in batch_phones:
+                row.error = "phone already exists"
+            elif lead.email in taken_emails or lead.email in batch_emails:
+                row.error = "email already exists"
+            else:
+                batch_phones.add(lead.phone)
+                batch_emails.add(lead.email)
+                leads.append(lead)
+        return leads
+
+    def insert(self, leads: List[Lead]) -> None:
+        if not leads:
+            return
+        if self.use_copy:
+            copy_leads(leads)
+        else:
+            Lead.objects.bulk_create(leads, batch_size=self.batch_size)
+
+        # Bulk inserts do not send signals, so update the statistics here
+        for ads_id, count in Counter(lead.ads_id for lead in leads).items():
+            bump_campaign_stats(ads_id, leads=count, create=True)
+        transaction.on_commit(lambda: bump_table_version(Lead))
+
+    def reject(self, row: LeadRow) -> None:
+        self.stats.rejected += 1
+        record = row.record if isinstance(row.record, dict) else {}
+        self.rejects.writerow(
+            [row.line, row.error, *(record.get(name, "") for name in LEAD_FIELDS)]
+        )
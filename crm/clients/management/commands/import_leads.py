@@ -0,0 +1,67 @@
+from pathlib import Path
+
+from clients.lead_import import LeadImporter, read_records
+from django.core.management import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Import leads from a CSV (with a header) or NDJSON file with the fields "
+        "first_name, last_name, phone, email and ads (advertising pk or name). "
+        "Rejected rows are written to a side CSV file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=Path, help="File with leads")
+        parser.add_argument(
+            "--format",
+            choices=("csv", "ndjson"),
+            help="File format (by default it is taken from the file extension)",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=5000, help="Number of rows per batch"
+        )
+        parser.add_argument(
+            "--no-copy",
+            action="store_true",
+            help="Insert with bulk_create instead of COPY",
+        )
+        parser.add_argument(
+            "--rejects",
+            type=Path,
+            help="File for rejected rows (<path>.rejected.csv by default)",
+        )
+
+    def handle(self, *args, **kwargs):
+        path: Path = kwargs["path"]
+        if not path.is_file():
+            raise CommandError(f"File {path} does not exist")
+        file_format: str = kwargs["format"] or (
+            "ndjson" if path.suffix in (".ndjson", ".jsonl") else "csv"
+        )
+        rejects_path: Path = kwargs["rejects"] or path.with_name(
+            f"{path.name}.rejected.csv"
+        )
+
+        self.stdout.write(f"Importing leads from {path}...")
+        with (
+            open(path, encoding="UTF-8", newline="") as file,
+            open(rejects_path, encoding="UTF-8", mode="w", newline="") as rejects,
+        ):
+            importer = LeadImporter(
+                rejects,
+                batch_size=kwargs["batch_size"],
+                use_copy=not kwargs["no_copy"],
+            )
+            for stats in importer.run(read_records(file, file_format)):
+                self.stdout.write(
+                    f"read={stats.read} imported={stats.imported} "
+                    f"rejected={stats.rejected} ({stats.rows_per_second:.0f} rows/s)"
+                )
+
+        stats = importer.stats
+        self.stdout.write(
+            f"Done: imported {stats.imported} of {stats.read} leads "
+            f"at {stats.rows_per_second:.0f} rows/s, "
+            f"{stats.rejected} rejected rows are in {rejects_path}"
+        )
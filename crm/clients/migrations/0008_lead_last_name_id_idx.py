@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 03:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advertising', '0002_alter_advertising_budget_alter_advertising_channel_and_more'),
+        ('clients', '0007_alter_lead_phone'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['last_name', 'id'], name='lead_last_name_id_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.3 on 2026-10-18 03:06
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advertising', '0002_alter_advertising_budget_alter_advertising_channel_and_more'),
+        ('clients', '0008_lead_last_name_id_idx'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='lead',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['first_name', 'last_name', 'email', 'phone'], name='lead_search_trgm_idx', opclasses=['gin_trgm_ops', 'gin_trgm_ops', 'gin_trgm_ops', 'gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-18 03:15
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0009_search_trgm_idx'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='lead',
+            options={'permissions': [('create_customer_from_lead', 'Can create customer from lead')]},
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.3 on 2026-10-18 03:58
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advertising', '0002_alter_advertising_budget_alter_advertising_channel_and_more'),
+        ('clients', '0010_lead_permissions'),
+        ('contracts', '0009_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='created_at',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), help_text='when the lead became the customer'),
+        ),
+        migrations.AddField(
+            model_name='lead',
+            name='created_at',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), help_text='when the lead was created'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['created_at'], name='customer_created_at_brin'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['created_at'], name='lead_created_at_brin'),
+        ),
+    ]
@@ -2,8 +2,10 @@ import re
 
 from advertising.models import Advertising
 from contracts.models import Contract
+from django.contrib.postgres.indexes import BrinIndex, GinIndex
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.functions import Now
 
 
 def validate_phone_format(value: str) -> None:
@@ -35,6 +37,28 @@ class Lead(models.Model):
         help_text="the advertising campaign from which the"
         " lead learned about the service",
     )
+    # A database default, so the rows inserted with COPY get it as well
+    created_at = models.DateTimeField(
+        db_default=Now(), help_text="when the lead was created"
+    )
+
+    class Meta:
+        indexes = [
+            # date ranges of the daily statistics (see my_statistics.business.rollup),
+            # the rows are appended in the order of the time
+            BrinIndex(fields=["created_at"], name="lead_created_at_brin"),
+            # keyset pagination of the leads list
+            models.Index(fields=["last_name", "id"], name="lead_last_name_id_idx"),
+            # trigram search (see clients.search)
+            GinIndex(
+                fields=["first_name", "last_name", "email", "phone"],
+                opclasses=["gin_trgm_ops"] * 4,
+                name="lead_search_trgm_idx",
+            ),
+        ]
+        permissions = [
+            ("create_customer_from_lead", "Can create customer from lead"),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}({self.pk})"
@@ -45,3 +69,11 @@ class Customer(models.Model):
 
     lead = models.OneToOneField(Lead, on_delete=models.CASCADE)
     contract = models.OneToOneField(Contract, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(
+        db_default=Now(), help_text="when the lead became the customer"
+    )
+
+    class Meta:
+        indexes = [
+            BrinIndex(fields=["created_at"], name="customer_created_at_brin"),
+        ]
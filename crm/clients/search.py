@@ -0,0 +1,99 @@
+"""
+Trigram search over leads and customers.
+
+Leads are matched by first_name, last_name, email and phone, customers
+additionally by the name of their contract. Both lookups use the word
+similarity operator (%>) of pg_trgm, which is served by the trigram GIN
+indexes of Lead and Contract, and are ranked by the best similarity.
+"""
+
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db.models import Q, QuerySet
+from django.db.models.functions import Greatest
+from django.urls import reverse
+
+from .models import Customer, Lead
+
+LEAD_SEARCH_FIELDS = ("first_name", "last_name", "email", "phone")
+
+
+@dataclass
+class SearchResult:
+    kind: str  # "lead" or "customer"
+    pk: int
+    title: str
+    subtitle: str
+    url: str
+    score: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def search_leads_qs(query: str) -> QuerySet[Lead]:
+    """Leads similar to the query, the most similar first."""
+    condition = Q()
+    for field in LEAD_SEARCH_FIELDS:
+        condition |= Q(**{f"{field}__trigram_word_similar": query})
+    return (
+        Lead.objects.filter(condition)
+        .annotate(
+            score=Greatest(
+                *(TrigramWordSimilarity(query, field) for field in LEAD_SEARCH_FIELDS)
+            ),
+        )
+        .only(*LEAD_SEARCH_FIELDS)
+        .order_by("-score", "pk")
+    )
+
+
+def search_customers_qs(query: str) -> QuerySet[Customer]:
+    """Customers whose contract name is similar to the query."""
+    return (
+        Customer.objects.filter(contract__name__trigram_word_similar=query)
+        .annotate(score=TrigramWordSimilarity(query, "contract__name"))
+        .select_related("lead", "contract")
+        .only("lead__first_name", "lead__last_name", "contract__name")
+        .order_by("-score", "pk")
+    )
+
+
+def search(query: str, limit: int, with_customers: bool = True) -> List[SearchResult]:
+    """
+    Get the top results for the query.
+
+    :param with_customers: Also search customers by the contract name.
+    """
+    query = query.strip()
+    if not query:
+        return []
+
+    results: List[SearchResult] = [
+        SearchResult(
+            kind="lead",
+            pk=lead.pk,
+            title=f"{lead.last_name} {lead.first_name}",
+            subtitle=f"{lead.phone}, {lead.email}",
+            url=reverse("clients:leads_detail", kwargs={"pk": lead.pk}),
+            score=lead.score,
+        )
+        for lead in search_leads_qs(query)[:limit]
+    ]
+    if with_customers:
+        results.extend(
+            SearchResult(
+                kind="customer",
+                pk=customer.pk,
+                title=f"{customer.lead.last_name} {customer.lead.first_name}",
+                subtitle=customer.contract.name,
+                url=reverse("clients:customers_detail", kwargs={"pk": customer.pk}),
+                score=customer.score,
+            )
+            for customer in search_customers_qs(query)[:limit]
+        )
+
+    results.sort(key=lambda result: -result.score)
+    return results[:limit]
@@ -1,14 +1,25 @@
+import csv
+import json
+import os
 import random
+import tempfile
+from io import StringIO
 from string import ascii_letters
 from typing import Any, Dict, Optional
 
 from advertising.factories import AdvertisingFactory
 from django.contrib.auth.models import Group, User
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from my_statistics.models import CampaignStats
 from myauth.utils import create_group_managers, create_group_operators
 
-from .factories import LeadFactory
+from crm.pagination import encode_cursor
+
+from .factories import CustomerFactory, LeadFactory
 from .models import Customer, Lead
 
 
@@ -44,11 +55,76 @@ class LeadsListViewTest(TestCase):
         response = self.client.get(reverse("clients:leads_list"))
 
         self.assertQuerySetEqual(
-            qs=Lead.objects.order_by("pk").all(),
+            qs=Lead.objects.order_by("last_name", "pk").all(),
             values=(s.pk for s in response.context["leads"]),
             transform=lambda p: p.pk,
         )
 
+    @override_settings(LEADS_PAGE_SIZE=10)
+    def test_keyset_pagination(self):
+        """Test walking through all pages of leads forwards and backwards."""
+        ads = AdvertisingFactory.create()
+        for _ in range(25):
+            LeadFactory.create(ads=ads)
+        url = reverse("clients:leads_list")
+        pages = []
+        response = self.client.get(url)
+        while True:
+            self.assertLessEqual(len(response.context["leads"]), 10)
+            pages.append([lead.pk for lead in response.context["leads"]])
+            if response.context["next_cursor"] is None:
+                break
+            response = self.client.get(url, {"after": response.context["next_cursor"]})
+
+        self.assertEqual(
+            [pk for page in pages for pk in page],
+            list(Lead.objects.order_by("last_name", "pk").values_list("pk", flat=True)),
+        )
+
+        response = self.client.get(url, {"before": response.context["prev_cursor"]})
+        self.assertEqual([lead.pk for lead in response.context["leads"]], pages[-2])
+
+    def test_invalid_cursor(self):
+        """Negative test for a malformed cursor."""
+        response = self.client.get(reverse("clients:leads_list"), {"after": "abc"})
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_of_wrong_types(self):
+        """Negative test for a cursor with values of the wrong types."""
+        for values in (["a", "b"], [["a"], 1], ["a", {"pk": 1}], ["a", True]):
+            with self.subTest(values=values):
+                response = self.client.get(
+                    reverse("clients:leads_list"), {"after": encode_cursor(values)}
+                )
+
+                self.assertEqual(response.status_code, 404)
+
+    def test_leads_are_marked_as_customers(self):
+        """Test the is_customer annotation of leads."""
+        CustomerFactory.create()
+        LeadFactory.create()
+        response = self.client.get(reverse("clients:leads_list"))
+
+        customers = set(Customer.objects.values_list("lead_id", flat=True))
+        for lead in response.context["leads"]:
+            self.assertEqual(lead.is_customer, lead.pk in customers)
+
+    def test_number_of_queries_does_not_depend_on_page_size(self):
+        """Test that a page of leads is rendered from a single query."""
+        for _ in range(10):
+            CustomerFactory.create()
+        url = reverse("clients:leads_list")
+        self.client.get(url)  # warm the cached user and permissions
+        with self.settings(LEADS_PAGE_SIZE=5):
+            with CaptureQueriesContext(connection) as small_page:
+                self.client.get(url)
+        with self.settings(LEADS_PAGE_SIZE=30):
+            with CaptureQueriesContext(connection) as large_page:
+                self.client.get(url)
+
+        self.assertEqual(len(small_page), len(large_page))
+
     def test_all_leads_have_links_to_create_customer(self):
         """Test all leads have links to transfer to customers."""
         response = self.client.get(reverse("clients:leads_list"))
@@ -414,3 +490,156 @@ class LeadsDeleteViewTest(TestCase):
         # Check that there is no data for the old primary key
         not_existing_ads = Lead.objects.filter(pk=self.lead.pk).first()
         self.assertIsNone(not_existing_ads)
+
+
+class ImportLeadsCommandTest(TestCase):
+    """Test case class for testing the import_leads command."""
+
+    def setUp(self):
+        self.ads = AdvertisingFactory.create()
+        self.existing_lead = LeadFactory.create(phone="+7 (999) 000 0001")
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.records = [
+            {
+                "first_name": "Ivan",
+                "last_name": "Ivanov",
+                "phone": "+7 (999) 100 0001",
+                "email": "ivanov@example.com",
+                "ads": str(self.ads.pk),
+            },
+            {
+                "first_name": "Petr",
+                "last_name": "Petrov",
+                "phone": "+7 (999) 100 0002",
+                "email": "petrov@example.com",
+                "ads": "",
+            },
+            # duplicate phone inside the file
+            {
+                "first_name": "Sidor",
+                "last_name": "Sidorov",
+                "phone": "+7 (999) 100 0001",
+                "email": "sidorov@example.com",
+                "ads": "",
+            },
+            # phone of an existing lead
+            {
+                "first_name": "Anna",
+                "last_name": "Smirnova",
+                "phone": "+7 (999) 000 0001",
+                "email": "smirnova@example.com",
+                "ads": "",
+            },
+            # invalid phone
+            {
+                "first_name": "Olga",
+                "last_name": "Orlova",
+                "phone": "12345",
+                "email": "orlova@example.com",
+                "ads": "",
+            },
+            # unknown advertising
+            {
+                "first_name": "Oleg",
+                "last_name": "Olegov",
+                "phone": "+7 (999) 100 0003",
+                "email": "olegov@example.com",
+                "ads": "no such campaign",
+            },
+        ]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _import(self, filename: str, *args: str) -> str:
+        path = os.path.join(self.tmp_dir.name, filename)
+        with open(path, encoding="UTF-8", mode="w", newline="") as file:
+            if filename.endswith(".csv"):
+                writer = csv.DictWriter(file, fieldnames=list(self.records[0]))
+                writer.writeheader()
+                writer.writerows(self.records)
+            else:
+                file.writelines(json.dumps(record) + "\n" for record in self.records)
+        call_command(
+            "import_leads", path, "--batch-size", "2", *args, stdout=StringIO()
+        )
+        with open(f"{path}.rejected.csv", encoding="UTF-8") as rejects:
+            return rejects.read()
+
+    def _assert_imported(self, rejects: str):
+        self.assertTrue(
+            Lead.objects.filter(phone="+7 (999) 100 0001", ads=self.ads).exists()
+        )
+        self.assertTrue(
+            Lead.objects.filter(phone="+7 (999) 100 0002", ads=None).exists()
+        )
+        self.assertFalse(Lead.objects.filter(email="sidorov@example.com").exists())
+        self.assertFalse(Lead.objects.filter(email="smirnova@example.com").exists())
+        self.assertEqual(CampaignStats.objects.get(pk=self.ads.pk).leads_count, 1)
+        self.assertIn("phone already exists", rejects)
+        self.assertIn("Phone must have format", rejects)
+        self.assertIn("unknown advertising", rejects)
+        self.assertEqual(len(rejects.splitlines()), 5)  # header and 4 rows
+
+    def test_import_csv_with_copy(self):
+        """Test importing a CSV file with COPY."""
+        self._assert_imported(self._import("leads.csv"))
+
+    def test_import_ndjson_with_bulk_create(self):
+        """Test importing an NDJSON file with bulk_create."""
+        self._assert_imported(self._import("leads.ndjson", "--no-copy"))
+
+
+class SearchClientsViewTest(TestCase):
+    """Test case class for testing the search of leads and customers."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.credentials = dict(username="test", password="test")
+        cls.user = User.objects.create_user(**cls.credentials)
+        create_group_managers()
+        cls.group = Group.objects.get(name="managers")
+        cls.user.groups.add(cls.group)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.user.delete()
+        cls.group.delete()
+
+    def setUp(self):
+        self.client.login(**self.credentials)
+        self.lead = LeadFactory.create(first_name="Afanasy", last_name="Zhukovsky")
+        self.customer = CustomerFactory.create(contract__name="Quarterlyservice")
+
+    def test_autocomplete_finds_lead(self):
+        """Test finding a lead by a misspelled last name."""
+        response = self.client.get(
+            reverse("clients:search_autocomplete"), {"q": "Zhukovski"}
+        )
+
+        results = response.json()["results"]
+        self.assertEqual(results[0]["kind"], "lead")
+        self.assertEqual(results[0]["pk"], self.lead.pk)
+
+    def test_autocomplete_finds_customer_by_contract(self):
+        """Test finding a customer by the name of the contract."""
+        response = self.client.get(
+            reverse("clients:search_autocomplete"), {"q": "quarterly", "limit": 1}
+        )
+
+        results = response.json()["results"]
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["kind"], "customer")
+        self.assertEqual(results[0]["pk"], self.customer.pk)
+
+    def test_search_page(self):
+        """Test the search page."""
+        response = self.client.get(reverse("clients:search"), {"q": "Afanasy"})
+
+        self.assertContains(response, "Zhukovsky Afanasy")
+
+    def test_empty_query(self):
+        """Test that an empty query finds nothing."""
+        response = self.client.get(reverse("clients:search_autocomplete"))
+
+        self.assertEqual(response.json()["results"], [])
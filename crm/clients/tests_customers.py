@@ -8,11 +8,13 @@ from advertising.factories import AdvertisingFactory
 from contracts.factories import ContractFactory
 from contracts.models import Contract
 from django.contrib.auth.models import Group, User
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from myauth.utils import create_group_managers
 from services.factories import ServiceFactory
 
+from crm.pagination import encode_cursor
+
 from .factories import CustomerFactory, LeadFactory
 from .forms import CustomerBaseForm, NewCustomerForm
 from .models import Customer, Lead
@@ -90,6 +92,35 @@ class CustomerCreateViewTest(TestCase):
             Customer.objects.filter(lead=self.lead, contract=self.contract).exists()
         )
 
+    def test_create_customer_from_upload(self):
+        """Test creating a customer with a document uploaded in chunks."""
+        content = b"scanned contract" * 10
+        upload = self.client.post(
+            reverse("contracts:upload_open"),
+            {"filename": "scan.pdf", "size": len(content)},
+        ).json()
+        self.client.put(
+            upload["url"],
+            content,
+            content_type="application/octet-stream",
+            headers={"Upload-Offset": "0"},
+        )
+        kwargs = deepcopy(self.request_kwargs)
+        del kwargs["doc"]
+        kwargs["upload"] = upload["id"]
+
+        response = self.client.post(reverse("clients:customers_new"), kwargs)
+
+        self.assertRedirects(response, reverse("clients:customers_list"))
+        self.lead = self.lead_qs.first()
+        self.contract = self.contract_qs.first()
+        self.assertIsNotNone(self.contract)
+        with self.contract.doc.open() as file:
+            self.assertEqual(file.read(), content)
+        self.assertTrue(
+            Customer.objects.filter(lead=self.lead, contract=self.contract).exists()
+        )
+
     def test_creating_customer_with_invalid_phone(self):
         """Negative test of creating a customer with an invalid phone."""
         kwargs = deepcopy(self.request_kwargs)
@@ -270,6 +301,71 @@ class CustomersListViewTest(TestCase):
         )
 
 
+class CustomersListFilterTest(TestCase):
+    """Test case class for testing the pagination and filters of customers."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.credentials = dict(username="test", password="test")
+        cls.user = User.objects.create_user(**cls.credentials)
+        create_group_managers()
+        cls.group = Group.objects.get(name="managers")
+        cls.user.groups.add(cls.group)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.user.delete()
+        cls.group.delete()
+
+    def setUp(self):
+        self.client.login(**self.credentials)
+        self.product = ServiceFactory.create()
+        ads = AdvertisingFactory.create()
+        for index in range(9):
+            contract = ContractFactory.create(
+                name=f"Customer contract {index}",
+                product=self.product,
+                cost=index % 3 * 100,
+            )
+            Customer.objects.create(lead=LeadFactory.create(ads=ads), contract=contract)
+        self.url = reverse("clients:customers_list")
+
+    @override_settings(CUSTOMERS_PAGE_SIZE=4)
+    def test_sort_and_filter(self):
+        """All the pages together are the filtered customers in the order."""
+        customers = Customer.objects.all()
+        for params, expected in (
+            ({}, customers.order_by("lead__last_name", "lead__pk")),
+            (
+                {"sort": "-cost", "cost_min": "100"},
+                customers.filter(contract__cost__gte=100).order_by(
+                    "-contract__cost", "-contract__pk"
+                ),
+            ),
+        ):
+            with self.subTest(params=params):
+                pks: list = []
+                response = self.client.get(self.url, params)
+                while True:
+                    pks.extend(
+                        customer.pk for customer in response.context["customers"]
+                    )
+                    if response.context["next_cursor"] is None:
+                        break
+                    response = self.client.get(
+                        self.url, {**params, "after": response.context["next_cursor"]}
+                    )
+                self.assertEqual(pks, list(expected.values_list("pk", flat=True)))
+
+    def test_cursor_of_wrong_types(self):
+        """A cursor not matching the types of the sort key is rejected."""
+        response = self.client.get(
+            self.url, {"sort": "end_date", "after": encode_cursor([1, 1])}
+        )
+
+        self.assertEqual(response.status_code, 404)
+
+
 class CustomerDeleteViewTest(TestCase):
     """Test case class for testing CustomerDeleteView."""
 
@@ -11,6 +11,10 @@ from .views import (
     LeadsListView,
     LeadUpdateView,
     create_customer_from_lead,
+    export_customers,
+    export_leads,
+    search_clients,
+    search_clients_autocomplete,
     update_customer,
 )
 
@@ -19,10 +23,12 @@ app_name = "clients"
 urlpatterns = [
     path("leads/", LeadsListView.as_view(), name="leads_list"),
     path("leads/new/", LeadCreateView.as_view(), name="leads_create"),
+    path("leads/export/", export_leads, name="leads_export"),
     path("leads/<int:pk>/", LeadDetailView.as_view(), name="leads_detail"),
     path("leads/<int:pk>/edit/", LeadUpdateView.as_view(), name="leads_edit"),
     path("leads/<int:pk>/delete/", LeadDeleteView.as_view(), name="leads_delete"),
     path("customers/", CustomersListView.as_view(), name="customers_list"),
+    path("customers/export/", export_customers, name="customers_export"),
     path("customers/<int:pk>/", CustomerDetailView.as_view(), name="customers_detail"),
     path("customers/<int:pk>/edit/", update_customer, name="customers_edit"),
     path(
@@ -36,4 +42,10 @@ urlpatterns = [
         create_customer_from_lead,
         name="customers_from_lead",
     ),
+    path("search/", search_clients, name="search"),
+    path(
+        "search/autocomplete/",
+        search_clients_autocomplete,
+        name="search_autocomplete",
+    ),
 ]
@@ -1,11 +1,16 @@
 from logging import getLogger
-from typing import Any, Dict, List
+from typing import Any, Dict
 
+from contracts.forms import ContractFilterForm
 from contracts.models import Contract
+from contracts.uploads import UploadError
+from contracts.views import ContractFilterMixin
+from django.conf import settings
 from django.contrib.auth.decorators import permission_required
 from django.contrib.auth.mixins import PermissionRequiredMixin
 from django.db import IntegrityError, transaction
-from django.http import HttpRequest, HttpResponse
+from django.db.models import Exists, OuterRef
+from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse, reverse_lazy
 from django.views.generic import (
@@ -17,33 +22,65 @@ from django.views.generic import (
     UpdateView,
 )
 
-from .forms import CustomerBaseForm, CustomerUpdateForm, NewCustomerForm
+from crm.exports import export_response, queryset_rows
+from crm.pagination import KeysetPaginationMixin
+
+from .forms import CustomerBaseForm, CustomerUpdateForm, LeadForm, NewCustomerForm
 from .models import Customer, Lead
+from .search import search
 from .utils import integrity_error_parser
 
 logger = getLogger()
 
-
-class LeadsListView(PermissionRequiredMixin, ListView):
-    """ListView class for getting list of leads."""
+# Maximum number of search results on the page and in the autocomplete
+SEARCH_PAGE_LIMIT = 50
+SEARCH_AUTOCOMPLETE_LIMIT = 10
+
+# Column of the export -> lookup
+LEADS_EXPORT_COLUMNS = {
+    "id": "pk",
+    "first_name": "first_name",
+    "last_name": "last_name",
+    "phone": "phone",
+    "email": "email",
+    "ads": "ads__name",
+    "created_at": "created_at",
+}
+CUSTOMERS_EXPORT_COLUMNS = {
+    "id": "pk",
+    "lead_id": "lead_id",
+    "first_name": "lead__first_name",
+    "last_name": "lead__last_name",
+    "phone": "lead__phone",
+    "email": "lead__email",
+    "contract_id": "contract_id",
+    "contract": "contract__name",
+    "product": "contract__product__name",
+    "start_date": "contract__start_date",
+    "end_date": "contract__end_date",
+    "cost": "contract__cost",
+    "created_at": "created_at",
+}
+
+
+class LeadsListView(PermissionRequiredMixin, KeysetPaginationMixin, ListView):
+    """
+    ListView class for getting list of leads.
+
+    The leads are paginated by (last_name, pk) with keyset pagination,
+    each lead is annotated with is_customer.
+    """
 
     template_name = "clients/leads-list.html"
-    queryset = Lead.objects.select_related("ads")
+    queryset = Lead.objects.only("first_name", "last_name").annotate(
+        is_customer=Exists(Customer.objects.filter(lead=OuterRef("pk")))
+    )
     context_object_name = "leads"
     permission_required = ("clients.view_lead",)
+    keyset = ("last_name", "pk")
 
-    def get_context_data(self, *, object_list=None, **kwargs):
-        context: Dict[str, Any] = super().get_context_data(
-            object_list=object_list, **kwargs
-        )
-        leads_pk: List[int] = [
-            pk[0]
-            for pk in Customer.objects.select_related("lead")
-            .values_list("lead__pk")
-            .all()
-        ]
-        context["customers_pk"] = leads_pk
-        return context
+    def get_page_size(self) -> int:
+        return settings.LEADS_PAGE_SIZE
 
 
 class LeadDetailView(PermissionRequiredMixin, DetailView):
@@ -59,7 +96,7 @@ class LeadUpdateView(PermissionRequiredMixin, UpdateView):
 
     template_name = "clients/leads-edit.html"
     model = Lead
-    fields = "first_name", "last_name", "phone", "email", "ads"
+    form_class = LeadForm
     permission_required = ("clients.change_lead",)
 
     def get_success_url(self):
@@ -80,18 +117,52 @@ class LeadCreateView(PermissionRequiredMixin, CreateView):
 
     template_name = "clients/leads-create.html"
     model = Lead
-    fields = "first_name", "last_name", "phone", "email", "ads"
+    form_class = LeadForm
     success_url = reverse_lazy("clients:leads_list")
     permission_required = ("clients.add_lead",)
 
 
-class CustomersListView(PermissionRequiredMixin, ListView):
-    """ListView class for getting a list of customers."""
+class CustomersListView(
+    PermissionRequiredMixin, ContractFilterMixin, KeysetPaginationMixin, ListView
+):
+    """
+    ListView class for getting a list of customers.
+
+    The customers are paginated with keyset pagination, filtered
+    by their contracts and sorted by the last name of the lead or
+    the end date or the cost of the contract. Only the shown columns
+    are fetched.
+    """
 
     template_name = "clients/customers-list.html"
-    queryset = Customer.objects.select_related("lead").select_related("contract")
+    queryset = Customer.objects.select_related("lead", "contract").only(
+        "lead__first_name",
+        "lead__last_name",
+        "contract__name",
+        "contract__end_date",
+        "contract__cost",
+    )
     context_object_name = "customers"
     permission_required = ("clients.view_customer",)
+    filter_prefix = "contract__"
+    keyset = ("lead__last_name", "lead__pk")
+    sorts = {
+        "name": ("lead__last_name", "lead__pk"),
+        "end_date": ("contract__end_date", "contract__pk"),
+        "-end_date": ("-contract__end_date", "-contract__pk"),
+        "cost": ("contract__cost", "contract__pk"),
+        "-cost": ("-contract__cost", "-contract__pk"),
+    }
+    sort_choices = [
+        ("name", "По фамилии"),
+        ("end_date", "Сначала заканчивающиеся"),
+        ("-end_date", "Сначала поздние"),
+        ("cost", "Сначала дешёвые"),
+        ("-cost", "Сначала дорогие"),
+    ]
+
+    def get_page_size(self) -> int:
+        return settings.CUSTOMERS_PAGE_SIZE
 
 
 class CustomerDetailView(PermissionRequiredMixin, DetailView):
@@ -110,15 +181,25 @@ class CustomerCreateView(PermissionRequiredMixin, FormView):
     form_class = NewCustomerForm
     permission_required = ("clients.add_customer",)
 
+    def get_form_kwargs(self) -> Dict[str, Any]:
+        kwargs: Dict[str, Any] = super().get_form_kwargs()
+        kwargs["user"] = self.request.user
+        return kwargs
+
     def form_valid(self, form: NewCustomerForm):
-        resp = super().form_valid(form)
         lead_data, contract_data = form.get_data_from_customer_form()
 
-        lead, _ = Lead.objects.get_or_create(**lead_data)
-        contract = Contract.objects.create(**contract_data)
-        Customer.objects.create(lead=lead, contract=contract)
+        try:
+            with transaction.atomic():
+                lead, _ = Lead.objects.get_or_create(**lead_data)
+                contract = Contract.objects.create(**contract_data)
+                Customer.objects.create(lead=lead, contract=contract)
+                form.save_upload(contract)
+        except UploadError as exc:
+            form.add_error("upload", str(exc))
+            return self.form_invalid(form)
 
-        return resp
+        return super().form_valid(form)
 
 
 class CustomerDeleteView(PermissionRequiredMixin, DeleteView):
@@ -142,9 +223,9 @@ def update_customer(request: HttpRequest, pk: int) -> HttpResponse:
             "last_name": customer.lead.last_name,
             "phone": customer.lead.phone,
             "email": customer.lead.email,
-            "ads": customer.lead.ads,
+            "ads": customer.lead.ads_id,
             "name": customer.contract.name,
-            "product": customer.contract.product,
+            "product": customer.contract.product_id,
             "doc": customer.contract.doc,
             "end_date": customer.contract.end_date,
             "cost": customer.contract.cost,
@@ -152,7 +233,7 @@ def update_customer(request: HttpRequest, pk: int) -> HttpResponse:
     )
 
     if request.method == "POST":
-        form = CustomerUpdateForm(request.POST, request.FILES)
+        form = CustomerUpdateForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             lead_data, contract_data = form.get_data_from_customer_form()
             customer = Customer.objects.get(pk=pk)
@@ -168,9 +249,12 @@ def update_customer(request: HttpRequest, pk: int) -> HttpResponse:
 
                     customer.lead.save()
                     customer.contract.save()
+                    form.save_upload(customer.contract)
             except IntegrityError as exc:
                 field_name, exc_text = integrity_error_parser(exc, form)
                 form.add_error(field_name, exc_text)
+            except UploadError as exc:
+                form.add_error("upload", str(exc))
             else:
                 url = reverse("clients:customers_detail", kwargs={"pk": pk})
                 return redirect(url)
@@ -190,14 +274,14 @@ def create_customer_from_lead(request: HttpRequest, lead_pk: int) -> HttpRespons
                 "last_name": lead.last_name,
                 "phone": lead.phone,
                 "email": lead.email,
-                "ads": lead.ads,
+                "ads": lead.ads_id,
             }
         )
     else:
         form = CustomerBaseForm()
 
     if request.method == "POST":
-        form = CustomerBaseForm(request.POST, request.FILES)
+        form = CustomerBaseForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             lead_data, contract_data = form.get_data_from_customer_form()
 
@@ -208,12 +292,64 @@ def create_customer_from_lead(request: HttpRequest, lead_pk: int) -> HttpRespons
                     lead.save()
                     contract = Contract.objects.create(**contract_data)
                     Customer.objects.create(lead=lead, contract=contract)
+                    form.save_upload(contract)
             except IntegrityError as exc:
                 field_name, exc_text = integrity_error_parser(exc, form)
                 form.add_error(field_name, exc_text)
+            except UploadError as exc:
+                form.add_error("upload", str(exc))
             else:
                 url = reverse("clients:customers_list")
                 return redirect(url)
 
     context = {"form": form, "object": lead}
     return render(request, "clients/customers-create-from-lead.html", context=context)
+
+
+@permission_required("clients.view_lead")
+def search_clients(request: HttpRequest) -> HttpResponse:
+    """View func for searching leads and customers."""
+    query: str = request.GET.get("q", "")
+    results = search(
+        query,
+        limit=SEARCH_PAGE_LIMIT,
+        with_customers=request.user.has_perm("clients.view_customer"),
+    )
+    context = {"query": query, "results": results}
+    return render(request, "clients/search.html", context=context)
+
+
+@permission_required("clients.view_lead")
+def search_clients_autocomplete(request: HttpRequest) -> JsonResponse:
+    """View func returning the top search results as JSON."""
+    try:
+        limit = int(request.GET.get("limit", SEARCH_AUTOCOMPLETE_LIMIT))
+    except ValueError:
+        limit = SEARCH_AUTOCOMPLETE_LIMIT
+    results = search(
+        request.GET.get("q", ""),
+        limit=max(1, min(limit, SEARCH_PAGE_LIMIT)),
+        with_customers=request.user.has_perm("clients.view_customer"),
+    )
+    return JsonResponse({"results": [result.to_dict() for result in results]})
+
+
+@permission_required("clients.view_lead")
+def export_leads(request: HttpRequest) -> HttpResponse:
+    """View func streaming all the leads as CSV or NDJSON."""
+    rows = queryset_rows(
+        Lead.objects.order_by("pk"), list(LEADS_EXPORT_COLUMNS.values())
+    )
+    return export_response(request, "leads", list(LEADS_EXPORT_COLUMNS), rows)
+
+
+@permission_required("clients.view_customer")
+def export_customers(request: HttpRequest) -> HttpResponse:
+    """
+    View func streaming the customers with their leads, contracts and
+    services as CSV or NDJSON, filtered like the list of the customers.
+    """
+    form = ContractFilterForm(request.GET, sort_choices=[])
+    customers = form.filter(Customer.objects.order_by("pk"), prefix="contract__")
+    rows = queryset_rows(customers, list(CUSTOMERS_EXPORT_COLUMNS.values()))
+    return export_response(request, "customers", list(CUSTOMERS_EXPORT_COLUMNS), rows)
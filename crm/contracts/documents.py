@@ -0,0 +1,187 @@
+"""
+References to the contract documents and their deletion.
+
+add_reference and drop_reference maintain StoredDocument, the number
+of the contracts referring to every document. Dropping the last
+reference queues the document in the DocumentDeletion outbox.
+
+process_deletions drains the DocumentDeletion outbox batch by batch.
+Several workers may run at once: every batch is locked with
+SKIP LOCKED. A file some contract refers to again by then (a new upload
+of the same content) is kept. The files are unlinked only after the batch
+has committed, except the ones modified after they were queued: storing
+the same content again refreshes the time of the file (see
+ContentAddressedStorage.adopt) before the contract referring to it
+commits.
+
+find_orphans walks the directory of the documents and yields the files
+no contract refers to, for example the ones left behind before
+the outbox existed.
+"""
+
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Set
+
+from django.core.files.storage import Storage
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Contract, DocumentDeletion, StoredDocument
+from .storage import INCOMING_DIR
+
+DOCUMENTS_DIR = "contracts"
+
+
+def document_storage() -> Storage:
+    return Contract._meta.get_field("doc").storage
+
+
+def referenced_names(names: Set[str]) -> Set[str]:
+    """The names of the set some contracts still refer to."""
+    return set(Contract.objects.filter(doc__in=names).values_list("doc", flat=True))
+
+
+def add_reference(name: str, count: int = 1) -> None:
+    """Count count more contracts referring to the document."""
+    table: str = StoredDocument._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (name, refcount) VALUES (%s, %s)"
+            f" ON CONFLICT (name) DO UPDATE SET refcount = {table}.refcount + %s",
+            [name, count, count],
+        )
+
+
+def drop_reference(name: str) -> None:
+    """Count one contract less, queue the document if it was the last one."""
+    table: str = StoredDocument._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET refcount = refcount - 1"
+            " WHERE name = %s AND refcount > 0 RETURNING refcount",
+            [name],
+        )
+        row = cursor.fetchone()
+    if row is not None and row[0] > 0:
+        return
+    # Documents saved before the counting started have no row
+    StoredDocument.objects.filter(name=name, refcount=0).delete()
+    DocumentDeletion.objects.create(name=name)
+
+
+def rebuild_references() -> int:
+    """Recount the references from scratch, return the number of documents."""
+    with transaction.atomic():
+        StoredDocument.objects.all().delete()
+        documents: List[StoredDocument] = StoredDocument.objects.bulk_create(
+            StoredDocument(name=row["doc"], refcount=row["refcount"])
+            for row in Contract.objects.values("doc")
+            .annotate(refcount=Count("pk"))
+            .order_by()
+        )
+    return len(documents)
+
+
+def _delete_files(storage: Storage, names: Dict[str, datetime]) -> None:
+    """Delete the files not modified since they were queued."""
+    for name, queued_at in names.items():
+        try:
+            if os.path.getmtime(storage.path(name)) > queued_at.timestamp():
+                continue
+        except FileNotFoundError:
+            continue
+        storage.delete(name)
+
+
+def process_deletions(batch_size: int = 500, delay: float = 0) -> int:
+    """
+    Delete the files of one batch of the outbox.
+
+    :param delay: Seconds the rows wait in the outbox. A new upload of
+     the same content may reuse the file before its contract is saved.
+    :return: Number of the processed rows, 0 when the outbox is empty.
+    """
+    storage: Storage = document_storage()
+    queued_before = timezone.now() - timedelta(seconds=delay)
+    with transaction.atomic():
+        queue = DocumentDeletion.objects.select_for_update(skip_locked=True).filter(
+            created_at__lte=queued_before
+        )
+        batch: List[DocumentDeletion] = list(queue.order_by("pk")[:batch_size])
+        if not batch:
+            return 0
+        # Name -> when it was queued the last time
+        names: Dict[str, datetime] = dict()
+        for deletion in batch:
+            names[deletion.name] = max(
+                deletion.created_at, names.get(deletion.name, deletion.created_at)
+            )
+        for name in referenced_names(set(names)):
+            del names[name]
+        DocumentDeletion.objects.filter(
+            pk__in=[deletion.pk for deletion in batch]
+        ).delete()
+        transaction.on_commit(lambda: _delete_files(storage, names))
+    return len(batch)
+
+
+def process_all_deletions(batch_size: int = 500, delay: float = 0) -> int:
+    """Drain the outbox, return the number of the processed rows."""
+    total: int = 0
+    while processed := process_deletions(batch_size, delay):
+        total += processed
+    return total
+
+
+def iter_documents(storage: Storage, directory: str = DOCUMENTS_DIR) -> Iterator[str]:
+    """
+    Names of all the files under the directory of the storage, lazily.
+
+    The unfinished uploads are skipped, gc_upload_sessions collects them.
+    """
+    root: str = storage.path("")
+    stack: List[str] = [storage.path(directory)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name != INCOMING_DIR:
+                        stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield os.path.relpath(entry.path, root).replace(os.sep, "/")
+
+
+def find_orphans(min_age: float = 3600, batch_size: int = 1000) -> Iterator[str]:
+    """
+    Names of the document files no contract refers to.
+
+    :param min_age: Files modified less than min_age seconds ago are
+     skipped, they may belong to a contract being saved right now.
+    :param batch_size: Number of the files checked by one query.
+    """
+    storage: Storage = document_storage()
+    deadline: float = time.time() - min_age
+    batch: Set[str] = set()
+
+    def orphans_of_batch() -> Set[str]:
+        orphans: Set[str] = batch - referenced_names(batch)
+        batch.clear()
+        return orphans
+
+    for name in iter_documents(storage):
+        try:
+            if os.path.getmtime(storage.path(name)) > deadline:
+                continue
+        except FileNotFoundError:
+            continue
+        batch.add(name)
+        if len(batch) >= batch_size:
+            yield from sorted(orphans_of_batch())
+    yield from sorted(orphans_of_batch())
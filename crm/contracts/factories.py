@@ -11,16 +11,14 @@ from .models import Contract
 
 
 def _create_test_file(
-    *,
-    file_dir: Optional[str] = settings.BASE_DIR / "upload",
-    filename: str = "test_file.txt"
+    *, file_dir: Optional[str] = settings.MEDIA_ROOT, filename: str = "test_file.txt"
 ) -> str:
     """Create empty file for factory."""
     if not file_dir:
         path = filename
     else:
         try:
-            os.mkdir(file_dir)
+            os.makedirs(file_dir)
         except FileExistsError:
             pass
         path = os.path.join(file_dir, filename)
@@ -40,6 +38,11 @@ class ContractFactory(factory.django.DjangoModelFactory):
 
     name = factory.faker.Faker("word")
     product = factory.SubFactory(ServiceFactory)
-    doc = factory.django.FileField(from_path=_create_test_file(file_dir="upload"))
+    # In MEDIA_ROOT, where the test client reads a copied unsaved file from
+    doc = factory.django.FileField(
+        from_path=factory.LazyFunction(
+            lambda: _create_test_file(file_dir=settings.MEDIA_ROOT)
+        )
+    )
     cost = factory.LazyAttribute(lambda x: round(random.uniform(0, 100), 2))
     end_date = factory.LazyAttribute(lambda x: date.today() + timedelta(days=1))
@@ -0,0 +1,137 @@
+from typing import Dict, List, Optional, Tuple
+
+from django import forms
+from django.conf import settings
+from django.db.models import QuerySet
+from django.urls import reverse_lazy
+
+from crm.lookups import LazyModelChoiceField
+
+from .models import Contract, UploadSession
+from .uploads import finalize
+
+
+class DocumentUploadForm(forms.Form):
+    """
+    Base form taking the contract document either as the doc file
+    or as a finished chunked upload (see contracts.uploads).
+
+    The upload field is the id of an upload session of the user passed
+    to the form, static/chunked-upload.js fills it in and sends the form
+    without the file. The upload wins over the file.
+    """
+
+    upload = forms.ModelChoiceField(
+        UploadSession.objects.none(),
+        required=False,
+        widget=forms.HiddenInput(
+            attrs={"data-upload-url": reverse_lazy("contracts:upload_open")}
+        ),
+    )
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if user is not None and user.is_authenticated:
+            self.fields["upload"].queryset = UploadSession.objects.filter(user=user)
+        self.fields["upload"].widget.attrs[
+            "data-chunk-size"
+        ] = settings.UPLOAD_CHUNK_MAX_SIZE
+        self.fields["doc"].required = False
+
+    def clean_upload(self) -> Optional[UploadSession]:
+        upload: Optional[UploadSession] = self.cleaned_data["upload"]
+        if upload is not None and upload.received != upload.size:
+            raise forms.ValidationError(
+                f"Received {upload.received} bytes of {upload.size}"
+            )
+        return upload
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if (
+            not cleaned_data.get("doc")
+            and cleaned_data.get("upload") is None
+            and not self.has_error("doc")
+            and not self.has_error("upload")
+        ):
+            self.add_error("doc", self.fields["doc"].error_messages["required"])
+        return cleaned_data
+
+    def save_upload(self, contract: Contract) -> None:
+        """
+        Store the upload, if any, as the document of the saved contract.
+
+        :raise UploadError: If the upload is finished or removed meanwhile.
+        """
+        upload: Optional[UploadSession] = self.cleaned_data.get("upload")
+        if upload is not None:
+            finalize(upload, contract)
+
+
+class ContractForm(DocumentUploadForm, forms.ModelForm):
+    """Form for creating and updating the contract."""
+
+    product = LazyModelChoiceField("services", help_text="the service provided")
+
+    class Meta:
+        model = Contract
+        fields = "name", "product", "doc", "end_date", "cost"
+
+
+class ContractFilterForm(forms.Form):
+    """
+    Filters and sorting of the lists of contracts and customers.
+
+    Invalid filters are ignored, the list is filtered by the valid ones.
+    """
+
+    # Field of the form -> lookup of the contract
+    LOOKUPS: Dict[str, str] = {
+        "product": "product",
+        "end_date_from": "end_date__gte",
+        "end_date_to": "end_date__lte",
+        "cost_min": "cost__gte",
+        "cost_max": "cost__lte",
+    }
+
+    product = LazyModelChoiceField("services", required=False, empty_label="Услуга")
+    end_date_from = forms.DateField(
+        required=False, widget=forms.DateInput(attrs={"type": "date"})
+    )
+    end_date_to = forms.DateField(
+        required=False, widget=forms.DateInput(attrs={"type": "date"})
+    )
+    cost_min = forms.DecimalField(
+        required=False,
+        max_digits=8,
+        decimal_places=2,
+        widget=forms.NumberInput(attrs={"placeholder": "Стоимость от"}),
+    )
+    cost_max = forms.DecimalField(
+        required=False,
+        max_digits=8,
+        decimal_places=2,
+        widget=forms.NumberInput(attrs={"placeholder": "Стоимость до"}),
+    )
+    sort = forms.ChoiceField(required=False)
+
+    def __init__(self, *args, sort_choices: List[Tuple[str, str]], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["sort"].choices = sort_choices
+        for field in self.fields.values():
+            field.widget.attrs.setdefault("class", "form-control")
+
+    def filter(self, queryset: QuerySet, prefix: str = "") -> QuerySet:
+        """
+        Filter the queryset.
+
+        :param prefix: Path from the model of the queryset to the contract,
+         for example "contract__".
+        """
+        self.is_valid()
+        conditions = {
+            prefix + lookup: self.cleaned_data[field]
+            for field, lookup in self.LOOKUPS.items()
+            if self.cleaned_data.get(field) is not None
+        }
+        return queryset.filter(**conditions)
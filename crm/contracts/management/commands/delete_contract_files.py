@@ -0,0 +1,34 @@
+import time
+
+from contracts.documents import process_all_deletions
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Delete the documents of the deleted contracts queued in the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=500, help="Files deleted per transaction"
+        )
+        parser.add_argument(
+            "--delay",
+            type=float,
+            default=300,
+            help="Delete the files queued at least DELAY seconds ago",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Keep running and check the outbox every INTERVAL seconds",
+        )
+
+    def handle(self, *args, **kwargs):
+        while True:
+            count: int = process_all_deletions(kwargs["batch_size"], kwargs["delay"])
+            if count or not kwargs["interval"]:
+                self.stdout.write(f"Processed {count} queued deletions")
+            if not kwargs["interval"]:
+                return
+            time.sleep(kwargs["interval"])
@@ -0,0 +1,45 @@
+import os
+import time
+
+from contracts.text_search import index_documents
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Extract and index the texts of the new and changed contract documents."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of the worker processes",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=100, help="Documents per transaction"
+        )
+        parser.add_argument(
+            "--retry-errors",
+            action="store_true",
+            help="Also extract the documents which failed before",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Keep running and check for new documents every INTERVAL seconds",
+        )
+
+    def handle(self, *args, **kwargs):
+        while True:
+            count: int = index_documents(
+                batch_size=kwargs["batch_size"],
+                workers=kwargs["workers"],
+                retry_errors=kwargs["retry_errors"],
+                log=self.stdout.write,
+            )
+            if count or not kwargs["interval"]:
+                self.stdout.write(f"Done: {count} documents")
+            if not kwargs["interval"]:
+                return
+            time.sleep(kwargs["interval"])
@@ -0,0 +1,31 @@
+from contracts.documents import document_storage, find_orphans
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Find (and delete) the contract documents no contract refers to."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--delete", action="store_true", help="Delete the orphans, not only list"
+        )
+        parser.add_argument(
+            "--min-age",
+            type=float,
+            default=3600,
+            help="Skip the files modified less than MIN_AGE seconds ago",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Files checked per query"
+        )
+
+    def handle(self, *args, **kwargs):
+        storage = document_storage()
+        count: int = 0
+        for name in find_orphans(kwargs["min_age"], kwargs["batch_size"]):
+            if kwargs["delete"]:
+                storage.delete(name)
+            self.stdout.write(name)
+            count += 1
+        action: str = "Deleted" if kwargs["delete"] else "Found"
+        self.stdout.write(f"{action} {count} orphan files")
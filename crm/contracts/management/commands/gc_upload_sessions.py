@@ -0,0 +1,18 @@
+from contracts.uploads import collect_stale_sessions
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Remove the abandoned uploads of contract documents."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ttl",
+            type=float,
+            default=None,
+            help="Seconds without updates, UPLOAD_SESSION_TTL by default",
+        )
+
+    def handle(self, *args, **kwargs):
+        count: int = collect_stale_sessions(kwargs["ttl"])
+        self.stdout.write(f"Removed {count} unfinished uploads")
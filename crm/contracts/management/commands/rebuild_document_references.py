@@ -0,0 +1,11 @@
+from contracts.documents import rebuild_references
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Recount the references of the contracts to their documents."
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write("Rebuilding document references...")
+        count: int = rebuild_references()
+        self.stdout.write(f"Done: {count} documents")
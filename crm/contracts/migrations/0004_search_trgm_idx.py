@@ -0,0 +1,21 @@
+# Generated by Django 5.1.3 on 2026-10-18 03:06
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0003_alter_contract_end_date'),
+        ('services', '0002_rename_price_service_cost'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='contract',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='contract_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
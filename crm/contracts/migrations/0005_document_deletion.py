@@ -0,0 +1,21 @@
+# Generated by Django 5.1.3 on 2026-10-18 03:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0004_search_trgm_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='name of the file in the storage', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
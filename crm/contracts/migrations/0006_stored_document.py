@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-18 03:43
+
+import contracts.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0005_document_deletion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredDocument',
+            fields=[
+                ('name', models.CharField(help_text='name of the file in the storage', max_length=255, primary_key=True, serialize=False)),
+                ('refcount', models.PositiveIntegerField(default=0, help_text='number of the contracts with the document')),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='contract',
+            name='doc',
+            field=models.FileField(help_text='the file with the contract document', storage=contracts.storage.get_document_storage, upload_to='contracts'),
+        ),
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO contracts_storeddocument (name, refcount)
+                SELECT doc, count(*) FROM contracts_contract GROUP BY doc
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.3 on 2026-10-18 03:49
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0007_upload_session'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContractText',
+            fields=[
+                ('contract', models.OneToOneField(help_text='the contract', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='text', serialize=False, to='contracts.contract')),
+                ('doc_name', models.CharField(help_text='name of the indexed file', max_length=255)),
+                ('doc_hash', models.CharField(db_index=True, help_text='SHA-256 of the indexed file', max_length=64)),
+                ('content', models.TextField(blank=True, help_text='the extracted text')),
+                ('error', models.CharField(blank=True, help_text='why the text could not be extracted', max_length=255)),
+                ('search', django.contrib.postgres.search.SearchVectorField(null=True)),
+                ('indexed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [django.contrib.postgres.indexes.GinIndex(fields=['search'], name='contract_text_search_idx')],
+            },
+        ),
+    ]
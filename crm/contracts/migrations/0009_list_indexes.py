@@ -0,0 +1,22 @@
+# Generated by Django 5.1.3 on 2026-10-18 03:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0008_contract_text'),
+        ('services', '0002_rename_price_service_cost'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contract',
+            index=models.Index(fields=['end_date', 'id'], name='contract_end_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contract',
+            index=models.Index(fields=['cost', 'id'], name='contract_cost_id_idx'),
+        ),
+    ]
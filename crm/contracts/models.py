@@ -1,10 +1,15 @@
-import os
+import uuid
 from datetime import date
 
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
 from django.db import models
 from services.models import Service
 
+from .storage import get_document_storage
+
 
 class Contract(models.Model):
     """ORM view of Contract table."""
@@ -22,6 +27,7 @@ class Contract(models.Model):
     doc = models.FileField(
         null=False,
         upload_to="contracts",
+        storage=get_document_storage,
         help_text="the file with the contract document",
     )
     start_date = models.DateField(
@@ -32,6 +38,19 @@ class Contract(models.Model):
     end_date = models.DateField(null=False, help_text="contract completion date")
     cost = models.DecimalField(null=False, default=0, max_digits=8, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            # trigram search of customers by the contract name
+            GinIndex(
+                fields=["name"],
+                opclasses=["gin_trgm_ops"],
+                name="contract_name_trgm_idx",
+            ),
+            # keyset pagination of the contract and customer lists
+            models.Index(fields=["end_date", "id"], name="contract_end_date_id_idx"),
+            models.Index(fields=["cost", "id"], name="contract_cost_id_idx"),
+        ]
+
     def clean(self):
 
         start_date = self.start_date
@@ -45,10 +64,107 @@ class Contract(models.Model):
                 params={"start date": start_date, "end date": self.end_date},
             )
 
-    def delete(self, *args, **kwargs):
-        path = self.doc.path
-        os.remove(path)
-        super().delete(*args, **kwargs)
-
     def __str__(self):
         return f"{self.name}({self.pk})"
+
+
+class StoredDocument(models.Model):
+    """
+    Number of the contracts referring to a stored document.
+
+    Maintained by the handlers in contracts.signals, the document is queued
+    for deletion when the count drops to zero.
+    """
+
+    name = models.CharField(
+        max_length=255, primary_key=True, help_text="name of the file in the storage"
+    )
+    refcount = models.PositiveIntegerField(
+        null=False, default=0, help_text="number of the contracts with the document"
+    )
+
+    def __str__(self):
+        return f"{self.name}({self.refcount})"
+
+
+class DocumentDeletion(models.Model):
+    """
+    Outbox of the contract documents to delete.
+
+    A row is added in the transaction dropping the last reference
+    to the document (see contracts.signals), the files are removed
+    by the delete_contract_files command after the transaction has committed.
+    """
+
+    name = models.CharField(
+        max_length=255, null=False, help_text="name of the file in the storage"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Deletion of {self.name}({self.pk})"
+
+
+class UploadSession(models.Model):
+    """A chunked upload of a contract document, see contracts.uploads."""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        help_text="the user uploading the file",
+    )
+    filename = models.CharField(
+        max_length=255, null=False, help_text="name of the uploaded file"
+    )
+    size = models.BigIntegerField(null=False, help_text="size of the file in bytes")
+    received = models.BigIntegerField(
+        null=False, default=0, help_text="number of the received bytes"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"Upload of {self.filename}({self.pk})"
+
+
+class ContractText(models.Model):
+    """
+    Text of the contract document for the full-text search.
+
+    Filled by the extract_contract_text command, see contracts.text_search.
+    """
+
+    contract = models.OneToOneField(
+        Contract,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="text",
+        help_text="the contract",
+    )
+    doc_name = models.CharField(
+        max_length=255, null=False, help_text="name of the indexed file"
+    )
+    doc_hash = models.CharField(
+        max_length=64,
+        null=False,
+        db_index=True,
+        help_text="SHA-256 of the indexed file",
+    )
+    content = models.TextField(null=False, blank=True, help_text="the extracted text")
+    error = models.CharField(
+        max_length=255,
+        null=False,
+        blank=True,
+        help_text="why the text could not be extracted",
+    )
+    search = SearchVectorField(null=True)
+    indexed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search"], name="contract_text_search_idx"),
+        ]
+
+    def __str__(self):
+        return f"Text of contract ({self.contract_id})"
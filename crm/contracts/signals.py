@@ -0,0 +1,42 @@
+"""
+Signal handlers counting the references to the contract documents.
+
+post_delete is sent for every contract, also when the contract is deleted
+by a queryset or in a cascade (for example, together with its service),
+so no reference is left behind. The counters and the outbox are written
+in the same transaction, hence a file is only removed if the deletion
+commits. Replacing the document of a contract moves its reference.
+"""
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .documents import add_reference, drop_reference
+from .models import Contract
+
+
+@receiver(post_delete, sender=Contract)
+def drop_reference_on_delete(sender, instance: Contract, **kwargs):
+    if instance.doc:
+        drop_reference(instance.doc.name)
+
+
+@receiver(pre_save, sender=Contract)
+def remember_contract_doc(sender, instance: Contract, raw, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._old_doc = (
+        Contract.objects.filter(pk=instance.pk).values_list("doc", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Contract)
+def move_reference_on_save(sender, instance: Contract, created: bool, raw, **kwargs):
+    old_doc = None if created else getattr(instance, "_old_doc", None)
+    new_doc = instance.doc.name if instance.doc else None
+    if raw or old_doc == new_doc:
+        return
+    if new_doc:
+        add_reference(new_doc)
+    if old_doc:
+        drop_reference(old_doc)
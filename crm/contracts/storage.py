@@ -0,0 +1,96 @@
+"""
+Content-addressed storage of the contract documents.
+
+A document is stored under the SHA-256 of its content in a two-level
+sharded directory: contracts/ab/cd/abcd...<extension>. The hash is
+computed while the upload is streamed into a temporary file, which is
+then moved into place, so identical documents are stored once and no
+directory grows too large. The extension is kept to serve the files
+with the right content type.
+
+Several contracts may share a file. StoredDocument counts the references
+(see contracts.signals), and the file is queued for deletion only when
+the last one goes.
+"""
+
+import hashlib
+import os
+import posixpath
+import tempfile
+from typing import Optional
+
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# Directory of the partial uploads, inside the directory of the documents
+# so that they are moved into place on the same filesystem
+INCOMING_DIR = ".incoming"
+MAX_EXTENSION_LENGTH = 10
+
+
+def content_name(directory: str, sha256: str, filename: str) -> str:
+    """Name of the file with the hash in the sharded directory."""
+    extension: str = os.path.splitext(filename)[1].lower()
+    if len(extension) > MAX_EXTENSION_LENGTH:
+        extension = ""
+    return posixpath.join(directory, sha256[:2], sha256[2:4], sha256 + extension)
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage naming the files by the hash of their content."""
+
+    def get_available_name(self, name: str, max_length: Optional[int] = None) -> str:
+        # The same name means the same content, there is nothing to avoid
+        return name
+
+    def incoming_path(self, directory: str) -> str:
+        """Directory of the temporary files of the uploads to the directory."""
+        path: str = self.path(posixpath.join(directory, INCOMING_DIR))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _save(self, name: str, content: File) -> str:
+        directory: str = posixpath.dirname(name)
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=self.incoming_path(directory))
+        try:
+            with os.fdopen(fd, "wb") as file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    file.write(chunk)
+            return self.adopt(temp_path, digest.hexdigest(), name)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def adopt(self, temp_path: str, sha256: str, name: str) -> str:
+        """
+        Move an already hashed file of the storage into place.
+
+        :param temp_path: Path to the file, on the filesystem of the storage.
+        :param name: Name of the upload, its directory and extension are kept.
+        :return: The content-addressed name of the file.
+        """
+        final_name: str = content_name(posixpath.dirname(name), sha256, name)
+        path: str = self.path(final_name)
+        if os.path.exists(path):
+            # Refresh the time, so gc_contract_files does not take the file
+            # for an orphan before the new reference is saved
+            os.utime(path)
+            os.remove(temp_path)
+            return final_name
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(temp_path, self.file_permissions_mode)
+        os.replace(temp_path, path)
+        return final_name
+
+
+document_storage = ContentAddressedStorage()
+
+
+def get_document_storage() -> ContentAddressedStorage:
+    return document_storage
@@ -1,26 +1,55 @@
+import hashlib
 import os
+import shutil
+import time
 from datetime import date, timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
 from typing import Optional
 
 from advertising.factories import ServiceFactory
 from django.conf import settings
 from django.contrib.auth.models import Group, User
 from django.core.exceptions import ValidationError
-from django.test import TestCase
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from myauth.utils import create_group_managers
 
+from crm.pagination import encode_cursor
+
+from .documents import process_all_deletions
 from .factories import ContractFactory
-from .models import Contract
+from .models import (
+    Contract,
+    ContractText,
+    DocumentDeletion,
+    StoredDocument,
+    UploadSession,
+)
+from .storage import document_storage
+from .text_search import MAX_TEXT_LENGTH, index_documents
+from .uploads import _hashers
+from .uploads import finalize as finalize_upload
+from .uploads import part_path, write_chunk
 
 
 def _clear_test_files():
     """Clear generated files"""
-    path = settings.BASE_DIR / "upload" / "contracts"
+    path = Path(settings.MEDIA_ROOT) / "contracts"
+    if not path.exists():
+        return
     files = os.listdir(path)
     for filename in files:
         file_path = path / filename
-        os.remove(file_path)
+        if os.path.isdir(file_path):
+            shutil.rmtree(file_path)
+        else:
+            os.remove(file_path)
 
 
 class ContractTestCase(TestCase):
@@ -265,3 +294,780 @@ class ContractDeleteViewTest(TestCase):
         # Check that there is no data for the old primary key
         not_existing_ads = Contract.objects.filter(pk=self.contract.pk).first()
         self.assertIsNone(not_existing_ads)
+
+
+class ContractDocumentViewTest(TestCase):
+    """Test case class for testing the view serving the contract document."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.credentials = dict(username="test", password="test")
+        cls.user = User.objects.create_user(**cls.credentials)
+        create_group_managers()
+        cls.group = Group.objects.get(name="managers")
+        cls.user.groups.add(cls.group)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.user.delete()
+        cls.group.delete()
+
+    def setUp(self):
+        self.client.login(**self.credentials)
+        self.contract = ContractFactory.create(name="Document contract")
+        self.url = reverse(
+            "contracts:contract_document", kwargs={"pk": self.contract.pk}
+        )
+
+    def tearDown(self):
+        self.contract.delete()
+
+        _clear_test_files()
+
+    def test_permission_required(self):
+        """Users without view_contract do not get the document."""
+        User.objects.create_user(username="nobody", password="nobody")
+        self.client.login(username="nobody", password="nobody")
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(PROTECTED_MEDIA_X_ACCEL=True)
+    def test_x_accel_redirect(self):
+        """With nginx the view sends only the headers."""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response["X-Accel-Redirect"], "/protected-media/" + self.contract.doc.name
+        )
+        self.assertEqual(response.content, b"")
+        self.assertIn("private", response["Cache-Control"])
+
+    @override_settings(PROTECTED_MEDIA_X_ACCEL=False)
+    def test_whole_file(self):
+        """Without nginx the view streams the file with the caching headers."""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"Some data")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertIn("ETag", response)
+        self.assertIn("Last-Modified", response)
+        self.assertIn("inline", response["Content-Disposition"])
+
+    @override_settings(PROTECTED_MEDIA_X_ACCEL=False)
+    def test_not_modified(self):
+        """The same ETag or Last-Modified is answered with 304."""
+        response = self.client.get(self.url)
+
+        by_etag = self.client.get(self.url, headers={"If-None-Match": response["ETag"]})
+        by_date = self.client.get(
+            self.url, headers={"If-Modified-Since": response["Last-Modified"]}
+        )
+
+        self.assertEqual(by_etag.status_code, 304)
+        self.assertEqual(by_date.status_code, 304)
+
+    @override_settings(PROTECTED_MEDIA_X_ACCEL=False)
+    def test_ranges(self):
+        """Single byte ranges are served with 206, the wrong ones with 416."""
+        for header, content, content_range in (
+            ("bytes=0-3", b"Some", "bytes 0-3/9"),
+            ("bytes=5-", b"data", "bytes 5-8/9"),
+            ("bytes=-4", b"data", "bytes 5-8/9"),
+            ("bytes=5-100", b"data", "bytes 5-8/9"),
+        ):
+            with self.subTest(header=header):
+                response = self.client.get(self.url, headers={"Range": header})
+
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(b"".join(response.streaming_content), content)
+                self.assertEqual(response["Content-Range"], content_range)
+                self.assertEqual(response["Content-Length"], str(len(content)))
+
+        response = self.client.get(self.url, headers={"Range": "bytes=9-"})
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */9")
+
+    @override_settings(PROTECTED_MEDIA_X_ACCEL=False)
+    def test_if_range(self):
+        """The whole file is sent if the file has changed since If-Range."""
+        response = self.client.get(
+            self.url, headers={"Range": "bytes=0-3", "If-Range": '"stale"'}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"Some data")
+
+
+class DocumentDeletionTest(TestCase):
+    """Test case class for testing the deletion of the contract documents."""
+
+    def setUp(self):
+        self.product = ServiceFactory.create()
+        self.contract = ContractFactory.create(
+            name="Deleted contract", product=self.product
+        )
+        self.path = self.contract.doc.path
+
+    def tearDown(self):
+        _clear_test_files()
+
+    def test_cascade_queues_document(self):
+        """Deleting the service queues the document of its contract."""
+        self.product.delete()
+
+        self.assertTrue(
+            DocumentDeletion.objects.filter(name=self.contract.doc.name).exists()
+        )
+        # The file is kept until the worker runs
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_worker_deletes_files_after_commit(self):
+        """The worker removes the queued files and empties the outbox."""
+        self.contract.delete()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            processed: int = process_all_deletions(batch_size=1)
+            self.assertTrue(os.path.exists(self.path))
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(processed, 1)
+        self.assertFalse(DocumentDeletion.objects.exists())
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_shared_document_is_kept(self):
+        """A file is kept while another contract refers to it."""
+        sharing: Contract = ContractFactory.create(
+            name="Sharing contract", product=self.product
+        )
+        self.assertEqual(sharing.doc.name, self.contract.doc.name)
+        self.assertEqual(
+            StoredDocument.objects.get(name=self.contract.doc.name).refcount, 2
+        )
+
+        self.contract.delete()
+        self.assertFalse(DocumentDeletion.objects.exists())
+
+        sharing.delete()
+        self.assertTrue(DocumentDeletion.objects.exists())
+        self.assertFalse(StoredDocument.objects.exists())
+
+    def test_reused_document_is_kept(self):
+        """The worker keeps a queued file referred to again."""
+        self.contract.delete()
+        ContractFactory.create(name="New contract", product=self.product)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            process_all_deletions()
+
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_document_adopted_after_queued_is_kept(self):
+        """The worker keeps a queued file stored again by an uncommitted save."""
+        self.contract.delete()
+        # A concurrent save refreshes the time of the file it reuses
+        later: float = time.time() + 60
+        os.utime(self.path, (later, later))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            processed: int = process_all_deletions()
+
+        self.assertEqual(processed, 1)
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_missing_file(self):
+        """A contract whose file is already gone can be deleted."""
+        os.remove(self.path)
+
+        self.contract.delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            process_all_deletions()
+
+        self.assertFalse(Contract.objects.filter(pk=self.contract.pk).exists())
+
+    def test_rebuild_document_references(self):
+        """The command recounts the references from the contracts."""
+        StoredDocument.objects.all().delete()
+
+        call_command("rebuild_document_references", stdout=StringIO())
+
+        self.assertEqual(
+            StoredDocument.objects.get(name=self.contract.doc.name).refcount, 1
+        )
+
+    def test_replaced_document_is_queued(self):
+        """Saving a contract with another document queues the old one."""
+        old_name: str = self.contract.doc.name
+        self.contract.doc = default_storage.save(
+            "contracts/new.txt", ContentFile(b"New")
+        )
+        self.contract.save()
+
+        self.assertTrue(DocumentDeletion.objects.filter(name=old_name).exists())
+
+    def test_gc_contract_files(self):
+        """The collector reports and deletes only the old unreferenced files."""
+        orphan: str = default_storage.save("contracts/orphan.txt", ContentFile(b"x"))
+        fresh: str = default_storage.save("contracts/fresh.txt", ContentFile(b"x"))
+        old: float = time.time() - 7200
+        for name in (orphan, self.contract.doc.name):
+            os.utime(default_storage.path(name), (old, old))
+
+        out = StringIO()
+        call_command("gc_contract_files", stdout=out)
+        self.assertIn(orphan, out.getvalue())
+        self.assertNotIn(fresh, out.getvalue())
+        self.assertNotIn(self.contract.doc.name, out.getvalue())
+        self.assertTrue(default_storage.exists(orphan))
+
+        call_command("gc_contract_files", "--delete", stdout=StringIO())
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertTrue(default_storage.exists(fresh))
+        self.assertTrue(os.path.exists(self.path))
+
+
+class ContentAddressedStorageTest(TestCase):
+    """Test case class for testing the storage of the contract documents."""
+
+    def tearDown(self):
+        _clear_test_files()
+
+    def test_name_is_hash_of_content(self):
+        """Files are stored in sharded directories under their hash."""
+        sha256: str = hashlib.sha256(b"Contract text").hexdigest()
+
+        name: str = document_storage.save(
+            "contracts/Contract.PDF", ContentFile(b"Contract text")
+        )
+
+        self.assertEqual(name, f"contracts/{sha256[:2]}/{sha256[2:4]}/{sha256}.pdf")
+        with document_storage.open(name) as file:
+            self.assertEqual(file.read(), b"Contract text")
+        self.assertFalse(
+            os.listdir(document_storage.path("contracts/.incoming")),
+            "temporary files are left",
+        )
+
+    def test_identical_files_are_stored_once(self):
+        """The same content gets the same name, different content another."""
+        first: str = document_storage.save("contracts/a.txt", ContentFile(b"Same"))
+        second: str = document_storage.save("contracts/b.txt", ContentFile(b"Same"))
+        other: str = document_storage.save("contracts/c.txt", ContentFile(b"Other"))
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+
+
+class ChunkedUploadTest(TestCase):
+    """Test case class for testing the chunked uploads of the documents."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.credentials = dict(username="test", password="test")
+        cls.user = User.objects.create_user(**cls.credentials)
+        create_group_managers()
+        cls.group = Group.objects.get(name="managers")
+        cls.user.groups.add(cls.group)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.user.delete()
+        cls.group.delete()
+
+    def setUp(self):
+        self.client.login(**self.credentials)
+        self.contract = ContractFactory.create(name="Uploaded contract")
+        self.content = b"0123456789" * 10
+
+    def tearDown(self):
+        _hashers.clear()
+        _clear_test_files()
+
+    def open_upload(self) -> dict:
+        response = self.client.post(
+            reverse("contracts:upload_open"),
+            {"filename": "scan.pdf", "size": len(self.content)},
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def put_chunk(self, url: str, offset: int, chunk: bytes):
+        return self.client.put(
+            url,
+            chunk,
+            content_type="application/octet-stream",
+            headers={"Upload-Offset": str(offset)},
+        )
+
+    def finalize(self, upload: dict):
+        return self.client.post(
+            reverse("contracts:upload_finalize", kwargs={"pk": upload["id"]}),
+            {"contract": self.contract.pk},
+        )
+
+    def test_upload_in_chunks(self):
+        """The chunks are joined, hashed and attached to the contract."""
+        upload: dict = self.open_upload()
+
+        for offset in range(0, len(self.content), 30):
+            chunk: bytes = self.content[offset:][:30]
+            response = self.put_chunk(upload["url"], offset, chunk)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["offset"], offset + len(chunk))
+        response = self.finalize(upload)
+
+        self.assertEqual(response.status_code, 200)
+        sha256: str = hashlib.sha256(self.content).hexdigest()
+        self.contract.refresh_from_db()
+        self.assertEqual(
+            self.contract.doc.name, f"contracts/{sha256[:2]}/{sha256[2:4]}/{sha256}.pdf"
+        )
+        with self.contract.doc.open() as file:
+            self.assertEqual(file.read(), self.content)
+        self.assertEqual(
+            StoredDocument.objects.get(name=self.contract.doc.name).refcount, 1
+        )
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_resume(self):
+        """A resumed upload reports its offset and rejects wrong ones."""
+        upload: dict = self.open_upload()
+        self.put_chunk(upload["url"], 0, self.content[:40])
+        # The next chunks are served by another process
+        _hashers.clear()
+
+        self.assertEqual(self.client.get(upload["url"]).json()["offset"], 40)
+        response = self.put_chunk(upload["url"], 20, self.content[20:])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["offset"], 40)
+
+        self.put_chunk(upload["url"], 40, self.content[40:])
+        self.finalize(upload)
+
+        self.contract.refresh_from_db()
+        self.assertIn(hashlib.sha256(self.content).hexdigest(), self.contract.doc.name)
+
+    def test_chunk_received_before_lock(self):
+        """The session is locked only after the whole chunk is read."""
+        upload: dict = self.open_upload()
+        session: UploadSession = UploadSession.objects.get(pk=upload["id"])
+        body = BytesIO(self.content)
+        locked: list = []
+
+        def read(size: int) -> bytes:
+            locked.append(
+                any("FOR UPDATE" in query["sql"] for query in queries.captured_queries)
+            )
+            return body.read(size)
+
+        with CaptureQueriesContext(connection) as queries:
+            offset: int = write_chunk(session, 0, len(self.content), read)
+
+        self.assertEqual(offset, len(self.content))
+        self.assertTrue(locked)
+        self.assertFalse(any(locked))
+        self.assertTrue(
+            any("FOR UPDATE" in query["sql"] for query in queries.captured_queries)
+        )
+        with open(part_path(session), "rb") as file:
+            self.assertEqual(file.read(), self.content)
+
+    def test_finalize_rolled_back(self):
+        """The part file is kept until the finalized upload is committed."""
+        upload: dict = self.open_upload()
+        self.put_chunk(upload["url"], 0, self.content)
+        session: UploadSession = UploadSession.objects.get(pk=upload["id"])
+
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                finalize_upload(session, self.contract)
+                raise DatabaseError("The contract form failed")
+
+        self.assertTrue(UploadSession.objects.filter(pk=session.pk).exists())
+        self.assertTrue(os.path.exists(part_path(session)))
+        with self.captureOnCommitCallbacks(execute=True):
+            name: str = finalize_upload(session, self.contract)
+        with default_storage.open(name) as file:
+            self.assertEqual(file.read(), self.content)
+        self.assertFalse(os.path.exists(part_path(session)))
+
+    def test_incomplete_upload(self):
+        """An upload cannot be finalized or overflow before all the data."""
+        upload: dict = self.open_upload()
+        self.put_chunk(upload["url"], 0, self.content[:40])
+
+        self.assertEqual(self.finalize(upload).status_code, 409)
+        response = self.put_chunk(upload["url"], 40, self.content + b"extra")
+        self.assertEqual(response.status_code, 400)
+
+    def test_permission_required(self):
+        """Users without change_contract cannot upload."""
+        User.objects.create_user(username="nobody", password="nobody")
+        self.client.login(username="nobody", password="nobody")
+
+        response = self.client.post(
+            reverse("contracts:upload_open"), {"filename": "a.txt", "size": 1}
+        )
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_chunk_length_is_checked(self):
+        """A chunk without a positive Content-Length is rejected."""
+        upload: dict = self.open_upload()
+        self.put_chunk(upload["url"], 0, self.content[:40])
+
+        for length, status in (("", 411), ("0", 400), ("-20", 400), ("abc", 400)):
+            with self.subTest(length=length):
+                response = self.client.generic(
+                    "PUT",
+                    upload["url"],
+                    self.content[40:],
+                    content_type="application/octet-stream",
+                    headers={"Upload-Offset": "40"},
+                    CONTENT_LENGTH=length,
+                )
+
+                self.assertEqual(response.status_code, status)
+        self.assertEqual(self.client.get(upload["url"]).json()["offset"], 40)
+
+    def upload(self) -> str:
+        """Upload the content in one chunk, return the id of the session."""
+        upload: dict = self.open_upload()
+        self.put_chunk(upload["url"], 0, self.content)
+        return upload["id"]
+
+    def contract_form_data(self, **data) -> dict:
+        return {
+            "name": "Contract from an upload",
+            "product": self.contract.product_id,
+            "end_date": date.today() + timedelta(days=30),
+            "cost": 100,
+            **data,
+        }
+
+    def test_create_contract_from_upload(self):
+        """The contract form takes a finished upload in place of the file."""
+        response = self.client.post(
+            reverse("contracts:contract_create"),
+            self.contract_form_data(upload=self.upload()),
+        )
+
+        self.assertRedirects(response, reverse("contracts:contracts_list"))
+        contract: Contract = Contract.objects.get(name="Contract from an upload")
+        self.assertIn(hashlib.sha256(self.content).hexdigest(), contract.doc.name)
+        self.assertEqual(StoredDocument.objects.get(name=contract.doc.name).refcount, 1)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_update_contract_from_upload(self):
+        """The document of an updated contract is replaced by the upload."""
+        response = self.client.post(
+            reverse("contracts:contract_edit", kwargs={"pk": self.contract.pk}),
+            self.contract_form_data(upload=self.upload(), name=self.contract.name),
+        )
+
+        self.assertEqual(response.status_code, 302)
+        self.contract.refresh_from_db()
+        self.assertIn(hashlib.sha256(self.content).hexdigest(), self.contract.doc.name)
+        self.assertEqual(self.contract.cost, 100)
+
+    def test_contract_form_requires_document(self):
+        """Without the file and the upload the form is invalid."""
+        response = self.client.post(
+            reverse("contracts:contract_create"), self.contract_form_data()
+        )
+
+        self.assertFormError(response.context["form"], "doc", "This field is required.")
+
+    def test_contract_form_rejects_unfinished_upload(self):
+        """An incomplete upload or one of another user is not accepted."""
+        upload: dict = self.open_upload()
+        self.put_chunk(upload["url"], 0, self.content[:40])
+        other = User.objects.create_user(username="other", password="other")
+        foreign: UploadSession = UploadSession.objects.create(
+            user=other, filename="scan.pdf", size=1, received=1
+        )
+
+        for session_id in (upload["id"], foreign.pk):
+            with self.subTest(session_id=session_id):
+                response = self.client.post(
+                    reverse("contracts:contract_create"),
+                    self.contract_form_data(upload=session_id),
+                )
+
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.context["form"].has_error("upload"))
+        self.assertFalse(Contract.objects.filter(name="Contract from an upload"))
+
+    def test_gc_upload_sessions(self):
+        """Stale sessions are removed with their part files."""
+        upload: dict = self.open_upload()
+        session: UploadSession = UploadSession.objects.get(pk=upload["id"])
+        path: str = part_path(session)
+
+        call_command("gc_upload_sessions", stdout=StringIO())
+        self.assertTrue(os.path.exists(path))
+
+        call_command("gc_upload_sessions", "--ttl", "-1", stdout=StringIO())
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+
+class ContractTextSearchTest(TestCase):
+    """Test case class for testing the full-text search over the documents."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.credentials = dict(username="test", password="test")
+        cls.user = User.objects.create_user(**cls.credentials)
+        create_group_managers()
+        cls.group = Group.objects.get(name="managers")
+        cls.user.groups.add(cls.group)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.user.delete()
+        cls.group.delete()
+
+    def setUp(self):
+        self.client.login(**self.credentials)
+        self.product = ServiceFactory.create()
+        self.supply = self.create_contract(
+            "Supply contract",
+            "supply.txt",
+            b"Supply agreement. The supplier delivers the equipment to the buyer.",
+        )
+        self.lease = self.create_contract(
+            "Lease contract",
+            "lease.txt",
+            "Договор аренды, lease agreement: office & warehouse".encode("cp1251"),
+        )
+
+    def tearDown(self):
+        _clear_test_files()
+
+    def create_contract(self, name: str, filename: str, content: bytes) -> Contract:
+        contract: Contract = ContractFactory.create(name=name, product=self.product)
+        contract.doc.save(filename, ContentFile(content))
+        return contract
+
+    def search(self, query: str) -> list:
+        response = self.client.get(reverse("contracts:contract_search"), {"q": query})
+        self.assertEqual(response.status_code, 200)
+        return response.json()["results"]
+
+    def test_index_documents(self):
+        """The texts are extracted once, until the document changes."""
+        self.assertEqual(call_command_output("extract_contract_text"), 2)
+        self.assertEqual(index_documents(), 0)
+
+        text: ContractText = ContractText.objects.get(contract=self.lease)
+        self.assertIn("аренды", text.content)
+        self.assertEqual(text.doc_name, self.lease.doc.name)
+        self.assertEqual(text.error, "")
+
+        self.lease.doc.save("lease.txt", ContentFile("Новый договор".encode()))
+        self.assertEqual(index_documents(), 1)
+
+    def test_long_utf8_document(self):
+        """A UTF-8 document cut in the middle of a character stays UTF-8."""
+        content: bytes = ("Договор " * (MAX_TEXT_LENGTH // 8)).encode()
+        cut: bytes = content[: MAX_TEXT_LENGTH + 4]
+        with self.assertRaises(UnicodeDecodeError):
+            cut.decode("utf-8")
+        contract: Contract = self.create_contract("Long contract", "long.txt", content)
+
+        index_documents()
+
+        text: ContractText = ContractText.objects.get(contract=contract)
+        self.assertEqual(text.error, "")
+        self.assertEqual(text.content, cut[:-1].decode("utf-8"))
+
+    def test_same_document_is_not_extracted_again(self):
+        """A document indexed for another contract is copied."""
+        index_documents()
+        copy: Contract = ContractFactory.create(
+            name="Supply copy", product=self.product, doc=self.supply.doc.name
+        )
+
+        self.assertEqual(index_documents(), 1)
+        self.assertEqual(
+            ContractText.objects.get(contract=copy).content,
+            ContractText.objects.get(contract=self.supply).content,
+        )
+
+    def test_unsupported_document(self):
+        """Unsupported files are recorded with the error and not retried."""
+        image: Contract = self.create_contract("Scan", "scan.png", b"\x89PNG")
+
+        index_documents()
+
+        self.assertIn("Unsupported", ContractText.objects.get(contract=image).error)
+        self.assertEqual(index_documents(), 0)
+        self.assertEqual(index_documents(retry_errors=True), 1)
+
+    def test_search(self):
+        """The matching contracts are ranked and have escaped snippets."""
+        index_documents()
+
+        results = self.search("equipments")
+        self.assertEqual([result["pk"] for result in results], [self.supply.pk])
+        self.assertIn("<mark>", results[0]["snippet"])
+
+        results = self.search("warehouse")
+        self.assertEqual([result["pk"] for result in results], [self.lease.pk])
+        self.assertIn("&amp;", results[0]["snippet"])
+
+        results = self.search("agreement -lease")
+        self.assertEqual([result["pk"] for result in results], [self.supply.pk])
+        self.assertEqual(self.search(""), [])
+
+
+class ContractTextWorkersTest(TransactionTestCase):
+    """Test case class for testing the extraction in worker processes."""
+
+    def tearDown(self):
+        _clear_test_files()
+
+    def test_index_documents_in_workers(self):
+        """The forked workers extract the texts, the parent saves them."""
+        product = ServiceFactory.create()
+        contracts: list = []
+        for index in range(3):
+            contract: Contract = ContractFactory.create(
+                name=f"Contract {index}", product=product
+            )
+            contract.doc.save("doc.txt", ContentFile(f"Document {index}".encode()))
+            contracts.append(contract)
+
+        self.assertEqual(index_documents(batch_size=2, workers=2), 3)
+
+        for index, contract in enumerate(contracts):
+            self.assertEqual(
+                ContractText.objects.get(contract=contract).content,
+                f"Document {index}",
+            )
+
+
+def call_command_output(*args) -> int:
+    """Run the extract_contract_text command, return the indexed count."""
+    out = StringIO()
+    call_command(*args, "--workers", "1", stdout=out)
+    return int(out.getvalue().split("Done: ")[1].split()[0])
+
+
+class ContractListFilterTest(TestCase):
+    """Test case class for testing the pagination and filters of contracts."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.credentials = dict(username="test", password="test")
+        cls.user = User.objects.create_user(**cls.credentials)
+        create_group_managers()
+        cls.group = Group.objects.get(name="managers")
+        cls.user.groups.add(cls.group)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.user.delete()
+        cls.group.delete()
+
+    def setUp(self):
+        self.client.login(**self.credentials)
+        self.product = ServiceFactory.create()
+        self.other_product = ServiceFactory.create()
+        for index in range(12):
+            ContractFactory.create(
+                name=f"Contract {index:02d}",
+                product=self.product if index % 2 else self.other_product,
+                end_date=date.today() + timedelta(days=10 + index % 5),
+                cost=10 * (index % 4),
+            )
+        self.url = reverse("contracts:contracts_list")
+
+    def tearDown(self):
+        _clear_test_files()
+
+    def walk(self, params: dict) -> list:
+        """The pks of the contracts on all the pages."""
+        pks: list = []
+        response = self.client.get(self.url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.context["contracts"]), 5)
+            pks.extend(contract.pk for contract in response.context["contracts"])
+            if response.context["next_cursor"] is None:
+                return pks
+            response = self.client.get(
+                self.url, {**params, "after": response.context["next_cursor"]}
+            )
+
+    @override_settings(CONTRACTS_PAGE_SIZE=5)
+    def test_sort_and_filter(self):
+        """All the pages together are the filtered contracts in the order."""
+        contracts = Contract.objects.all()
+        for params, expected in (
+            ({}, contracts.order_by("name")),
+            ({"sort": "-cost"}, contracts.order_by("-cost", "-pk")),
+            (
+                {"sort": "end_date", "cost_min": "10", "cost_max": "20"},
+                contracts.filter(cost__range=(10, 20)).order_by("end_date", "pk"),
+            ),
+            (
+                {
+                    "sort": "-end_date",
+                    "product": self.product.pk,
+                    "end_date_from": date.today() + timedelta(days=11),
+                    "end_date_to": date.today() + timedelta(days=13),
+                },
+                contracts.filter(
+                    product=self.product,
+                    end_date__range=(
+                        date.today() + timedelta(days=11),
+                        date.today() + timedelta(days=13),
+                    ),
+                ).order_by("-end_date", "-pk"),
+            ),
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(
+                    self.walk(params), list(expected.values_list("pk", flat=True))
+                )
+
+    def test_cursor_of_wrong_types(self):
+        """A cursor not matching the types of the sort key is rejected."""
+        for sort, values in (
+            ("end_date", [1, 1]),
+            ("end_date", ["2024-13-01", 1]),
+            ("cost", ["abc", 1]),
+        ):
+            with self.subTest(sort=sort, values=values):
+                response = self.client.get(
+                    self.url, {"sort": sort, "after": encode_cursor(values)}
+                )
+
+                self.assertEqual(response.status_code, 404)
+
+    def test_invalid_filter_is_ignored(self):
+        """Invalid filters are ignored, the valid ones are applied."""
+        response = self.client.get(
+            self.url, {"cost_min": "abc", "product": self.product.pk}
+        )
+
+        self.assertEqual(len(response.context["contracts"]), 6)
+        self.assertIn("cost_min", response.context["filter_form"].errors)
+
+    def test_number_of_queries_does_not_depend_on_page_size(self):
+        """A page of contracts is fetched by one query."""
+        self.client.get(self.url)  # warm the cached user and permissions
+        with self.settings(CONTRACTS_PAGE_SIZE=2):
+            with CaptureQueriesContext(connection) as small_page:
+                self.client.get(self.url, {"sort": "cost"})
+        with self.settings(CONTRACTS_PAGE_SIZE=10):
+            with CaptureQueriesContext(connection) as large_page:
+                self.client.get(self.url, {"sort": "cost"})
+
+        self.assertEqual(len(small_page), len(large_page))
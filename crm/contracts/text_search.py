@@ -0,0 +1,340 @@
+"""
+Full-text search over the contract documents.
+
+The text of every document is extracted by the extract_contract_text
+command, never in the request path: the command picks the contracts
+whose document is not indexed yet or has changed since, extracts the
+texts in a pool of worker processes batch by batch and stores them
+in ContractText together with a tsvector for the search. Every batch is
+committed, so an interrupted run resumes where it has stopped.
+
+ContractText keeps the SHA-256 of the indexed file. The documents are
+stored under their hashes (see contracts.storage), so a document
+indexed once for another contract is copied instead of being
+extracted again.
+
+Plain text and PDF are supported, PDF requires pypdf
+(pip install pypdf).
+"""
+
+import codecs
+import hashlib
+import html
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from importlib.util import find_spec
+from multiprocessing import get_context
+from typing import Callable, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchHeadline,
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+)
+from django.db import connections, transaction
+from django.db.models import F, Q, QuerySet
+from django.urls import reverse
+
+from .models import Contract, ContractText
+from .storage import document_storage
+
+TEXT_EXTENSIONS = frozenset([".txt", ".text", ".md", ".csv"])
+# Longer texts are cut, a tsvector holds at most 1 MB
+MAX_TEXT_LENGTH = 500_000
+READ_CHUNK_SIZE = 64 * 1024
+
+_CONTROL_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+_SHA256_NAME = re.compile(r"^[0-9a-f]{64}$")
+# Highlighting markers of ts_headline, replaced by <mark> after escaping
+_START_SEL, _STOP_SEL = "\x01", "\x02"
+
+
+class UnsupportedDocument(Exception):
+    """The text of the document cannot be extracted."""
+
+
+@dataclass
+class Extracted:
+    """Result of the extraction of the document of a contract."""
+
+    contract_id: int
+    doc_name: str
+    doc_hash: str
+    content: str = ""
+    error: str = ""
+
+
+@dataclass
+class ContractSearchResult:
+    pk: int
+    name: str
+    rank: float
+    snippet: str
+    url: str
+
+
+def search_config() -> str:
+    return settings.CONTRACT_TEXT_SEARCH_CONFIG
+
+
+def pdf_available() -> bool:
+    """Whether pypdf is installed."""
+    return find_spec("pypdf") is not None
+
+
+def name_hash(name: str) -> Optional[str]:
+    """The SHA-256 of a content-addressed document taken from its name."""
+    stem: str = os.path.splitext(os.path.basename(name))[0]
+    return stem if _SHA256_NAME.match(stem) else None
+
+
+def clean_text(text: str) -> str:
+    return _CONTROL_CHARS.sub(" ", text)[:MAX_TEXT_LENGTH]
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(READ_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_text(path: str) -> str:
+    # A few bytes more than the longest text in the single-byte encoding
+    limit: int = MAX_TEXT_LENGTH + 4
+    with open(path, "rb") as file:
+        data: bytes = file.read(limit)
+    # A cut file may end in the middle of a character, which is dropped
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        return decoder.decode(data, final=len(data) < limit)
+    except UnicodeDecodeError:
+        # The documents of the Russian offices are often in cp1251
+        return data.decode("cp1251", errors="replace")
+
+
+def _read_pdf(path: str) -> str:
+    if not pdf_available():
+        raise UnsupportedDocument('PDF documents require "pypdf"')
+    from pypdf import PdfReader
+    from pypdf.errors import PyPdfError
+
+    pages: List[str] = []
+    length: int = 0
+    try:
+        for page in PdfReader(path).pages:
+            text: str = page.extract_text() or ""
+            pages.append(text)
+            length += len(text)
+            if length >= MAX_TEXT_LENGTH:
+                break
+    except PyPdfError as exc:
+        raise UnsupportedDocument(f"Broken PDF: {exc}")
+    return "\n".join(pages)
+
+
+def extract_text(path: str) -> str:
+    """
+    Text of the document file.
+
+    :raise UnsupportedDocument: If the format is not supported.
+    """
+    extension: str = os.path.splitext(path)[1].lower()
+    if extension == ".pdf":
+        return _read_pdf(path)
+    if extension in TEXT_EXTENSIONS:
+        return _read_text(path)
+    with open(path, "rb") as file:
+        if file.read(5) == b"%PDF-":
+            return _read_pdf(path)
+    raise UnsupportedDocument(f"Unsupported format: {extension or 'no extension'}")
+
+
+def extract(task: Extracted) -> Extracted:
+    """
+    Extract the text of the document of the task, run by the worker processes.
+
+    The task carries the contract, the name of the document and its hash
+    if the name tells it. The function does not use the database.
+    """
+    path: str = document_storage.path(task.doc_name)
+    try:
+        task.doc_hash = task.doc_hash or file_hash(path)
+        task.content = clean_text(extract_text(path))
+    except FileNotFoundError:
+        task.error = "The file does not exist"
+    except (OSError, UnsupportedDocument) as exc:
+        task.error = str(exc)[:255]
+    return task
+
+
+def pending_contracts(retry_errors: bool = False) -> QuerySet[Contract]:
+    """The contracts whose document is not indexed yet or has changed."""
+    condition = Q(text__isnull=True) | ~Q(text__doc_name=F("doc"))
+    if retry_errors:
+        condition |= ~Q(text__error="")
+    return Contract.objects.exclude(doc="").filter(condition).order_by("pk")
+
+
+def _save(results: Iterable[Extracted]) -> int:
+    rows: List[ContractText] = [
+        ContractText(
+            contract_id=result.contract_id,
+            doc_name=result.doc_name,
+            doc_hash=result.doc_hash,
+            content=result.content,
+            error=result.error,
+        )
+        for result in results
+    ]
+    with transaction.atomic():
+        ContractText.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["contract"],
+            update_fields=["doc_name", "doc_hash", "content", "error", "indexed_at"],
+        )
+        ContractText.objects.filter(pk__in=[row.pk for row in rows]).update(
+            search=SearchVector("content", config=search_config())
+        )
+    return len(rows)
+
+
+def _start_workers(workers: int) -> ProcessPoolExecutor:
+    """Fork the worker processes."""
+    # The forked workers must not share the connections of the parent
+    connections.close_all()
+    for conn in connections.all():
+        if conn.settings_dict["OPTIONS"].get("pool"):
+            conn.close_pool()
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("fork"))
+    # The processes are forked on the first task, before the connections
+    # are opened again
+    executor.submit(int).result()
+    return executor
+
+
+def index_documents(
+    batch_size: int = 100,
+    workers: int = 1,
+    retry_errors: bool = False,
+    log: Callable[[str], None] = lambda message: None,
+) -> int:
+    """
+    Extract and index the texts of the pending documents.
+
+    :param workers: Number of the worker processes, 1 extracts in this one.
+    :param retry_errors: Also extract the documents which failed before.
+    :param log: Callback receiving the progress messages.
+    :return: Number of the indexed documents.
+    """
+    # The workers are started on the first documents to extract
+    executor: Optional[ProcessPoolExecutor] = None
+    indexed: int = 0
+    last_pk: int = 0
+    try:
+        while True:
+            batch = list(
+                pending_contracts(retry_errors)
+                .filter(pk__gt=last_pk)
+                .values_list("pk", "doc")[:batch_size]
+            )
+            if not batch:
+                return indexed
+            last_pk = batch[-1][0]
+            tasks: List[Extracted] = [
+                Extracted(pk, name, name_hash(name) or "") for pk, name in batch
+            ]
+
+            # Documents with the same content indexed before are copied
+            known: Dict[str, ContractText] = {
+                text.doc_hash: text
+                for text in ContractText.objects.filter(
+                    doc_hash__in={task.doc_hash for task in tasks if task.doc_hash},
+                    error="",
+                ).only("doc_hash", "content")
+            }
+            results: List[Extracted] = []
+            to_extract: List[Extracted] = []
+            for task in tasks:
+                if task.doc_hash in known:
+                    task.content = known[task.doc_hash].content
+                    results.append(task)
+                else:
+                    to_extract.append(task)
+
+            if workers <= 1 or not to_extract:
+                results.extend(map(extract, to_extract))
+            else:
+                if executor is None:
+                    executor = _start_workers(workers)
+                results.extend(
+                    executor.map(
+                        extract,
+                        to_extract,
+                        chunksize=max(1, len(to_extract) // workers),
+                    )
+                )
+            indexed += _save(results)
+            log(f"Indexed {indexed} documents")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def search_contracts(query: str, limit: int) -> List[ContractSearchResult]:
+    """
+    The contracts whose documents match the query, the best first.
+
+    The query is in the syntax of web search engines: words, "phrases",
+    or, -excluded. The snippets are HTML with the matches in <mark>.
+    """
+    query = query.strip()
+    if not query:
+        return []
+    search_query = SearchQuery(query, search_type="websearch", config=search_config())
+
+    ranked = list(
+        ContractText.objects.filter(search=search_query)
+        .annotate(rank=SearchRank(F("search"), search_query))
+        .order_by("-rank", "pk")
+        .values_list("pk", "rank")[:limit]
+    )
+    if not ranked:
+        return []
+    # The headlines are costly, they are built for the top results only
+    headlines: Dict[int, tuple] = {
+        pk: (name, snippet)
+        for pk, name, snippet in ContractText.objects.filter(
+            pk__in=[pk for pk, _ in ranked]
+        )
+        .annotate(
+            snippet=SearchHeadline(
+                "content",
+                search_query,
+                config=search_config(),
+                start_sel=_START_SEL,
+                stop_sel=_STOP_SEL,
+                max_fragments=3,
+                fragment_delimiter=" … ",
+            )
+        )
+        .values_list("pk", "contract__name", "snippet")
+    }
+    return [
+        ContractSearchResult(
+            pk=pk,
+            name=headlines[pk][0],
+            rank=rank,
+            snippet=html.escape(headlines[pk][1])
+            .replace(_START_SEL, "<mark>")
+            .replace(_STOP_SEL, "</mark>"),
+            url=reverse("contracts:contract_detail", kwargs={"pk": pk}),
+        )
+        for pk, rank in ranked
+    ]
@@ -0,0 +1,264 @@
+"""
+Chunked resumable uploads of the contract documents.
+
+A client opens an upload session with the name and the size of the file,
+sends the file in chunks, each with the offset it starts at, and
+finalizes the session with the contract the document belongs to, or
+sends the id of the session in place of the file with a form creating
+or updating the contract (see contracts.forms.DocumentUploadForm).
+An interrupted upload is resumed from the offset the session reports.
+
+Every chunk is received into a temporary file before the session is
+locked, then appended to a part file next to the stored documents and
+hashed while it is appended. The hash state cannot be saved in the
+database, so every process keeps the states of the sessions it has served.
+A process receiving a chunk of a session continued elsewhere only reads
+the part of the file it has not hashed yet.
+At the end a hard link to the part file is moved into the content-addressed
+storage under its hash, and the part file is removed once the contract
+referring to the document has been committed.
+
+Sessions not updated for UPLOAD_SESSION_TTL seconds are removed
+with their part files by the gc_upload_sessions command.
+"""
+
+import hashlib
+import os
+import posixpath
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from functools import partial
+from typing import IO, Any, Callable, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .documents import DOCUMENTS_DIR
+from .models import Contract, UploadSession
+from .storage import INCOMING_DIR, document_storage
+
+CHUNK_SIZE = 64 * 1024
+# Number of the hash states kept by a process
+HASHERS_LIMIT = 256
+
+
+class UploadError(Exception):
+    """The request does not fit the state of the session."""
+
+
+class OffsetMismatch(UploadError):
+    """The chunk does not start where the received data ends."""
+
+
+# Session id -> number of the hashed bytes and the hash state
+_hashers: "OrderedDict[str, Tuple[int, Any]]" = OrderedDict()
+_hashers_lock = threading.Lock()
+
+
+def part_path(session: UploadSession) -> str:
+    return os.path.join(
+        document_storage.incoming_path(DOCUMENTS_DIR), f"{session.pk}.part"
+    )
+
+
+def _remember_hasher(session: UploadSession, offset: int, hasher: Any) -> None:
+    with _hashers_lock:
+        _hashers[str(session.pk)] = (offset, hasher)
+        _hashers.move_to_end(str(session.pk))
+        while len(_hashers) > HASHERS_LIMIT:
+            _hashers.popitem(last=False)
+
+
+def _forget_hasher(session_id: str) -> None:
+    with _hashers_lock:
+        _hashers.pop(session_id, None)
+
+
+def _hasher_at(session: UploadSession, offset: int) -> Any:
+    """Hash state of the first offset bytes of the part file."""
+    with _hashers_lock:
+        hashed, hasher = _hashers.pop(str(session.pk), (0, None))
+    if hasher is None or hashed > offset:
+        hashed, hasher = 0, hashlib.sha256()
+    if hashed < offset:
+        with open(part_path(session), "rb") as file:
+            file.seek(hashed)
+            remaining: int = offset - hashed
+            while remaining > 0:
+                data: bytes = file.read(min(CHUNK_SIZE, remaining))
+                if not data:
+                    raise UploadError("The part file is shorter than the offset")
+                hasher.update(data)
+                remaining -= len(data)
+    return hasher
+
+
+def open_session(user, filename: str, size: int) -> UploadSession:
+    """
+    Start an upload.
+
+    :raise UploadError: If the size is not allowed.
+    """
+    if not 0 < size <= settings.UPLOAD_SESSION_MAX_SIZE:
+        raise UploadError(
+            f"The size must be from 1 to {settings.UPLOAD_SESSION_MAX_SIZE} bytes"
+        )
+    session = UploadSession.objects.create(
+        user=user, filename=os.path.basename(filename)[:255] or "document", size=size
+    )
+    open(part_path(session), "wb").close()
+    return session
+
+
+def write_chunk(
+    session: UploadSession, offset: int, length: int, read: Callable[[int], bytes]
+) -> int:
+    """
+    Append a chunk to the part file of the session.
+
+    :param offset: Where the chunk starts.
+    :param length: Size of the chunk.
+    :param read: Function reading at most the given number of bytes
+     of the chunk, such as request.read.
+    :return: The new offset.
+    :raise OffsetMismatch: If the offset is not the received size.
+    :raise UploadError: If the chunk is too large or incomplete.
+    """
+    if length <= 0:
+        raise UploadError("The chunk must not be empty")
+    if length > settings.UPLOAD_CHUNK_MAX_SIZE:
+        raise UploadError(
+            f"Chunks must not exceed {settings.UPLOAD_CHUNK_MAX_SIZE} bytes"
+        )
+
+    # The chunk is received before the session is locked, so a slow client
+    # does not keep the row locked
+    path: str = part_path(session)
+    fd, chunk_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        chunk: IO[bytes]
+        with os.fdopen(fd, "w+b") as chunk:
+            remaining: int = length
+            while remaining > 0:
+                data: bytes = read(min(CHUNK_SIZE, remaining))
+                if not data:
+                    raise UploadError("The chunk is incomplete")
+                chunk.write(data)
+                remaining -= len(data)
+            chunk.seek(0)
+
+            with transaction.atomic():
+                session = UploadSession.objects.select_for_update().get(pk=session.pk)
+                if offset != session.received:
+                    raise OffsetMismatch(f"Expected offset {session.received}")
+                if offset + length > session.size:
+                    raise UploadError("The chunk exceeds the size of the file")
+
+                hasher = _hasher_at(session, offset)
+                file: IO[bytes]
+                with open(path, "r+b") as file:
+                    file.seek(offset)
+                    while data := chunk.read(CHUNK_SIZE):
+                        file.write(data)
+                        hasher.update(data)
+                    # Drop what a failed attempt may have written after the chunk
+                    file.truncate()
+
+                session.received = offset + length
+                session.save(update_fields=["received", "updated_at"])
+    finally:
+        os.remove(chunk_path)
+    _remember_hasher(session, session.received, hasher)
+    return session.received
+
+
+def finalize(session: UploadSession, contract: Contract) -> str:
+    """
+    Store the uploaded file as the document of the contract.
+
+    :return: The name of the stored document.
+    :raise UploadError: If the file has not been received completely
+     or the session has been finalized or removed meanwhile.
+    """
+    with transaction.atomic():
+        try:
+            session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        except UploadSession.DoesNotExist:
+            raise UploadError("The upload is finished or expired")
+        if session.received != session.size:
+            raise UploadError(f"Received {session.received} bytes of {session.size}")
+        hasher = _hasher_at(session, session.size)
+        name: str = document_storage.adopt(
+            _link_part(session),
+            hasher.hexdigest(),
+            posixpath.join(DOCUMENTS_DIR, session.filename),
+        )
+        contract.doc.name = name
+        contract.save(update_fields=["doc"])
+        # The session and its part file are kept if the caller rolls back
+        transaction.on_commit(
+            partial(_remove_part, str(session.pk), part_path(session))
+        )
+        session.delete()
+    return name
+
+
+def _link_part(session: UploadSession) -> str:
+    """Path to a new hard link to the part file (or a copy of it)."""
+    path: str = part_path(session)
+    fd, link_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    os.close(fd)
+    os.remove(link_path)
+    try:
+        os.link(path, link_path)
+    except OSError:
+        # The filesystem does not support hard links
+        shutil.copyfile(path, link_path)
+    return link_path
+
+
+def _remove_part(session_id: str, path: str) -> None:
+    _forget_hasher(session_id)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def collect_stale_sessions(ttl: Optional[float] = None) -> int:
+    """
+    Remove the sessions and the part files not updated for ttl seconds.
+
+    :param ttl: Seconds, UPLOAD_SESSION_TTL by default.
+    :return: Number of the removed part files.
+    """
+    ttl = settings.UPLOAD_SESSION_TTL if ttl is None else ttl
+    UploadSession.objects.filter(
+        updated_at__lt=timezone.now() - timedelta(seconds=ttl)
+    ).delete()
+
+    # Part files of the sessions deleted just now or by other means and
+    # temporary files of interrupted uploads through the storage
+    directory: str = document_storage.path(posixpath.join(DOCUMENTS_DIR, INCOMING_DIR))
+    deadline: float = time.time() - ttl
+    removed: int = 0
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return 0
+    live = set(str(pk) for pk in UploadSession.objects.values_list("pk", flat=True))
+    for entry in entries:
+        session_id: str = entry.name.removesuffix(".part")
+        if session_id in live or entry.stat().st_mtime > deadline:
+            continue
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            continue
+        removed += 1
+    return removed
@@ -6,20 +6,40 @@ from .views import (
     ContractDetailView,
     ContractListView,
     ContractUpdateView,
+    contract_document,
+    contract_search,
+    export_contracts,
+    upload_finalize,
+    upload_open,
+    upload_session,
 )
 
 app_name = "contracts"
 
 urlpatterns = [
     path("contracts/", ContractListView.as_view(), name="contracts_list"),
+    path("contracts/search/", contract_search, name="contract_search"),
+    path("contracts/export/", export_contracts, name="contracts_export"),
     path("contracts/new/", ContractCreateView.as_view(), name="contract_create"),
     path("contracts/<int:pk>/", ContractDetailView.as_view(), name="contract_detail"),
     path(
         "contracts/<int:pk>/edit/", ContractUpdateView.as_view(), name="contract_edit"
     ),
+    path(
+        "contracts/<int:pk>/document/",
+        contract_document,
+        name="contract_document",
+    ),
     path(
         "contracts/<int:pk>/delete/",
         ContractDeleteView.as_view(),
         name="contract_delete",
     ),
+    path("contracts/uploads/", upload_open, name="upload_open"),
+    path("contracts/uploads/<uuid:pk>/", upload_session, name="upload_session"),
+    path(
+        "contracts/uploads/<uuid:pk>/finalize/",
+        upload_finalize,
+        name="upload_finalize",
+    ),
 ]
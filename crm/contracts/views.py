@@ -1,5 +1,15 @@
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth.decorators import permission_required
 from django.contrib.auth.mixins import PermissionRequiredMixin
+from django.db import transaction
+from django.db.models import QuerySet
+from django.http import HttpRequest, HttpResponse, HttpResponseRedirect, JsonResponse
+from django.shortcuts import get_object_or_404
 from django.urls import reverse, reverse_lazy
+from django.views.decorators.http import require_http_methods, require_POST
 from django.views.generic import (
     CreateView,
     DeleteView,
@@ -8,16 +18,112 @@ from django.views.generic import (
     UpdateView,
 )
 
-from .models import Contract
+from crm.downloads import protected_file_response
+from crm.exports import export_response, queryset_rows
+from crm.pagination import KeysetPaginationMixin
+
+from .forms import ContractFilterForm, ContractForm
+from .models import Contract, UploadSession
+from .text_search import search_contracts
+from .uploads import OffsetMismatch, UploadError, finalize, open_session, write_chunk
+
+SEARCH_LIMIT = 50
+
+# Column of the export -> lookup
+CONTRACTS_EXPORT_COLUMNS = {
+    "id": "pk",
+    "name": "name",
+    "product": "product__name",
+    "start_date": "start_date",
+    "end_date": "end_date",
+    "cost": "cost",
+}
+
+
+class ContractFilterMixin:
+    """
+    ListView mixin filtering the list by the contracts with ContractFilterForm.
+
+    The form is in filter_form of the context.
+    """
+
+    # Path from the listed model to the contract
+    filter_prefix: str = ""
+    sort_choices: List[Tuple[str, str]] = []
+
+    def get_queryset(self) -> QuerySet:
+        self.filter_form = ContractFilterForm(
+            self.request.GET, sort_choices=self.sort_choices
+        )
+        return self.filter_form.filter(
+            super().get_queryset(), prefix=self.filter_prefix  # type: ignore[misc]
+        )
 
+    def get_context_data(self, **kwargs) -> Dict[str, Any]:
+        context: Dict[str, Any] = super().get_context_data(  # type: ignore[misc]
+            **kwargs
+        )
+        context["filter_form"] = self.filter_form
+        return context
 
-class ContractListView(PermissionRequiredMixin, ListView):
-    """ListView class for getting list of contracts."""
+
+class DocumentUploadViewMixin:
+    """
+    Model form view mixin passing the user to DocumentUploadForm and
+    storing its upload as the document of the saved contract.
+    """
+
+    def get_form_kwargs(self) -> Dict[str, Any]:
+        kwargs: Dict[str, Any] = super().get_form_kwargs()  # type: ignore[misc]
+        kwargs["user"] = self.request.user  # type: ignore[attr-defined]
+        return kwargs
+
+    def form_valid(self, form: ContractForm) -> HttpResponse:
+        try:
+            with transaction.atomic():
+                self.object = form.save()
+                form.save_upload(self.object)
+        except UploadError as exc:
+            form.add_error("upload", str(exc))
+            return self.form_invalid(form)  # type: ignore[attr-defined]
+        return HttpResponseRedirect(
+            self.get_success_url()  # type: ignore[attr-defined]
+        )
+
+
+class ContractListView(
+    PermissionRequiredMixin, ContractFilterMixin, KeysetPaginationMixin, ListView
+):
+    """
+    ListView class for getting list of contracts.
+
+    The contracts are paginated with keyset pagination, filtered by
+    ContractFilterForm and sorted by the name, the end date or the cost.
+    Only the shown columns are fetched.
+    """
 
     template_name = "contracts/contracts-list.html"
-    queryset = Contract.objects.select_related("product")
+    queryset = Contract.objects.only("name", "end_date", "cost")
     context_object_name = "contracts"
     permission_required = ("contracts.view_contract",)
+    keyset = ("name",)
+    sorts = {
+        "name": ("name",),
+        "end_date": ("end_date", "pk"),
+        "-end_date": ("-end_date", "-pk"),
+        "cost": ("cost", "pk"),
+        "-cost": ("-cost", "-pk"),
+    }
+    sort_choices = [
+        ("name", "По названию"),
+        ("end_date", "Сначала заканчивающиеся"),
+        ("-end_date", "Сначала поздние"),
+        ("cost", "Сначала дешёвые"),
+        ("-cost", "Сначала дорогие"),
+    ]
+
+    def get_page_size(self) -> int:
+        return settings.CONTRACTS_PAGE_SIZE
 
 
 class ContractDetailView(PermissionRequiredMixin, DetailView):
@@ -28,12 +134,12 @@ class ContractDetailView(PermissionRequiredMixin, DetailView):
     permission_required = ("contracts.view_contract",)
 
 
-class ContractUpdateView(PermissionRequiredMixin, UpdateView):
+class ContractUpdateView(PermissionRequiredMixin, DocumentUploadViewMixin, UpdateView):
     """UpdateView class for updating the contract."""
 
     template_name = "contracts/contracts-edit.html"
     model = Contract
-    fields = "name", "product", "doc", "end_date", "cost"
+    form_class = ContractForm
     permission_required = ("contracts.change_contract",)
 
     def get_success_url(self):
@@ -49,11 +155,134 @@ class ContractDeleteView(PermissionRequiredMixin, DeleteView):
     permission_required = ("contracts.delete_contract",)
 
 
-class ContractCreateView(PermissionRequiredMixin, CreateView):
+class ContractCreateView(PermissionRequiredMixin, DocumentUploadViewMixin, CreateView):
     """CreateView class for creating a new contract."""
 
     template_name = "contracts/contracts-create.html"
     model = Contract
-    fields = "name", "product", "doc", "end_date", "cost"
+    form_class = ContractForm
     success_url = reverse_lazy("contracts:contracts_list")
     permission_required = ("contracts.add_contract",)
+
+
+@permission_required("contracts.view_contract")
+def contract_document(request: HttpRequest, pk: int) -> HttpResponse:
+    """View func serving the document of the contract."""
+    contract = get_object_or_404(Contract.objects.only("doc"), pk=pk)
+    return protected_file_response(request, contract.doc)
+
+
+@permission_required("contracts.view_contract")
+def contract_search(request: HttpRequest) -> JsonResponse:
+    """View func searching the contract documents, returns JSON."""
+    limit: int = _int_or_none(request.GET.get("limit")) or SEARCH_LIMIT
+    results = search_contracts(
+        request.GET.get("q", ""), limit=max(1, min(limit, SEARCH_LIMIT))
+    )
+    return JsonResponse({"results": [asdict(result) for result in results]})
+
+
+@permission_required("contracts.view_contract")
+def export_contracts(request: HttpRequest) -> HttpResponse:
+    """
+    View func streaming the contracts as CSV or NDJSON, filtered like
+    the list of the contracts.
+    """
+    form = ContractFilterForm(request.GET, sort_choices=[])
+    rows = queryset_rows(
+        form.filter(Contract.objects.order_by("pk")),
+        list(CONTRACTS_EXPORT_COLUMNS.values()),
+    )
+    return export_response(request, "contracts", list(CONTRACTS_EXPORT_COLUMNS), rows)
+
+
+def _upload_data(session: UploadSession) -> dict:
+    return {
+        "id": str(session.pk),
+        "filename": session.filename,
+        "size": session.size,
+        "offset": session.received,
+        "url": reverse("contracts:upload_session", kwargs={"pk": session.pk}),
+    }
+
+
+def _int_or_none(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@require_POST
+@permission_required("contracts.change_contract", raise_exception=True)
+def upload_open(request: HttpRequest) -> JsonResponse:
+    """
+    Start a chunked upload of a contract document.
+
+    Takes the filename and the size of the file in bytes.
+    """
+    size: Optional[int] = _int_or_none(request.POST.get("size"))
+    if size is None or not request.POST.get("filename"):
+        return JsonResponse({"error": "filename and size are required"}, status=400)
+    try:
+        session: UploadSession = open_session(
+            request.user, request.POST["filename"], size
+        )
+    except UploadError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    data: dict = _upload_data(session)
+    response = JsonResponse(data, status=201)
+    response["Location"] = data["url"]
+    return response
+
+
+@require_http_methods(["GET", "PUT"])
+@permission_required("contracts.change_contract", raise_exception=True)
+def upload_session(request: HttpRequest, pk) -> JsonResponse:
+    """
+    GET reports the offset to resume the upload from, PUT sends a chunk.
+
+    The body of PUT is the chunk, the Upload-Offset header is its offset
+    and Content-Length its size.
+    """
+    session = get_object_or_404(UploadSession, pk=pk, user=request.user)
+    if request.method == "GET":
+        return JsonResponse(_upload_data(session))
+
+    offset: Optional[int] = _int_or_none(request.headers.get("Upload-Offset"))
+    if offset is None:
+        return JsonResponse({"error": "Upload-Offset is required"}, status=400)
+    if not request.META.get("CONTENT_LENGTH"):
+        return JsonResponse({"error": "Content-Length is required"}, status=411)
+    length: Optional[int] = _int_or_none(request.META["CONTENT_LENGTH"])
+    if length is None or length <= 0:
+        return JsonResponse({"error": "The chunk must not be empty"}, status=400)
+    try:
+        received: int = write_chunk(session, offset, length, request.read)
+    except OffsetMismatch as exc:
+        session.refresh_from_db()
+        return JsonResponse({"error": str(exc), "offset": session.received}, status=409)
+    except UploadError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    return JsonResponse({"offset": received})
+
+
+@require_POST
+@permission_required("contracts.change_contract", raise_exception=True)
+def upload_finalize(request: HttpRequest, pk) -> JsonResponse:
+    """Attach the uploaded file to the contract given by its pk."""
+    session = get_object_or_404(UploadSession, pk=pk, user=request.user)
+    contract = get_object_or_404(
+        Contract, pk=_int_or_none(request.POST.get("contract"))
+    )
+    try:
+        name: str = finalize(session, contract)
+    except UploadError as exc:
+        return JsonResponse({"error": str(exc)}, status=409)
+    return JsonResponse(
+        {
+            "contract": contract.pk,
+            "doc": name,
+            "url": reverse("contracts:contract_document", kwargs={"pk": contract.pk}),
+        }
+    )
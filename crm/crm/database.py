@@ -0,0 +1,98 @@
+"""
+Connection settings of the database.
+
+With psycopg 3 and psycopg_pool installed (pip install "psycopg[binary,pool]")
+and DB_POOL=1, every process keeps a pool of DB_POOL_MIN_SIZE..DB_POOL_MAX_SIZE
+connections. Otherwise (psycopg2 or DB_POOL=0) every thread keeps one
+persistent connection for DB_CONN_MAX_AGE seconds, checked before reuse.
+
+Either way a process may hold several connections, so all the gunicorn
+workers (WEB_CONCURRENCY) together may open up to WEB_CONCURRENCY times
+the connections of one process. The settings refuse to load if that
+exceeds DB_MAX_CONNECTIONS, which should stay below max_connections
+of the PostgreSQL server minus the connections of the other clients.
+"""
+
+from importlib.util import find_spec
+from typing import Any, Dict, Mapping
+
+from django.core.exceptions import ImproperlyConfigured
+
+
+def pool_available() -> bool:
+    """Whether psycopg 3 and its pool are installed."""
+    return find_spec("psycopg") is not None and find_spec("psycopg_pool") is not None
+
+
+def connection_settings(env: Mapping[str, str]) -> Dict[str, Any]:
+    """
+    Connection settings of a database alias from the environment.
+
+    :return: CONN_MAX_AGE, CONN_HEALTH_CHECKS and OPTIONS of the alias.
+    :raise ImproperlyConfigured: If the pool is requested but not installed.
+    """
+    if env.get("DB_POOL", "0") != "1":
+        return {
+            "CONN_MAX_AGE": int(env.get("DB_CONN_MAX_AGE", 60)),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {},
+        }
+    if not pool_available():
+        raise ImproperlyConfigured('DB_POOL=1 requires "psycopg[pool]"')
+
+    min_size: int = int(env.get("DB_POOL_MIN_SIZE", 2))
+    max_size: int = int(env.get("DB_POOL_MAX_SIZE", 4))
+    if not 0 <= min_size <= max_size:
+        raise ImproperlyConfigured(
+            "DB_POOL_MIN_SIZE must not be greater than DB_POOL_MAX_SIZE"
+        )
+    return {
+        # The pool keeps the connections, Django must not
+        "CONN_MAX_AGE": 0,
+        "CONN_HEALTH_CHECKS": False,
+        "OPTIONS": {
+            "pool": {
+                "min_size": min_size,
+                "max_size": max_size,
+                # Seconds to wait for a free connection
+                "timeout": float(env.get("DB_POOL_TIMEOUT", 10)),
+                "max_idle": float(env.get("DB_POOL_MAX_IDLE", 300)),
+                "max_lifetime": float(env.get("DB_POOL_MAX_LIFETIME", 3600)),
+            },
+        },
+    }
+
+
+def connections_per_process(database: Mapping[str, Any], threads: int = 1) -> int:
+    """The most connections one process may open to the database."""
+    pool = database.get("OPTIONS", {}).get("pool")
+    if not pool:
+        return threads
+    # psycopg_pool defaults: min_size=4, max_size=min_size
+    pool = pool if isinstance(pool, dict) else {}
+    return pool.get("max_size") or pool.get("min_size", 4)
+
+
+def check_connection_limit(
+    databases: Mapping[str, Mapping[str, Any]], env: Mapping[str, str]
+) -> int:
+    """
+    Check that all the gunicorn workers fit into DB_MAX_CONNECTIONS.
+
+    The databases are summed up as if they were on the same server.
+
+    :return: The most connections the workers may open.
+    :raise ImproperlyConfigured: If the limit is exceeded.
+    """
+    workers: int = int(env.get("WEB_CONCURRENCY", 1))
+    threads: int = int(env.get("GUNICORN_THREADS", 1))
+    limit: int = int(env.get("DB_MAX_CONNECTIONS", 90))
+    total: int = workers * sum(
+        connections_per_process(database, threads) for database in databases.values()
+    )
+    if total > limit:
+        raise ImproperlyConfigured(
+            f"{workers} workers may open {total} database connections,"
+            f" DB_MAX_CONNECTIONS is {limit}"
+        )
+    return total
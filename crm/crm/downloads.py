@@ -0,0 +1,150 @@
+"""
+Responses serving protected media files after a permission check.
+
+In production nginx sends the file: the response carries only
+an X-Accel-Redirect to the internal location PROTECTED_MEDIA_PREFIX,
+which maps to MEDIA_ROOT, and nginx takes care of Range requests and
+the caching headers. Without nginx (PROTECTED_MEDIA_X_ACCEL off)
+the file is streamed by Django with support for single byte ranges,
+ETag and Last-Modified.
+"""
+
+import mimetypes
+import os
+import re
+from typing import IO, Iterator, Optional, Tuple
+from urllib.parse import quote
+
+from django.conf import settings
+from django.db.models.fields.files import FieldFile
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpRequest,
+    HttpResponse,
+    StreamingHttpResponse,
+)
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import (
+    content_disposition_header,
+    http_date,
+    parse_http_date_safe,
+)
+
+CHUNK_SIZE = 64 * 1024
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single byte range of the Range header.
+
+    :return: The first and the last byte of the range or None
+     if the header is malformed or has several ranges (the whole file
+     is served then).
+    :raise ValueError: If the range is not satisfiable.
+    """
+    match = _RANGE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:  # the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(size - length, 0), size - 1
+    start, end = int(first), int(last) if last else size - 1
+    if start >= size:
+        raise ValueError("Range starts after the end of the file")
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def _read_range(file: IO[bytes], start: int, length: int) -> Iterator[bytes]:
+    with file:
+        file.seek(start)
+        while length > 0:
+            chunk: bytes = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _if_range_matches(request: HttpRequest, etag: str, mtime: float) -> bool:
+    if_range: Optional[str] = request.headers.get("If-Range")
+    if if_range is None:
+        return True
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == int(mtime)
+
+
+def protected_file_response(request: HttpRequest, file: FieldFile) -> HttpResponse:
+    """Serve the file of the field, the caller has checked the permissions."""
+    if not file:
+        raise Http404("No file")
+    filename: str = os.path.basename(file.name)
+    content_type: str = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+    if settings.PROTECTED_MEDIA_X_ACCEL:
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = settings.PROTECTED_MEDIA_PREFIX + quote(
+            file.name
+        )
+    else:
+        response = _django_file_response(request, file.path, content_type)
+    if response.status_code in (200, 206):
+        response["Content-Disposition"] = content_disposition_header(
+            as_attachment=False, filename=filename
+        )
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _django_file_response(
+    request: HttpRequest, path: str, content_type: str
+) -> HttpResponse:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404("No file")
+    size: int = stat.st_size
+    etag: str = f'"{size:x}-{stat.st_mtime_ns:x}"'
+
+    conditional = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime)
+    )
+    if conditional is not None:  # 304 Not Modified or 412 Precondition Failed
+        return conditional
+
+    byte_range: Optional[Tuple[int, int]] = None
+    range_header: Optional[str] = request.headers.get("Range")
+    if range_header and _if_range_matches(request, etag, stat.st_mtime):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    response: HttpResponse
+    if byte_range is None:
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _read_range(open(path, "rb"), start, end - start + 1),
+            status=206,
+            content_type=content_type,
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = str(end - start + 1)
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    return response
@@ -0,0 +1,190 @@
+"""
+Request-level performance instrumentation.
+
+InstrumentationMiddleware measures every request: the wall time, the number
+and the total time of database queries (through connection.execute_wrapper)
+and the time spent rendering templates (through the template backend
+InstrumentedDjangoTemplates). The numbers are
+
+- sent in the Server-Timing response header, so they are visible
+  in the network tab of the browser;
+- written as a JSON log line to the "crm.instrumentation" logger at INFO
+  (INSTRUMENTATION_LOGLEVEL, the test runner raises it to WARNING);
+- kept in a rolling window per URL name, whose percentiles are served
+  as JSON to staff users by the instrumentation_stats view.
+"""
+
+import json
+import threading
+from collections import defaultdict, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from logging import getLogger
+from math import ceil
+from time import perf_counter
+from typing import Callable, Deque, Dict, List, Optional, Sequence
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = getLogger(__name__)
+
+PERCENTILES = (50, 95, 99)
+
+
+@dataclass
+class RequestMetrics:
+    """Measurements of one request, all the times are in milliseconds."""
+
+    view: str = ""
+    status: int = 0
+    wall_ms: float = 0.0
+    db_queries: int = 0
+    db_ms: float = 0.0
+    template_ms: float = 0.0
+
+
+# Metrics of the request being processed in the current thread or task
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar(
+    "request_metrics", default=None
+)
+
+
+def current_metrics() -> Optional[RequestMetrics]:
+    """Get the metrics of the request being processed, if any."""
+    return _current.get()
+
+
+def _db_timer(execute, sql, params, many, context):
+    started: float = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics: Optional[RequestMetrics] = _current.get()
+        if metrics is not None:
+            metrics.db_queries += 1
+            metrics.db_ms += (perf_counter() - started) * 1000
+
+
+class TimedTemplate(Template):
+    """Template adding its render time to the metrics of the request."""
+
+    def render(self, context=None, request=None):
+        started: float = perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics: Optional[RequestMetrics] = _current.get()
+            if metrics is not None:
+                metrics.template_ms += (perf_counter() - started) * 1000
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    DjangoTemplates backend timing the rendering of templates.
+
+    Only the templates loaded through the backend are timed, so included
+    and extended templates are counted once, as part of the main one.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+def percentile(values: Sequence[float], percent: int) -> float:
+    """Nearest-rank percentile of the values."""
+    ordered: List[float] = sorted(values)
+    rank: int = max(ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class RollingStats:
+    """The last measurements of every URL name, shared by the threads."""
+
+    def __init__(self, window: int) -> None:
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[RequestMetrics]] = defaultdict(
+            lambda: deque(maxlen=self.window)
+        )
+
+    def add(self, metrics: RequestMetrics) -> None:
+        with self._lock:
+            self._samples[metrics.view].append(metrics)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+    def summary(self) -> Dict[str, Dict[str, object]]:
+        """Percentiles of the wall time, DB time and queries per URL name."""
+        with self._lock:
+            samples = {view: list(values) for view, values in self._samples.items()}
+
+        summary: Dict[str, Dict[str, object]] = dict()
+        for view, values in sorted(samples.items()):
+            summary[view] = {"count": len(values)}
+            for field in ("wall_ms", "db_ms", "db_queries", "template_ms"):
+                column: List[float] = [getattr(value, field) for value in values]
+                summary[view][field] = {
+                    f"p{percent}": round(percentile(column, percent), 2)
+                    for percent in PERCENTILES
+                }
+        return summary
+
+
+rolling_stats = RollingStats(window=settings.INSTRUMENTATION_WINDOW)
+
+
+def server_timing(metrics: RequestMetrics) -> str:
+    """Format the metrics as the value of the Server-Timing header."""
+    return ", ".join(
+        [
+            f"total;dur={metrics.wall_ms:.1f}",
+            f'db;dur={metrics.db_ms:.1f};desc="{metrics.db_queries} queries"',
+            f"tpl;dur={metrics.template_ms:.1f}",
+        ]
+    )
+
+
+class InstrumentationMiddleware:
+    """Measure the request and report the metrics."""
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started: float = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_db_timer))
+                response: HttpResponse = self.get_response(request)
+        finally:
+            _current.reset(token)
+        metrics.wall_ms = (perf_counter() - started) * 1000
+
+        match = request.resolver_match
+        metrics.view = match.view_name if match is not None else "<unresolved>"
+        metrics.status = response.status_code
+        response["Server-Timing"] = server_timing(metrics)
+        logger.info(json.dumps({"path": request.path, **asdict(metrics)}))
+        rolling_stats.add(metrics)
+        return response
+
+
+@staff_member_required
+def instrumentation_stats(request: HttpRequest) -> JsonResponse:
+    """View func returning the rolling percentiles per URL name."""
+    return JsonResponse(
+        {"window": rolling_stats.window, "views": rolling_stats.summary()}
+    )
@@ -0,0 +1,170 @@
+"""
+Lazy choice fields backed by paginated JSON lookup endpoints.
+
+A plain ModelChoiceField renders an <option> for every row of its queryset.
+LazyModelChoiceField renders only the selected value; the other options
+are fetched by static/lazy-select.js from the lookup endpoint of the model
+while the user types. The submitted pk is validated with a single query
+by the primary key.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from advertising.models import Advertising
+from clients.models import Lead
+from contracts.models import Contract
+from django import forms
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.db.models import Model, Q, QuerySet
+from django.http import Http404, HttpRequest, JsonResponse
+from django.urls import reverse
+from services.models import Service
+
+LOOKUP_PAGE_SIZE = 20
+
+
+@dataclass
+class Lookup:
+    """A model available through the lookup endpoint."""
+
+    queryset: QuerySet
+    search_fields: Tuple[str, ...]
+    # The user needs any of the permissions
+    permissions: Tuple[str, ...]
+
+    def label(self, obj: Model) -> str:
+        return str(obj)
+
+    def search(self, query: str) -> QuerySet:
+        condition = Q()
+        for field in self.search_fields:
+            condition |= Q(**{f"{field}__icontains": query})
+        return self.queryset.filter(condition)
+
+
+LOOKUPS: Dict[str, Lookup] = {
+    "advertising": Lookup(
+        # Advertising.__str__ shows the product name
+        queryset=Advertising.objects.select_related("product"),
+        search_fields=("name", "product__name"),
+        permissions=(
+            "advertising.view_advertising",
+            "clients.add_lead",
+            "clients.change_lead",
+            "clients.add_customer",
+            "clients.change_customer",
+            "clients.create_customer_from_lead",
+        ),
+    ),
+    "services": Lookup(
+        queryset=Service.objects.all(),
+        search_fields=("name",),
+        permissions=(
+            "services.view_service",
+            "advertising.add_advertising",
+            "advertising.change_advertising",
+            "contracts.add_contract",
+            "contracts.change_contract",
+            "clients.add_customer",
+            "clients.change_customer",
+            "clients.create_customer_from_lead",
+        ),
+    ),
+    "leads": Lookup(
+        queryset=Lead.objects.all(),
+        search_fields=("first_name", "last_name", "phone", "email"),
+        permissions=("clients.view_lead",),
+    ),
+    "contracts": Lookup(
+        queryset=Contract.objects.all(),
+        search_fields=("name",),
+        permissions=("contracts.view_contract",),
+    ),
+}
+
+
+@login_required
+def lookup(request: HttpRequest, name: str) -> JsonResponse:
+    """
+    View func returning a page of lookup options as JSON.
+
+    GET parameters: q - the search string, after - pk of the last option
+    of the previous page. The response is {"results": [{"id", "text"}],
+    "next": the after parameter of the next page or null}.
+    """
+    model_lookup: Optional[Lookup] = LOOKUPS.get(name)
+    if model_lookup is None:
+        raise Http404(f"Unknown lookup {name}")
+    if not any(request.user.has_perm(perm) for perm in model_lookup.permissions):
+        raise PermissionDenied
+
+    queryset = model_lookup.queryset
+    query: str = request.GET.get("q", "").strip()
+    if query:
+        queryset = model_lookup.search(query)
+    after: str = request.GET.get("after", "")
+    if after.isdigit():
+        queryset = queryset.filter(pk__gt=int(after))
+
+    objects: List[Model] = list(queryset.order_by("pk")[: LOOKUP_PAGE_SIZE + 1])
+    has_next: bool = len(objects) > LOOKUP_PAGE_SIZE
+    objects = objects[:LOOKUP_PAGE_SIZE]
+    return JsonResponse(
+        {
+            "results": [
+                {"id": obj.pk, "text": model_lookup.label(obj)} for obj in objects
+            ],
+            "next": objects[-1].pk if has_next else None,
+        }
+    )
+
+
+class LazySelect(forms.Select):
+    """Select rendering only the selected option and the empty one."""
+
+    def __init__(self, lookup_name: str, attrs: Optional[Dict[str, Any]] = None):
+        super().__init__(attrs)
+        self.lookup_name = lookup_name
+        self.queryset: Optional[QuerySet] = None
+        self.empty_label: Optional[str] = None
+
+    def get_context(self, name, value, attrs) -> Dict[str, Any]:
+        attrs = dict(attrs or {})
+        attrs["data-lookup-url"] = reverse("lookup", kwargs={"name": self.lookup_name})
+        return super().get_context(name, value, attrs)
+
+    def optgroups(self, name, value, attrs=None):
+        # ChoiceWidget.optgroups iterates all the choices, that is the
+        # whole queryset, so build the options of the selected value only
+        options = []
+        if self.empty_label is not None:
+            options.append(
+                self.create_option(name, "", self.empty_label, not value[0], 0)
+            )
+        selected = [v for v in value if v not in ("", None)]
+        if selected and self.queryset is not None:
+            obj = self.queryset.filter(pk=selected[0]).first()
+            if obj is not None:
+                label = LOOKUPS[self.lookup_name].label(obj)
+                options.append(self.create_option(name, obj.pk, label, True, 1))
+        return [(None, options, 0)]
+
+
+class LazyModelChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField with options loaded from the lookup endpoint."""
+
+    def __init__(self, lookup_name: str, **kwargs):
+        kwargs.setdefault("widget", LazySelect(lookup_name))
+        super().__init__(queryset=LOOKUPS[lookup_name].queryset, **kwargs)
+        self.widget.empty_label = self.empty_label
+
+    def _set_queryset(self, queryset):
+        super()._set_queryset(queryset)
+        self.widget.queryset = self._queryset
+
+    queryset = property(forms.ModelChoiceField._get_queryset, _set_queryset)
+
+    def label_from_instance(self, obj: Model) -> str:
+        return LOOKUPS[self.widget.lookup_name].label(obj)
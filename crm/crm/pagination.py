@@ -0,0 +1,186 @@
+"""
+Keyset (seek) pagination for list views.
+
+Instead of OFFSET, a page starts right after (or before) the sort key
+of the last (or first) row of the neighbouring page, so the database reads
+only the rows of the page from an index on the sort key, however deep
+the page is. The sort key must be unique, so it ends with the primary key
+(or is a unique field). It may be descending, then every field of it
+is prefixed with "-".
+"""
+
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Field, Func, Model, QuerySet, TextField, Value
+from django.db.models.lookups import GreaterThan, LessThan
+from django.http import Http404
+
+# Types of the values of a decoded cursor
+_CURSOR_TYPES = (str, int, float, type(None))
+
+
+class Row(Func):
+    """Row constructor: (a, b) > (x, y) compares the rows lexicographically."""
+
+    template = "(%(expressions)s)"
+    output_field = TextField()
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode the sort key of a row into a URL-safe cursor."""
+    return urlsafe_b64encode(
+        json.dumps(list(values), cls=DjangoJSONEncoder).encode()
+    ).decode()
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """
+    Decode the cursor into the sort key of a row.
+
+    The values are scalars, still to be converted to the types
+    of the key fields.
+
+    :raise Http404: If the cursor is malformed.
+    """
+    try:
+        values = json.loads(urlsafe_b64decode(cursor.encode()))
+    except (BinasciiError, ValueError):
+        raise Http404("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise Http404("Invalid cursor")
+    if any(
+        isinstance(value, bool) or not isinstance(value, _CURSOR_TYPES)
+        for value in values
+    ):
+        raise Http404("Invalid cursor")
+    return values
+
+
+def key_field(model: type, key: str) -> Field:
+    """The model field of the key, which may span relations (lead__last_name)."""
+    *relations, name = key.split("__")
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    return model._meta.pk if name == "pk" else model._meta.get_field(name)
+
+
+def key_value(obj: Model, key: str) -> Any:
+    for name in key.split("__"):
+        obj = getattr(obj, name)
+    return obj
+
+
+def _cursor_row(queryset: QuerySet, keys: Tuple[str, ...], cursor: str) -> Row:
+    values: List[Any] = decode_cursor(cursor, len(keys))
+    fields: List[Field] = [key_field(queryset.model, key) for key in keys]
+    try:
+        # The JSON has strings in place of dates and decimals
+        values = [field.to_python(value) for field, value in zip(fields, values)]
+    except (ValidationError, TypeError, ValueError):
+        raise Http404("Invalid cursor")
+    return Row(
+        *(Value(value, output_field=field) for field, value in zip(fields, values))
+    )
+
+
+def keyset_page(
+    queryset: QuerySet,
+    keys: Tuple[str, ...],
+    page_size: int,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+) -> Tuple[List[Model], Optional[str], Optional[str]]:
+    """
+    Get one page of the queryset ordered by the keys.
+
+    :param keys: Fields of the unique sort key, for example ("last_name", "pk")
+     or ("-cost", "-pk").
+    :param after: Cursor of the last row of the previous page.
+    :param before: Cursor of the first row of the next page.
+    :return: Rows of the page, the cursor of the next page
+     and the cursor of the previous page (None if there is no such page).
+    """
+    descending: bool = keys[0].startswith("-")
+    if any(key.startswith("-") != descending for key in keys):
+        raise ValueError("All the keys must be sorted in the same direction")
+    keys = tuple(key.lstrip("-") for key in keys)
+    row = Row(*(F(key) for key in keys))
+    backwards: bool = before is not None and after is None
+    following, preceding = (
+        (LessThan, GreaterThan) if descending else (GreaterThan, LessThan)
+    )
+
+    if after is not None:
+        queryset = queryset.filter(following(row, _cursor_row(queryset, keys, after)))
+    elif before is not None:
+        queryset = queryset.filter(preceding(row, _cursor_row(queryset, keys, before)))
+
+    ordering: List[str] = [
+        f"-{key}" if backwards != descending else key for key in keys
+    ]
+    # One extra row tells whether there is one more page in this direction
+    rows: List[Model] = list(queryset.order_by(*ordering)[: page_size + 1])
+    has_more: bool = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    def cursor_of(obj: Model) -> str:
+        return encode_cursor([key_value(obj, key) for key in keys])
+
+    if not rows:
+        return rows, None, None
+    if backwards:
+        next_cursor: Optional[str] = cursor_of(rows[-1])
+        prev_cursor: Optional[str] = cursor_of(rows[0]) if has_more else None
+    else:
+        next_cursor = cursor_of(rows[-1]) if has_more else None
+        prev_cursor = cursor_of(rows[0]) if after is not None else None
+    return rows, next_cursor, prev_cursor
+
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin paginating object_list with keyset pagination.
+
+    The page is selected by the "after" or "before" GET parameter, the links
+    to the neighbouring pages are in next_cursor and prev_cursor of the context,
+    the other GET parameters (filters, sorting) are in page_query.
+    The "sort" GET parameter selects the keyset from sorts, keyset is
+    the default one.
+    """
+
+    keyset: Tuple[str, ...] = ("pk",)
+    sorts: Dict[str, Tuple[str, ...]] = {}
+    page_size: int = 50
+
+    def get_page_size(self) -> int:
+        return self.page_size
+
+    def get_keyset(self) -> Tuple[str, ...]:
+        return self.sorts.get(self.request.GET.get("sort", ""), self.keyset)
+
+    def get_context_data(self, *, object_list=None, **kwargs) -> Dict[str, Any]:
+        queryset = self.object_list if object_list is None else object_list
+        rows, next_cursor, prev_cursor = keyset_page(
+            queryset,
+            self.get_keyset(),
+            self.get_page_size(),
+            after=self.request.GET.get("after"),
+            before=self.request.GET.get("before"),
+        )
+        context: Dict[str, Any] = super().get_context_data(  # type: ignore[misc]
+            object_list=rows, **kwargs
+        )
+        context["next_cursor"] = next_cursor
+        context["prev_cursor"] = prev_cursor
+        query = self.request.GET.copy()
+        query.pop("after", None)
+        query.pop("before", None)
+        context["page_query"] = query.urlencode()
+        return context
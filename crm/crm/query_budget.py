@@ -0,0 +1,169 @@
+"""
+Query budgets of the views and detection of N+1 queries.
+
+QUERY_BUDGETS declares the maximum number of queries each view may issue
+(including the session and the cached auth lookups, which cost nothing
+on a warm cache). A page must not issue more queries because it shows
+more rows: queries of the same shape repeated N_PLUS_ONE_THRESHOLD times
+within one request are reported as N+1 candidates together with the line
+of the project code that issued them.
+
+The budgets are enforced by QueryBudgetTestMixin in the tests and
+by QueryBudgetMiddleware, which logs the violations when DEBUG is on.
+"""
+
+import re
+import traceback
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from logging import getLogger
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+from django.urls import resolve
+
+logger = getLogger(__name__)
+
+QUERY_BUDGETS: Dict[str, int] = {
+    "services:services_list": 2,
+    "services:service_detail": 2,
+    "advertising:ads_list": 2,
+    "advertising:ads_detail": 2,
+    "clients:leads_list": 2,
+    "clients:leads_detail": 2,
+    "clients:customers_list": 2,
+    "clients:customers_detail": 2,
+    "clients:search": 3,
+    "contracts:contracts_list": 2,
+    "contracts:contract_detail": 2,
+    "my_statistics:ads_statistics": 2,
+    # A cache miss counts five tables, a hit needs only the session
+    "my_statistics:total_statistics": 6,
+}
+
+# Queries of the same shape issued this many times are an N+1 candidate
+N_PLUS_ONE_THRESHOLD = 3
+
+_NUMBER = re.compile(r"\b\d+(\.\d+)?\b")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_IN_LIST = re.compile(r"\((\s*\?\s*,)+\s*\?\s*\)")
+_PROJECT_DIR = Path(settings.BASE_DIR).resolve()
+
+
+def sql_shape(sql: str) -> str:
+    """Replace the literals of the SQL with placeholders."""
+    shape: str = _STRING.sub("?", sql)
+    shape = _NUMBER.sub("?", shape.replace("%s", "?"))
+    return _IN_LIST.sub("(?)", shape)
+
+
+def _issuing_frame() -> str:
+    """The innermost frame of the project code, outside of this module."""
+    for frame in reversed(traceback.extract_stack()):
+        path = Path(frame.filename).resolve()
+        if (
+            path.is_relative_to(_PROJECT_DIR)
+            and path != Path(__file__).resolve()
+            and "site-packages" not in path.parts
+        ):
+            return f"{frame.filename}:{frame.lineno} in {frame.name}"
+    return "<unknown>"
+
+
+@dataclass
+class QueryLog:
+    """Shapes of the queries of one request and where they were issued."""
+
+    shapes: List[str] = field(default_factory=list)
+    frames: Dict[str, str] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.shapes)
+
+    def __call__(self, execute, sql, params, many, context):
+        shape: str = sql_shape(sql)
+        self.shapes.append(shape)
+        self.frames.setdefault(shape, _issuing_frame())
+        return execute(sql, params, many, context)
+
+    def n_plus_one(self) -> Dict[str, int]:
+        """Shapes repeated at least N_PLUS_ONE_THRESHOLD times."""
+        return {
+            shape: count
+            for shape, count in Counter(self.shapes).items()
+            if count >= N_PLUS_ONE_THRESHOLD
+        }
+
+    def problems(self, view_name: str) -> List[str]:
+        """Describe the exceeded budget and the N+1 candidates."""
+        problems: List[str] = []
+        budget: Optional[int] = QUERY_BUDGETS.get(view_name)
+        if budget is not None and len(self) > budget:
+            problems.append(
+                f"{view_name} issued {len(self)} queries, the budget is {budget}"
+            )
+        for shape, count in self.n_plus_one().items():
+            problems.append(
+                f"{view_name}: N+1 candidate, {count} queries"
+                f" from {self.frames[shape]}: {shape}"
+            )
+        return problems
+
+
+@contextmanager
+def log_queries() -> Iterator[QueryLog]:
+    """Record the queries issued to all the databases inside the block."""
+    query_log = QueryLog()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(query_log))
+        yield query_log
+
+
+class QueryBudgetMiddleware:
+    """Log the requests exceeding their query budgets (DEBUG only)."""
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        if not settings.DEBUG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        with log_queries() as query_log:
+            response: HttpResponse = self.get_response(request)
+        match = request.resolver_match
+        if match is not None:
+            for problem in query_log.problems(match.view_name):
+                logger.error(problem)
+        return response
+
+
+class QueryBudgetTestMixin:
+    """
+    TestCase mixin checking the query budgets of the views.
+
+    self.client is expected to be logged in and warmed up, so the cached
+    user and permissions do not count against the budget.
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, path: str) -> Iterator[QueryLog]:
+        """Fail if the block exceeds the budget of the view of the path."""
+        view_name: str = resolve(path).view_name
+        with log_queries() as query_log:
+            yield query_log
+        problems: List[str] = query_log.problems(view_name)
+        if view_name not in QUERY_BUDGETS:
+            problems.append(f"{view_name} has no query budget")
+        if problems:
+            self.fail("\n".join(problems))  # type: ignore[attr-defined]
+
+    def get_within_budget(self, path: str, data=None) -> HttpResponse:
+        """GET the path and check the budget of its view."""
+        with self.assertQueryBudget(path):
+            return self.client.get(path, data)  # type: ignore[attr-defined]
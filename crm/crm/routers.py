@@ -0,0 +1,151 @@
+"""
+Routing of the reads to the read replica.
+
+The replica is optional: it is the "replica" database alias, configured
+by the REPLICA_POSTGRES_* environment variables. Without it all the queries
+go to the primary ("default").
+
+ReplicaRoutingMiddleware marks the requests to the read-only views of
+REPLICA_VIEWS (the statistics, the list and detail pages and the exports), and
+the router sends their reads to the replica. The reads stay
+on the primary
+
+- inside transactions;
+- after the request has written anything;
+- for REPLICA_PIN_SECONDS after the session has written anything, so the
+  user sees their own changes even if the replica lags behind
+  (read-your-writes).
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+
+REPLICA = "replica"
+PRIMARY = "default"
+# Session key of the time until which the session reads from the primary
+PIN_SESSION_KEY = "_db_pinned_until"
+
+# Read-only views whose reads may go to the replica
+REPLICA_VIEWS = frozenset(
+    [
+        "services:services_list",
+        "services:service_detail",
+        "advertising:ads_list",
+        "advertising:ads_detail",
+        "clients:leads_list",
+        "clients:leads_detail",
+        "clients:customers_list",
+        "clients:customers_detail",
+        "clients:search",
+        "clients:search_autocomplete",
+        "contracts:contracts_list",
+        "contracts:contract_detail",
+        "contracts:contract_document",
+        "contracts:contract_search",
+        "my_statistics:ads_statistics",
+        "my_statistics:total_statistics",
+        "clients:leads_export",
+        "clients:customers_export",
+        "contracts:contracts_export",
+        "advertising:ads_export",
+        "my_statistics:ads_statistics_export",
+    ]
+)
+
+
+@dataclass
+class RoutingState:
+    """Routing of the request being processed."""
+
+    # Reads may go to the replica
+    replica: bool = False
+    # Something was written, read from the primary from now on
+    wrote: bool = False
+
+
+_state: ContextVar[Optional[RoutingState]] = ContextVar("routing_state", default=None)
+
+
+def replica_configured() -> bool:
+    return REPLICA in settings.DATABASES
+
+
+def in_transaction() -> bool:
+    return connections[PRIMARY].in_atomic_block
+
+
+@contextmanager
+def use_replica() -> Iterator[RoutingState]:
+    """Send the reads inside the block to the replica, if there is one."""
+    state = RoutingState(replica=True)
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """Database router sending the reads of read-only views to the replica."""
+
+    def db_for_read(self, model, **hints) -> Optional[str]:
+        state: Optional[RoutingState] = _state.get()
+        if (
+            state is None
+            or not state.replica
+            or state.wrote
+            or not replica_configured()
+            or in_transaction()
+        ):
+            return PRIMARY
+        return REPLICA
+
+    def db_for_write(self, model, **hints) -> str:
+        state: Optional[RoutingState] = _state.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints) -> bool:
+        # The replica holds the same data as the primary
+        return True
+
+    def allow_migrate(self, db: str, app_label: str, **hints) -> bool:
+        return db == PRIMARY
+
+
+class ReplicaRoutingMiddleware:
+    """Route the reads of the requests to REPLICA_VIEWS to the replica."""
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        state = RoutingState()
+        token = _state.set(state)
+        try:
+            response: HttpResponse = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote and hasattr(request, "session"):
+            request.session[PIN_SESSION_KEY] = (
+                time.time() + settings.REPLICA_PIN_SECONDS
+            )
+        return response
+
+    def process_view(self, request: HttpRequest, view_func, view_args, view_kwargs):
+        state: Optional[RoutingState] = _state.get()
+        if state is None or request.resolver_match.view_name not in REPLICA_VIEWS:
+            return None
+        pinned_until: float = 0
+        if hasattr(request, "session"):
+            pinned_until = request.session.get(PIN_SESSION_KEY, 0)
+        state.replica = pinned_until < time.time()
+        return None
@@ -9,11 +9,13 @@ https://docs.djangoproject.com/en/5.1/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
-from os import getenv
+from os import environ, getenv
 from pathlib import Path
 
 from dotenv import load_dotenv
 
+from crm.database import check_connection_limit, connection_settings
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -44,6 +46,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'myauth.apps.MyauthConfig',
     'services.apps.ServicesConfig',
@@ -54,11 +57,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'crm.instrumentation.InstrumentationMiddleware',
+    # Logs the views exceeding crm.query_budget.QUERY_BUDGETS, DEBUG only
+    'crm.query_budget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'crm.routers.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -67,7 +74,8 @@ ROOT_URLCONF = 'crm.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates timing the rendering for crm.instrumentation
+        'BACKEND': 'crm.instrumentation.InstrumentedDjangoTemplates',
         'DIRS': [
             BASE_DIR / 'crm' / 'templates',
             BASE_DIR / 'services' / 'templates',
@@ -104,9 +112,81 @@ DATABASES = {
         'PASSWORD': getenv('POSTGRES_PASSWORD', 'password'),
         'HOST': getenv('POSTGRES_HOST', 'localhost'),
         'PORT': getenv('POSTGRES_PORT', 5432),
+        # psycopg 3 pool or persistent connections, see crm/database.py
+        **connection_settings(environ),
+    }
+}
+# Optional read replica, see crm/routers.py
+if getenv('REPLICA_POSTGRES_HOST') or getenv('REPLICA_POSTGRES_DB'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': getenv('REPLICA_POSTGRES_DB', DATABASES['default']['NAME']),
+        'USER': getenv('REPLICA_POSTGRES_USER', DATABASES['default']['USER']),
+        'PASSWORD': getenv(
+            'REPLICA_POSTGRES_PASSWORD', DATABASES['default']['PASSWORD']
+        ),
+        'HOST': getenv('REPLICA_POSTGRES_HOST', DATABASES['default']['HOST']),
+        'PORT': getenv('REPLICA_POSTGRES_PORT', DATABASES['default']['PORT']),
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        # The tests read the replica from the test database of the primary
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['crm.routers.PrimaryReplicaRouter']
+# Seconds a session reads from the primary after writing something
+REPLICA_PIN_SECONDS = int(getenv('REPLICA_PIN_SECONDS', 5))
+# All the gunicorn workers must fit into DB_MAX_CONNECTIONS
+check_connection_limit(DATABASES, environ)
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+CACHES = {
+    'default': {
+        'BACKEND': getenv(
+            'DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': getenv('DJANGO_CACHE_LOCATION', 'crm'),
     }
 }
 
+# Users and their permissions are cached by myauth.backends.CachedModelBackend,
+# only in a cache shared by all the workers: the invalidation of a local
+# cache reaches only the worker making the change
+AUTHENTICATION_BACKENDS = ['myauth.backends.CachedModelBackend']
+AUTH_CACHE_TIMEOUT = int(getenv('AUTH_CACHE_TIMEOUT', 300))
+_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+AUTH_CACHE_SHARED = getenv(
+    'AUTH_CACHE_SHARED',
+    '0' if CACHES['default']['BACKEND'] in _LOCAL_CACHE_BACKENDS else '1',
+) == '1'
+
+# Instrumentation
+# Number of the last requests per URL name used for the percentiles
+INSTRUMENTATION_WINDOW = int(getenv('INSTRUMENTATION_WINDOW', 1000))
+
+# Lists
+LEADS_PAGE_SIZE = int(getenv('LEADS_PAGE_SIZE', 50))
+CUSTOMERS_PAGE_SIZE = int(getenv('CUSTOMERS_PAGE_SIZE', 50))
+CONTRACTS_PAGE_SIZE = int(getenv('CONTRACTS_PAGE_SIZE', 50))
+# Rows fetched at a time by the server-side cursors of the exports
+EXPORT_CHUNK_SIZE = int(getenv('EXPORT_CHUNK_SIZE', 2000))
+
+# Statistics
+# Total statistics are cached until one of the counted tables changes
+STATISTICS_CACHE_TIMEOUT = int(getenv('STATISTICS_CACHE_TIMEOUT', 300))
+# Use pg_class.reltuples instead of COUNT(*) for tables with at least
+# STATISTICS_APPROXIMATE_MIN_ROWS rows
+STATISTICS_APPROXIMATE_COUNTS = getenv('STATISTICS_APPROXIMATE_COUNTS', '0') == '1'
+STATISTICS_APPROXIMATE_MIN_ROWS = int(getenv('STATISTICS_APPROXIMATE_MIN_ROWS', 1_000_000))
+# Final days rolled up again by rollup_stats to catch the rows committed late
+STATISTICS_ROLLUP_LOOKBACK_DAYS = int(getenv('STATISTICS_ROLLUP_LOOKBACK_DAYS', 2))
+# Read the advertising statistics from the materialized view refreshed
+# by refresh_stats_view instead of the CampaignStats rollup
+STATISTICS_ADS_FROM_VIEW = getenv('STATISTICS_ADS_FROM_VIEW', '0') == '1'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -146,6 +226,23 @@ STATIC_ROOT = BASE_DIR / 'static'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'upload'
+# The tests store the media files in a temporary directory
+TEST_RUNNER = 'crm.test_runner.TestRunner'
+# Media files are not public, they are served by views checking
+# the permissions (see crm/downloads.py). With PROTECTED_MEDIA_X_ACCEL
+# nginx sends them from its internal location PROTECTED_MEDIA_PREFIX
+PROTECTED_MEDIA_X_ACCEL = getenv('PROTECTED_MEDIA_X_ACCEL', '0') == '1'
+PROTECTED_MEDIA_PREFIX = '/protected-media/'
+
+# Chunked uploads of the contract documents (see contracts/uploads.py)
+UPLOAD_SESSION_MAX_SIZE = int(getenv('UPLOAD_SESSION_MAX_SIZE', 100 * 1024 * 1024))
+# Keep below client_max_body_size of nginx
+UPLOAD_CHUNK_MAX_SIZE = int(getenv('UPLOAD_CHUNK_MAX_SIZE', 8 * 1024 * 1024))
+# Seconds after which an abandoned upload is removed by gc_upload_sessions
+UPLOAD_SESSION_TTL = int(getenv('UPLOAD_SESSION_TTL', 24 * 60 * 60))
+
+# Text search configuration of PostgreSQL for the contract documents
+CONTRACT_TEXT_SEARCH_CONFIG = getenv('CONTRACT_TEXT_SEARCH_CONFIG', 'russian')
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -166,6 +263,11 @@ LOGGING = {
             "handlers": ["console"],
             "level": "WARNING",
         },
+        "crm.instrumentation": {
+            "handlers": ["console"],
+            "level": getenv("INSTRUMENTATION_LOGLEVEL", "INFO"),
+            "propagate": False,
+        },
     },
     "root": {
         "handlers": ["console",],
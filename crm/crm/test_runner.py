@@ -0,0 +1,44 @@
+"""
+Test runner adapting the environment of the project to the test runs.
+
+The contract documents are stored by content hash and deleted after
+the commit, so the tests would leave files in MEDIA_ROOT. The runner
+points MEDIA_ROOT to a temporary directory removed after the run.
+
+The tests run in one process, so its local memory cache is shared
+by all the requests and the users and permissions are cached
+(AUTH_CACHE_SHARED) as in a deployment with a shared cache.
+
+The JSON line logged for every request by crm.instrumentation
+is turned off.
+"""
+
+import logging
+from tempfile import TemporaryDirectory
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """
+    DiscoverRunner with a temporary MEDIA_ROOT, the auth cache on
+    and the request log off.
+    """
+
+    def setup_test_environment(self, **kwargs) -> None:
+        super().setup_test_environment(**kwargs)
+        self._media_root = TemporaryDirectory(prefix="crm-media-")
+        self._settings = override_settings(
+            MEDIA_ROOT=self._media_root.name, AUTH_CACHE_SHARED=True
+        )
+        self._settings.enable()
+        self._request_log = logging.getLogger("crm.instrumentation")
+        self._request_log_level = self._request_log.level
+        self._request_log.setLevel(logging.WARNING)
+
+    def teardown_test_environment(self, **kwargs) -> None:
+        self._request_log.setLevel(self._request_log_level)
+        self._settings.disable()
+        self._media_root.cleanup()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,461 @@
+import csv
+import json
+import time
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+
+from advertising.factories import AdvertisingFactory
+from advertising.models import Advertising
+from clients.factories import CustomerFactory, LeadFactory
+from clients.models import Lead
+from contracts.factories import ContractFactory
+from contracts.models import Contract
+from django.contrib.auth.models import Group, User
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import resolve, reverse
+from my_statistics.business.statistics_logic import refresh_ads_statistics_view
+from myauth.utils import create_group_operators
+
+from .database import check_connection_limit, connection_settings, pool_available
+from .exports import csv_safe, queryset_rows
+from .instrumentation import percentile, rolling_stats
+from .lookups import LOOKUP_PAGE_SIZE
+from .query_budget import QueryBudgetTestMixin, log_queries
+from .routers import (
+    PIN_SESSION_KEY,
+    PrimaryReplicaRouter,
+    ReplicaRoutingMiddleware,
+    use_replica,
+)
+
+
+class LookupViewTest(TestCase):
+    """Test case class for testing the lookup endpoints and lazy fields."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.credentials = dict(username="test", password="test")
+        cls.user = User.objects.create_user(**cls.credentials)
+        create_group_operators()
+        cls.group = Group.objects.get(name="operators")
+        cls.user.groups.add(cls.group)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.user.delete()
+        cls.group.delete()
+
+    def setUp(self):
+        self.client.login(**self.credentials)
+        self.ads = [
+            AdvertisingFactory.create(name=f"campaign {i}")
+            for i in range(LOOKUP_PAGE_SIZE + 5)
+        ]
+
+    def test_lookup_pages(self):
+        """Test walking through the pages of the advertising lookup."""
+        url = reverse("lookup", kwargs={"name": "advertising"})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data["results"]), LOOKUP_PAGE_SIZE)
+        self.assertIsNotNone(data["next"])
+
+        response = self.client.get(url, {"after": data["next"]})
+        data_next = response.json()
+        self.assertEqual(len(data_next["results"]), 5)
+        self.assertIsNone(data_next["next"])
+        self.assertEqual(
+            [item["id"] for item in data["results"] + data_next["results"]],
+            list(Advertising.objects.order_by("pk").values_list("pk", flat=True)),
+        )
+
+    def test_lookup_search(self):
+        """Test searching the options."""
+        response = self.client.get(
+            reverse("lookup", kwargs={"name": "advertising"}), {"q": "campaign 12"}
+        )
+        self.assertEqual(
+            [item["id"] for item in response.json()["results"]], [self.ads[12].pk]
+        )
+
+    def test_lookup_permissions(self):
+        """Test that the lookups check the permissions."""
+        response = self.client.get(reverse("lookup", kwargs={"name": "contracts"}))
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(reverse("lookup", kwargs={"name": "unknown"}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_lead_form_renders_selected_option_only(self):
+        """Test that the lead form does not render all the campaigns."""
+        response = self.client.get(reverse("clients:leads_create"))
+        self.assertContains(response, "data-lookup-url")
+        self.assertNotContains(response, f'value="{self.ads[0].pk}"')
+
+        response = self.client.post(
+            reverse("clients:leads_create"),
+            {
+                "first_name": "Ivan",
+                "last_name": "Ivanov",
+                "phone": "+7 (999) 000 1122",
+                "email": "ivan@example.com",
+                "ads": self.ads[3].pk,
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        lead = Lead.objects.get(email="ivan@example.com")
+        self.assertEqual(lead.ads, self.ads[3])
+
+        response = self.client.get(
+            reverse("clients:leads_edit", kwargs={"pk": lead.pk})
+        )
+        self.assertContains(response, f'value="{self.ads[3].pk}" selected')
+        self.assertNotContains(response, f'value="{self.ads[4].pk}"')
+
+
+class InstrumentationTest(TestCase):
+    """Test case class for testing the instrumentation middleware."""
+
+    def setUp(self):
+        rolling_stats.clear()
+        self.staff = User.objects.create_user(
+            username="staff", password="staff", is_staff=True, is_superuser=True
+        )
+        self.client.login(username="staff", password="staff")
+
+    def test_server_timing_header(self):
+        """Test that the response reports the timings."""
+        with self.assertLogs("crm.instrumentation", "INFO") as logs:
+            response = self.client.get(reverse("clients:leads_list"))
+
+        self.assertRegex(
+            response["Server-Timing"],
+            r'total;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+',
+        )
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record["view"], "clients:leads_list")
+        self.assertGreater(record["db_queries"], 0)
+        self.assertGreater(record["template_ms"], 0)
+
+    def test_percentiles_endpoint(self):
+        """Test that the staff gets the percentiles per URL name."""
+        for _ in range(3):
+            self.client.get(reverse("clients:leads_list"))
+
+        response = self.client.get(reverse("instrumentation"))
+
+        stats = response.json()["views"]["clients:leads_list"]
+        self.assertEqual(stats["count"], 3)
+        self.assertEqual(set(stats["wall_ms"]), {"p50", "p95", "p99"})
+
+    def test_percentiles_endpoint_is_for_staff(self):
+        """Test that other users cannot see the percentiles."""
+        self.staff.is_staff = False
+        self.staff.save()
+        self.client.login(username="staff", password="staff")
+
+        response = self.client.get(reverse("instrumentation"))
+
+        self.assertEqual(response.status_code, 302)
+
+    def test_percentile(self):
+        """Test the nearest-rank percentile."""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7.0], 95), 7.0)
+
+
+class QueryBudgetTest(QueryBudgetTestMixin, TestCase):
+    """Test case class checking the query budgets of the list and detail views."""
+
+    def setUp(self):
+        User.objects.create_superuser(username="admin", password="admin")
+        self.client.login(username="admin", password="admin")
+        for i in range(5):
+            customer = CustomerFactory.create(
+                contract=ContractFactory.create(name=f"contract {i}"),
+                lead=LeadFactory.create(ads=AdvertisingFactory.create()),
+            )
+        self.customer = customer
+        # Warm the cached user and permissions
+        self.client.get(reverse("services:services_list"))
+
+    def test_list_views(self):
+        """Test the list views."""
+        for name in (
+            "services:services_list",
+            "advertising:ads_list",
+            "clients:leads_list",
+            "clients:customers_list",
+            "contracts:contracts_list",
+            "my_statistics:ads_statistics",
+            "my_statistics:total_statistics",
+        ):
+            with self.subTest(name=name):
+                response = self.get_within_budget(reverse(name))
+                self.assertEqual(response.status_code, 200)
+
+    @override_settings(STATISTICS_ADS_FROM_VIEW=True)
+    def test_ads_statistics_from_view(self):
+        """Test the statistics page reading the materialized view."""
+        refresh_ads_statistics_view()
+
+        response = self.get_within_budget(reverse("my_statistics:ads_statistics"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.context["refreshed_at"])
+
+    def test_detail_views(self):
+        """Test the detail views."""
+        lead = self.customer.lead
+        for name, pk in (
+            ("services:service_detail", lead.ads.product.pk),
+            ("advertising:ads_detail", lead.ads.pk),
+            ("clients:leads_detail", lead.pk),
+            ("clients:customers_detail", self.customer.pk),
+            ("contracts:contract_detail", self.customer.contract.pk),
+        ):
+            with self.subTest(name=name):
+                response = self.get_within_budget(reverse(name, kwargs={"pk": pk}))
+                self.assertEqual(response.status_code, 200)
+
+    def test_search(self):
+        """Test the search page."""
+        response = self.get_within_budget(reverse("clients:search"), {"q": "contract"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_n_plus_one_is_detected(self):
+        """Test that repeated queries of the same shape are reported."""
+        with log_queries() as query_log:
+            for lead in Lead.objects.all():
+                str(lead.ads)
+
+        problems = query_log.problems("clients:leads_list")
+        self.assertTrue(any("N+1 candidate" in problem for problem in problems))
+        self.assertTrue(any("crm/tests.py" in problem for problem in problems))
+
+
+class DatabaseSettingsTest(TestCase):
+    """Test case class for testing the connection settings."""
+
+    def test_persistent_connections_by_default(self):
+        """Test the fallback to persistent connections."""
+        db_settings = connection_settings({"DB_CONN_MAX_AGE": "30"})
+
+        self.assertEqual(db_settings["CONN_MAX_AGE"], 30)
+        self.assertTrue(db_settings["CONN_HEALTH_CHECKS"])
+        self.assertNotIn("pool", db_settings["OPTIONS"])
+
+    @skipUnless(pool_available(), "psycopg_pool is not installed")
+    def test_pool(self):
+        """Test the pool settings from the environment."""
+        db_settings = connection_settings(
+            {"DB_POOL": "1", "DB_POOL_MIN_SIZE": "1", "DB_POOL_MAX_SIZE": "8"}
+        )
+
+        self.assertEqual(db_settings["CONN_MAX_AGE"], 0)
+        self.assertEqual(db_settings["OPTIONS"]["pool"]["min_size"], 1)
+        self.assertEqual(db_settings["OPTIONS"]["pool"]["max_size"], 8)
+
+    def test_pool_is_not_installed(self):
+        """Test that the pool cannot be enabled without psycopg_pool."""
+        with patch("crm.database.pool_available", return_value=False):
+            with self.assertRaises(ImproperlyConfigured):
+                connection_settings({"DB_POOL": "1"})
+
+    def test_connection_limit(self):
+        """Test that the workers must fit into DB_MAX_CONNECTIONS."""
+        pooled = {"default": {"OPTIONS": {"pool": {"min_size": 2, "max_size": 5}}}}
+        persistent = {"default": {"OPTIONS": {}}}
+        env = {"WEB_CONCURRENCY": "4", "DB_MAX_CONNECTIONS": "20"}
+
+        self.assertEqual(check_connection_limit(pooled, env), 20)
+        self.assertEqual(
+            check_connection_limit(persistent, {**env, "GUNICORN_THREADS": "2"}), 8
+        )
+        with self.assertRaises(ImproperlyConfigured):
+            check_connection_limit(pooled, {**env, "WEB_CONCURRENCY": "5"})
+        with self.assertRaises(ImproperlyConfigured):
+            check_connection_limit({**pooled, "replica": pooled["default"]}, env)
+
+
+@patch("crm.routers.in_transaction", return_value=False)
+@patch("crm.routers.replica_configured", return_value=True)
+class ReplicaRoutingTest(TestCase):
+    """Test case class for testing the routing to the read replica."""
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def process(self, path, session, write=False):
+        """Pass a request through the middleware, return the routing of reads."""
+        request = self.factory.get(path)
+        request.session = session
+        request.resolver_match = resolve(path)
+        routed = []
+
+        def get_response(request):
+            middleware.process_view(request, None, (), {})
+            routed.append(self.router.db_for_read(Lead))
+            if write:
+                self.router.db_for_write(Lead)
+                routed.append(self.router.db_for_read(Lead))
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        middleware(request)
+        return routed
+
+    def test_reads_outside_requests(self, *mocks):
+        """Test that only the reads inside use_replica go to the replica."""
+        self.assertEqual(self.router.db_for_read(Lead), "default")
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(Lead), "replica")
+            self.assertEqual(self.router.db_for_write(Lead), "default")
+            self.assertEqual(self.router.db_for_read(Lead), "default")
+
+    def test_no_replica(self, replica_configured, in_transaction):
+        """Test the fallback to the primary without a replica."""
+        replica_configured.return_value = False
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(Lead), "default")
+
+    def test_transaction(self, replica_configured, in_transaction):
+        """Test that the reads in transactions go to the primary."""
+        in_transaction.return_value = True
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(Lead), "default")
+
+    def test_read_only_views(self, *mocks):
+        """Test that only the read-only views read from the replica."""
+        self.assertEqual(self.process(reverse("clients:leads_list"), {}), ["replica"])
+        self.assertEqual(self.process(reverse("clients:leads_create"), {}), ["default"])
+
+    def test_read_your_writes(self, *mocks):
+        """Test that the session reads from the primary after writing."""
+        session = {}
+        self.assertEqual(
+            self.process(reverse("clients:leads_list"), session, write=True),
+            ["replica", "default"],
+        )
+        self.assertEqual(
+            self.process(reverse("clients:leads_list"), session), ["default"]
+        )
+
+        session[PIN_SESSION_KEY] = time.time() - 1
+        self.assertEqual(
+            self.process(reverse("clients:leads_list"), session), ["replica"]
+        )
+
+
+class ExportTest(TestCase):
+    """Test case class for testing the streaming exports."""
+
+    EXPORTS = (
+        "clients:leads_export",
+        "clients:customers_export",
+        "contracts:contracts_export",
+        "advertising:ads_export",
+        "my_statistics:ads_statistics_export",
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        cls.credentials = dict(username="exporter", password="test")
+        cls.user = User.objects.create_superuser(**cls.credentials)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.user.delete()
+
+    def setUp(self):
+        self.client.login(**self.credentials)
+        self.ads = AdvertisingFactory.create(name="=HYPERLINK(1)")
+        for index, cost in enumerate(("10.00", "300.00")):
+            lead = LeadFactory.create(ads=self.ads)
+            contract = ContractFactory.create(
+                name=f"Export contract {index}", cost=Decimal(cost)
+            )
+            CustomerFactory.create(lead=lead, contract=contract)
+        LeadFactory.create(ads=self.ads)
+
+    def export(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode("utf-8-sig")
+
+    def test_csv_exports(self):
+        """Test that every export streams a header and a row per object."""
+        expected = {
+            "clients:leads_export": 3,
+            "clients:customers_export": 2,
+            "contracts:contracts_export": 2,
+            "advertising:ads_export": 1,
+            "my_statistics:ads_statistics_export": 1,
+        }
+        for name in self.EXPORTS:
+            with self.subTest(name=name):
+                rows = list(csv.DictReader(StringIO(self.export(name))))
+                self.assertEqual(len(rows), expected[name])
+
+        ads = next(csv.DictReader(StringIO(self.export("advertising:ads_export"))))
+        self.assertEqual(ads["name"], "'=HYPERLINK(1)")
+        self.assertEqual(ads["leads_count"], "3")
+
+    def test_ndjson_export(self):
+        """Test that NDJSON has one object per line with the joined values."""
+        content = self.export("clients:customers_export", format="ndjson")
+        customers = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(
+            sorted(customer["cost"] for customer in customers), ["10.00", "300.00"]
+        )
+        contract = Contract.objects.get(pk=customers[0]["contract_id"])
+        self.assertEqual(customers[0]["product"], contract.product.name)
+
+    def test_export_is_filtered(self):
+        """Test that the exports of the lists take the filters of the lists."""
+        content = self.export("contracts:contracts_export", cost_min="100")
+        self.assertEqual(
+            [row["name"] for row in csv.DictReader(StringIO(content))],
+            ["Export contract 1"],
+        )
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse("clients:leads_export"), {"format": "xml"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_permission_required(self):
+        """Users without the view permissions do not get the exports."""
+        User.objects.create_user(username="nobody", password="nobody")
+        self.client.login(username="nobody", password="nobody")
+        for name in self.EXPORTS:
+            with self.subTest(name=name):
+                self.assertEqual(self.client.get(reverse(name)).status_code, 302)
+
+    def test_rows_are_read_lazily(self):
+        """Test that the query runs only when the rows are read."""
+        with self.assertNumQueries(0):
+            rows = queryset_rows(Lead.objects.order_by("pk"), ["pk"], chunk_size=2)
+        self.assertEqual(len(list(rows)), Lead.objects.count())
+
+    def test_csv_safe(self):
+        self.assertEqual(csv_safe("=1+1"), "'=1+1")
+        self.assertEqual(csv_safe("@SUM(A1)"), "'@SUM(A1)")
+        self.assertEqual(csv_safe("-A1"), "'-A1")
+        self.assertEqual(csv_safe("-1+cmd|' /C calc'!A0"), "'-1+cmd|' /C calc'!A0")
+        self.assertEqual(
+            csv_safe('+1+HYPERLINK("http://example.com","x")'),
+            '\'+1+HYPERLINK("http://example.com","x")',
+        )
+        self.assertEqual(csv_safe("+7 (999) 000 0000"), "'+7 (999) 000 0000")
+        self.assertEqual(csv_safe("\t1"), "'\t1")
+        self.assertEqual(csv_safe("-5"), "-5")
+        self.assertEqual(csv_safe("+1.5e3"), "+1.5e3")
+        self.assertEqual(csv_safe(Decimal("1.5")), Decimal("1.5"))
@@ -20,16 +20,20 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from .instrumentation import instrumentation_stats
+from .lookups import lookup
+
 urlpatterns = [
     path("", include("services.urls")),
     path("", include("advertising.urls")),
     path("", include("clients.urls")),
     path("", include("contracts.urls")),
     path("", include("my_statistics.urls")),
+    path("lookups/<str:name>/", lookup, name="lookup"),
+    path("instrumentation/", instrumentation_stats, name="instrumentation"),
     path("accounts/", include("myauth.urls")),
     path("admin/", admin.site.urls),
 ]
 
 if settings.DEBUG:
     urlpatterns.extend(static(settings.STATIC_URL, document_root=settings.STATIC_ROOT))
-    urlpatterns.extend(static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT))
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class MyStatisticsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'my_statistics'
+
+    def ready(self):
+        from . import signals  # noqa: F401
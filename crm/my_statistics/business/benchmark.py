@@ -0,0 +1,205 @@
+"""
+Benchmarks of the hot views and the statistics functions.
+
+Every case is run a number of times after a warm-up: the latency
+percentiles come from the timed runs, the number of queries and the peak
+memory (traced by tracemalloc, which slows the code down, so it is measured
+in a separate run) from single runs. The database connection is kept
+open between the requests, so the views are measured without the cost
+of connecting. The results are saved as JSON and compared with a baseline
+saved by an earlier run.
+"""
+
+import json
+import tracemalloc
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from statistics import mean
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Tuple
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.signals import request_finished
+from django.db import close_old_connections
+from django.test import Client
+from django.urls import reverse
+
+from crm.instrumentation import percentile
+from crm.query_budget import log_queries
+
+from .data_generator import GeneratorConfig
+from .statistics_logic import (
+    ads_statistics,
+    annotate_ads_statistics,
+    count_total_statistics,
+    total_statistics,
+)
+
+# Data sets of the benchmarks: scale name -> number of leads
+SCALES: Dict[str, int] = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+VIEWS: Tuple[str, ...] = (
+    "clients:leads_list",
+    "clients:customers_list",
+    "contracts:contracts_list",
+    "my_statistics:ads_statistics",
+    "my_statistics:total_statistics",
+)
+
+
+def scale_config(scale: str, seed: int = 0) -> GeneratorConfig:
+    """Generator config of the data set of the scale."""
+    leads: int = SCALES[scale]
+    return GeneratorConfig(
+        seed=seed,
+        services=50,
+        ads=200,
+        leads=leads,
+        customers=leads // 5,
+        contracts=leads // 5,
+        chunk_size=min(leads, 20_000),
+    )
+
+
+@dataclass
+class CaseResult:
+    """Measurements of one benchmark case, the times are in milliseconds."""
+
+    runs: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    mean_ms: float
+    queries: int
+    peak_memory_kb: float
+
+
+def measure(func: Callable[[], Any], runs: int, warmup: int = 1) -> CaseResult:
+    """Run the function and measure it."""
+    for _ in range(warmup):
+        func()
+
+    timings: List[float] = []
+    for _ in range(runs):
+        started: float = perf_counter()
+        func()
+        timings.append((perf_counter() - started) * 1000)
+
+    with log_queries() as queries:
+        func()
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return CaseResult(
+        runs=runs,
+        p50_ms=round(percentile(timings, 50), 3),
+        p95_ms=round(percentile(timings, 95), 3),
+        p99_ms=round(percentile(timings, 99), 3),
+        mean_ms=round(mean(timings), 3),
+        queries=len(queries),
+        peak_memory_kb=round(peak / 1024, 1),
+    )
+
+
+def _view_case(client: Client, url: str) -> Callable[[], Any]:
+    def case():
+        response = client.get(url)
+        assert response.status_code == 200, f"{url}: {response.status_code}"
+
+    return case
+
+
+def _uncached(func: Callable[[], Any]) -> Callable[[], Any]:
+    def case():
+        cache.clear()
+        return func()
+
+    return case
+
+
+def cases() -> Dict[str, Callable[[], Any]]:
+    """The benchmark cases by name."""
+    user, _ = User.objects.get_or_create(
+        username="benchmark", defaults={"is_staff": True, "is_superuser": True}
+    )
+    client = Client()
+    client.force_login(user)
+
+    benchmark_cases: Dict[str, Callable[[], Any]] = {
+        f"view:{name}": _view_case(client, reverse(name)) for name in VIEWS
+    }
+    benchmark_cases.update(
+        {
+            "func:annotate_ads_statistics": lambda: list(annotate_ads_statistics()),
+            "func:ads_statistics": ads_statistics,
+            "func:count_total_statistics": count_total_statistics,
+            "func:total_statistics": total_statistics,
+            "func:total_statistics(uncached)": _uncached(total_statistics),
+        }
+    )
+    return benchmark_cases
+
+
+def run_benchmarks(runs: int, warmup: int = 1) -> Dict[str, CaseResult]:
+    """Measure all the cases on the current database."""
+    request_finished.disconnect(close_old_connections)
+    try:
+        return {
+            name: measure(case, runs=runs, warmup=warmup)
+            for name, case in cases().items()
+        }
+    finally:
+        request_finished.connect(close_old_connections)
+
+
+def to_report(scale: str, results: Dict[str, CaseResult]) -> Dict[str, Any]:
+    return {
+        "scale": scale,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "results": {name: asdict(result) for name, result in results.items()},
+    }
+
+
+def save_report(path: str, report: Dict[str, Any]) -> None:
+    with open(path, "w", encoding="UTF-8") as file:
+        json.dump(report, file, indent=2)
+
+
+def load_report(path: str) -> Dict[str, Any]:
+    with open(path, encoding="UTF-8") as file:
+        return json.load(file)
+
+
+def find_regressions(
+    baseline: Dict[str, Any], report: Dict[str, Any], threshold: float
+) -> List[str]:
+    """
+    Compare the report with the baseline.
+
+    :param threshold: Allowed relative growth, 0.2 means 20%.
+    :return: Descriptions of the cases that got slower, issue more queries
+     or use more memory than the threshold allows.
+    """
+    regressions: List[str] = []
+    for name, result in report["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        for metric in ("p50_ms", "p95_ms", "peak_memory_kb"):
+            if old[metric] and result[metric] > old[metric] * (1 + threshold):
+                growth: float = result[metric] / old[metric] - 1
+                regressions.append(
+                    f"{name}: {metric} {old[metric]} -> {result[metric]}"
+                    f" (+{growth:.0%})"
+                )
+        if result["queries"] > old["queries"]:
+            regressions.append(
+                f"{name}: queries {old['queries']} -> {result['queries']}"
+            )
+    return regressions
@@ -0,0 +1,410 @@
+"""
+Generator of production-scale synthetic data.
+
+The data is a deterministic function of the seed: every kind of rows is
+generated in shards, each with its own random.Random seeded by the seed,
+the kind and the number of the shard, so the result does not depend on
+the number of worker processes.
+
+The primary keys of leads and contracts are reserved from their sequences
+up front. Phones and emails of the leads and names of the contracts are
+derived from the primary keys, so they are unique by construction and
+never clash with each other or with the rows of earlier runs. The leads
+are spread evenly over the history_days before the start of the run
+in the order of their pks, as they would be appended, and every customer
+comes a few days after its lead. Rows are
+inserted in chunks with COPY (or bulk_create), all the contracts share
+one placeholder document, counted as referred to by all of them.
+"""
+
+import csv
+import random
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from itertools import islice
+from multiprocessing import get_context
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence, Tuple, Type
+
+from advertising.models import Advertising
+from clients.models import Customer, Lead
+from contracts.documents import add_reference
+from contracts.models import Contract
+from contracts.storage import document_storage
+from django.core.files.base import ContentFile
+from django.db import connection, connections, transaction
+from django.db.models import Model
+from django.utils import timezone
+from services.models import Service
+
+from .rollup import queue_days, rollup_daily_stats
+from .statistics_cache import bump_table_version
+from .statistics_logic import TOTAL_STATISTICS_MODELS, rebuild_campaign_stats
+
+PLACEHOLDER_DOC = "contracts/generated-placeholder.txt"
+
+FIRST_NAMES = tuple(
+    "Ivan Petr Anna Maria Olga Sergey Elena Dmitry Irina Alexey Natalia".split()
+)
+LAST_NAMES = tuple(
+    "Ivanov Petrov Sidorov Smirnov Kuznetsov Popov Sokolov Lebedev Kozlov".split()
+)
+WORDS = tuple(
+    "alpha bravo delta echo fox gamma nova orbit pixel quantum rapid sigma".split()
+)
+CHANNELS = ("search", "social", "email", "tv", "radio", "outdoor", "partners")
+
+# Share of the leads that came without an advertising campaign
+NO_ADS_SHARE = 0.05
+# Phones are +7 (9XX) XXX XXXX with XX < 99, the code 999 is left
+# to the factories of the tests
+PHONES_COUNT = 99 * 10**7
+
+LEAD_COLUMNS = (
+    "id",
+    "first_name",
+    "last_name",
+    "phone",
+    "email",
+    "ads_id",
+    "created_at",
+)
+CONTRACT_COLUMNS = (
+    "id",
+    "name",
+    "product_id",
+    "doc",
+    "start_date",
+    "end_date",
+    "cost",
+)
+CUSTOMER_COLUMNS = ("lead_id", "contract_id", "created_at")
+# A customer comes at most CUSTOMER_DELAY_DAYS after its lead
+CUSTOMER_DELAY_DAYS = 14
+
+
+@dataclass
+class GeneratorConfig:
+    """Target counts and the settings of the generator."""
+
+    seed: int = 0
+    services: int = 50
+    ads: int = 200
+    leads: int = 100_000
+    customers: int = 20_000
+    contracts: int = 20_000
+    history_days: int = 365
+    chunk_size: int = 10_000
+    workers: int = 1
+    use_copy: bool = True
+
+    def validate(self) -> None:
+        """:raise ValueError: If the counts are inconsistent."""
+        counts = (self.services, self.ads, self.leads, self.customers, self.contracts)
+        if min(counts) < 0:
+            raise ValueError("Counts must not be negative")
+        if self.ads and not self.services:
+            raise ValueError("Advertising needs at least one service")
+        if self.contracts and not self.services:
+            raise ValueError("Contracts need at least one service")
+        if self.customers > self.leads:
+            raise ValueError("There cannot be more customers than leads")
+        if self.customers > self.contracts:
+            raise ValueError("Every customer needs a contract")
+        if self.leads > PHONES_COUNT:
+            raise ValueError(f"At most {PHONES_COUNT} leads are supported")
+
+
+def lead_phone(pk: int) -> str:
+    """Unique phone of the generated lead with the primary key."""
+    number: int = pk % PHONES_COUNT
+    code, rest = divmod(number, 10**7)
+    return f"+7 (9{code:02d}) {rest // 10**4:03d} {rest % 10**4:04d}"
+
+
+def lead_email(pk: int) -> str:
+    """Unique email of the generated lead with the primary key."""
+    return f"lead{pk}@generated.test"
+
+
+def lead_created_at(config: GeneratorConfig, started: datetime, index: int) -> datetime:
+    """Creation time of the index-th generated lead."""
+    history = timedelta(days=config.history_days)
+    return started - history + history * index / max(config.leads, 1)
+
+
+def shard_rng(config: GeneratorConfig, kind: str, shard: int) -> random.Random:
+    return random.Random(f"{config.seed}:{kind}:{shard}")
+
+
+def reserve_ids(model: Type[Model], count: int) -> int:
+    """
+    Reserve count consecutive primary keys from the sequence of the model.
+
+    :return: The first reserved primary key.
+    """
+    table: str = model._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Inserts take the next values of the sequence while holding
+        # a lock conflicting with this one, so none of them gets in between
+        cursor.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+        cursor.execute(
+            "SELECT setval(pg_get_serial_sequence(%s, 'id'),"
+            " nextval(pg_get_serial_sequence(%s, 'id')) + %s - 1)",
+            [table, table, count],
+        )
+        last: int = cursor.fetchone()[0]
+    return last - count + 1
+
+
+def copy_rows(model: Type[Model], columns: Sequence[str], rows: List[tuple]) -> None:
+    """Insert the rows into the table of the model with COPY FROM STDIN."""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    # An unquoted empty value is NULL in the CSV format of COPY
+    writer.writerows(rows)
+    sql: str = (
+        f"COPY {model._meta.db_table} ({', '.join(columns)})"
+        " FROM STDIN WITH (FORMAT csv)"
+    )
+    with connection.cursor() as cursor:
+        if hasattr(cursor, "copy_expert"):  # psycopg2
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+
+def insert_rows(
+    model: Type[Model],
+    columns: Sequence[str],
+    rows: Iterable[tuple],
+    config: GeneratorConfig,
+) -> int:
+    """Insert the rows chunk by chunk, return their number."""
+    iterator: Iterator[tuple] = iter(rows)
+    count: int = 0
+    while chunk := list(islice(iterator, config.chunk_size)):
+        if config.use_copy:
+            copy_rows(model, columns, chunk)
+        else:
+            model.objects.bulk_create(
+                [model(**dict(zip(columns, row))) for row in chunk]
+            )
+        count += len(chunk)
+    return count
+
+
+def _lead_rows(
+    config: GeneratorConfig,
+    shard: int,
+    first_pk: int,
+    start: int,
+    ad_pks: List[int],
+    started: datetime,
+) -> Iterator[tuple]:
+    rng: random.Random = shard_rng(config, "leads", shard)
+    for pk in range(first_pk + start, first_pk + start + config.chunk_size):
+        ads_id = None
+        if ad_pks and rng.random() >= NO_ADS_SHARE:
+            ads_id = rng.choice(ad_pks)
+        yield (
+            pk,
+            rng.choice(FIRST_NAMES),
+            rng.choice(LAST_NAMES),
+            lead_phone(pk),
+            lead_email(pk),
+            ads_id,
+            lead_created_at(config, started, pk - first_pk),
+        )
+
+
+def _contract_rows(
+    config: GeneratorConfig,
+    shard: int,
+    first_pk: int,
+    service_pks: List[int],
+    doc: str,
+) -> Iterator[tuple]:
+    rng: random.Random = shard_rng(config, "contracts", shard)
+    today: date = date.today()
+    for pk in range(first_pk, first_pk + config.chunk_size):
+        start_date: date = today - timedelta(days=rng.randint(0, 365))
+        yield (
+            pk,
+            f"Contract {pk}",
+            rng.choice(service_pks),
+            doc,
+            start_date,
+            start_date + timedelta(days=rng.randint(30, 730)),
+            Decimal(rng.randint(100_00, 999_999_99)) / 100,
+        )
+
+
+def _customer_rows(
+    config: GeneratorConfig,
+    start: int,
+    first_lead: int,
+    first_contract: int,
+    started: datetime,
+) -> Iterator[tuple]:
+    for index in range(start, start + config.chunk_size):
+        # The customers are spread evenly over the leads
+        lead_index: int = index * config.leads // config.customers
+        created_at: datetime = lead_created_at(config, started, lead_index) + timedelta(
+            days=index % CUSTOMER_DELAY_DAYS
+        )
+        yield first_lead + lead_index, first_contract + index, min(created_at, started)
+
+
+def _generate_shard(task: Tuple[str, GeneratorConfig, int, int, int, Any]) -> int:
+    """
+    Generate and insert one shard of leads, contracts or customers.
+
+    :param task: The kind of rows, the config, the number of the shard,
+     the first and the last (exclusive) index of the rows and the context
+     of the kind (pks of the ads, pks of the services or
+     the first pks of the leads and the contracts, the leads and
+     the customers also get the start of the run).
+    """
+    kind, config, shard, start, stop, context = task
+    model: Type[Model]
+    columns: Sequence[str]
+    rows: Iterable[tuple]
+    if kind == "leads":
+        model, columns = Lead, LEAD_COLUMNS
+        first_pk, ad_pks, started = context
+        rows = _lead_rows(config, shard, first_pk, start, ad_pks, started)
+    elif kind == "contracts":
+        model, columns = Contract, CONTRACT_COLUMNS
+        first_pk, service_pks, doc = context
+        rows = _contract_rows(config, shard, first_pk + start, service_pks, doc)
+    else:
+        model, columns = Customer, CUSTOMER_COLUMNS
+        first_lead, first_contract, started = context
+        rows = _customer_rows(config, start, first_lead, first_contract, started)
+    return insert_rows(model, columns, islice(rows, stop - start), config)
+
+
+def _shards(
+    kind: str, config: GeneratorConfig, count: int, context: Any
+) -> List[Tuple[str, GeneratorConfig, int, int, int, Any]]:
+    """Split count rows into shards of chunk_size rows."""
+    return [
+        (kind, config, shard, start, min(start + config.chunk_size, count), context)
+        for shard, start in enumerate(range(0, count, config.chunk_size))
+    ]
+
+
+def _run(tasks: List[Tuple], config: GeneratorConfig) -> int:
+    if config.workers <= 1 or len(tasks) <= 1:
+        return sum(_generate_shard(task) for task in tasks)
+    # The forked workers must open their own connections
+    connections.close_all()
+    for conn in connections.all():
+        if conn.settings_dict["OPTIONS"].get("pool"):
+            conn.close_pool()
+    with ProcessPoolExecutor(
+        max_workers=config.workers, mp_context=get_context("fork")
+    ) as executor:
+        return sum(executor.map(_generate_shard, tasks))
+
+
+def generate(
+    config: GeneratorConfig, log: Callable[[str], None] = lambda message: None
+) -> Dict[str, int]:
+    """
+    Generate the data and update the statistics.
+
+    :param log: Callback receiving the progress messages.
+    :return: Number of the created rows of every kind.
+    :raise ValueError: If the counts are inconsistent.
+    """
+    config.validate()
+    created: Dict[str, int] = dict()
+
+    rng: random.Random = shard_rng(config, "services", 0)
+    services: List[Service] = Service.objects.bulk_create(
+        [
+            Service(
+                name=f"{rng.choice(WORDS).title()} {index}",
+                description=" ".join(rng.choices(WORDS, k=12)),
+                cost=Decimal(rng.randint(100_00, 99_999_99)) / 100,
+            )
+            for index in range(config.services)
+        ],
+        batch_size=config.chunk_size,
+    )
+    service_pks: List[int] = [service.pk for service in services]
+    created["services"] = len(service_pks)
+    log(f"Services: {created['services']}")
+
+    rng = shard_rng(config, "ads", 0)
+    ads: List[Advertising] = Advertising.objects.bulk_create(
+        [
+            Advertising(
+                name=f"{rng.choice(WORDS)} campaign {index}",
+                channel=rng.choice(CHANNELS),
+                budget=Decimal(rng.randint(1000_00, 999_999_99)) / 100,
+                product_id=rng.choice(service_pks),
+            )
+            for index in range(config.ads)
+        ],
+        batch_size=config.chunk_size,
+    )
+    ad_pks: List[int] = [ad.pk for ad in ads]
+    created["ads"] = len(ad_pks)
+    log(f"Ads: {created['ads']}")
+
+    started: datetime = timezone.now()
+    first_lead: int = reserve_ids(Lead, config.leads) if config.leads else 0
+    created["leads"] = _run(
+        _shards("leads", config, config.leads, (first_lead, ad_pks, started)), config
+    )
+    log(f"Leads: {created['leads']}")
+
+    doc: str = document_storage.save(
+        PLACEHOLDER_DOC, ContentFile(b"Generated contract document")
+    )
+    first_contract: int = (
+        reserve_ids(Contract, config.contracts) if config.contracts else 0
+    )
+    created["contracts"] = _run(
+        _shards(
+            "contracts",
+            config,
+            config.contracts,
+            (first_contract, service_pks, doc),
+        ),
+        config,
+    )
+    if created["contracts"]:
+        add_reference(doc, created["contracts"])
+    log(f"Contracts: {created['contracts']}")
+
+    created["customers"] = _run(
+        _shards(
+            "customers",
+            config,
+            config.customers,
+            (first_lead, first_contract, started),
+        ),
+        config,
+    )
+    log(f"Customers: {created['customers']}")
+
+    # Bulk inserts do not send signals
+    rebuild_campaign_stats()
+    # The generated days are in the past, the corrections bring them
+    # into a rollup made before
+    queue_days(
+        timezone.localdate(started - timedelta(days=days))
+        for days in range(config.history_days + 1)
+    )
+    rollup_daily_stats()
+    for model in TOTAL_STATISTICS_MODELS:
+        bump_table_version(model)
+    return created
@@ -0,0 +1,202 @@
+"""
+Daily rollup of the advertising campaign funnel.
+
+rollup_daily_stats aggregates the leads and the customers of the days
+which are not rolled up yet into DailyCampaignStats, a range of days
+per transaction, so the BRIN indexes on created_at limit every query
+to the blocks of its range. RollupState keeps the last final day.
+Today is not final, it is rolled up again by every run, and the last
+STATISTICS_ROLLUP_LOOKBACK_DAYS final days are recomputed as well
+to catch the rows committed late.
+
+Changes of older rows (a lead moved to another campaign, a deleted
+customer, a new contract cost, a backdated import) queue their days
+in DailyStatsCorrection (see my_statistics.signals), and the next run
+recomputes those days.
+"""
+
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from clients.models import Customer, Lead
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from ..models import DailyCampaignStats, DailyStatsCorrection, RollupState
+
+ROLLUP_NAME = "daily_campaign_stats"
+# Days recomputed by one transaction
+RANGE_DAYS = 31
+
+# (day, advertising pk)
+DayKey = Tuple[date, Optional[int]]
+
+
+def day_bounds(first: date, last: date) -> Tuple[datetime, datetime]:
+    """The moments the first day starts and the last day ends, in TIME_ZONE."""
+    tz = timezone.get_current_timezone()
+    return (
+        datetime.combine(first, time.min, tzinfo=tz),
+        datetime.combine(last + timedelta(days=1), time.min, tzinfo=tz),
+    )
+
+
+def day_ranges(
+    days: Iterable[date], max_days: int = RANGE_DAYS
+) -> List[Tuple[date, date]]:
+    """Split the days into ranges of consecutive days (first, last)."""
+    ranges: List[Tuple[date, date]] = []
+    for day in sorted(set(days)):
+        if ranges:
+            first, last = ranges[-1]
+            if day == last + timedelta(days=1) and (day - first).days < max_days:
+                ranges[-1] = (first, day)
+                continue
+        ranges.append((day, day))
+    return ranges
+
+
+def queue_days(days: Iterable[date]) -> None:
+    """
+    Queue the days before today for the next rollup.
+
+    Today and the days after the last rollup are recomputed anyway.
+    """
+    today: date = timezone.localdate()
+    DailyStatsCorrection.objects.bulk_create(
+        [DailyStatsCorrection(day=day) for day in set(days) if day < today],
+        ignore_conflicts=True,
+    )
+
+
+def queue_corrections(moments: Iterable[Optional[datetime]]) -> None:
+    """Queue the days of the moments, the missing ones are skipped."""
+    queue_days(
+        timezone.localdate(moment) for moment in moments if isinstance(moment, datetime)
+    )
+
+
+def aggregate_days(first: date, last: date) -> List[DailyCampaignStats]:
+    """Compute the rollup rows of the days from first to last."""
+    start, end = day_bounds(first, last)
+    rows: Dict[DayKey, DailyCampaignStats] = dict()
+
+    def row(key: DayKey) -> DailyCampaignStats:
+        if key not in rows:
+            rows[key] = DailyCampaignStats(
+                day=key[0],
+                advertising_id=key[1],
+                leads_count=0,
+                customers_count=0,
+                income=Decimal(0),
+            )
+        return rows[key]
+
+    leads = (
+        Lead.objects.filter(created_at__gte=start, created_at__lt=end)
+        .values(day=TruncDate("created_at"), campaign=F("ads"))
+        .annotate(count=Count("pk"))
+        .order_by()
+    )
+    for group in leads:
+        row((group["day"], group["campaign"])).leads_count = group["count"]
+
+    customers = (
+        Customer.objects.filter(created_at__gte=start, created_at__lt=end)
+        .values(day=TruncDate("created_at"), campaign=F("lead__ads"))
+        .annotate(count=Count("pk"), income=Sum("contract__cost"))
+        .order_by()
+    )
+    for group in customers:
+        stats: DailyCampaignStats = row((group["day"], group["campaign"]))
+        stats.customers_count = group["count"]
+        stats.income = group["income"] or Decimal(0)
+
+    return list(rows.values())
+
+
+def recompute_days(first: date, last: date) -> int:
+    """
+    Replace the rollup rows of the days from first to last.
+
+    Must run in a transaction. The queued corrections of the days
+    are removed before the days are read, so a correction committed
+    while they are recomputed stays in the queue for the next run.
+
+    :return: Number of the written rows.
+    """
+    DailyStatsCorrection.objects.filter(day__range=(first, last)).delete()
+    stats: List[DailyCampaignStats] = aggregate_days(first, last)
+    DailyCampaignStats.objects.filter(day__range=(first, last)).delete()
+    DailyCampaignStats.objects.bulk_create(stats, batch_size=1000)
+    return len(stats)
+
+
+def _first_day() -> Optional[date]:
+    moments = [
+        model.objects.aggregate(first=Min("created_at"))["first"]
+        for model in (Lead, Customer)
+    ]
+    moments = [moment for moment in moments if moment is not None]
+    return timezone.localdate(min(moments)) if moments else None
+
+
+def _locked_state() -> RollupState:
+    # Concurrent runs wait for each other on the row of the state
+    RollupState.objects.get_or_create(name=ROLLUP_NAME)
+    return RollupState.objects.select_for_update().get(name=ROLLUP_NAME)
+
+
+def rollup_daily_stats(
+    lookback_days: Optional[int] = None,
+    today: Optional[date] = None,
+    log: Callable[[str], None] = lambda message: None,
+) -> int:
+    """
+    Roll up the days which are not final yet and the queued corrections.
+
+    :param lookback_days: Final days recomputed again,
+     STATISTICS_ROLLUP_LOOKBACK_DAYS by default.
+    :param today: The current day in TIME_ZONE.
+    :param log: Callback receiving the progress messages.
+    :return: Number of the recomputed days.
+    """
+    if lookback_days is None:
+        lookback_days = settings.STATISTICS_ROLLUP_LOOKBACK_DAYS
+    today = today or timezone.localdate()
+    yesterday: date = today - timedelta(days=1)
+
+    state: RollupState = RollupState.objects.get_or_create(name=ROLLUP_NAME)[0]
+    if state.rolled_up_to is None:
+        first: date = min(_first_day() or today, today)
+    else:
+        first = min(state.rolled_up_to + timedelta(days=1 - lookback_days), today)
+
+    recomputed: int = 0
+    corrections: List[date] = list(
+        DailyStatsCorrection.objects.filter(day__lt=first).values_list("day", flat=True)
+    )
+    for start, end in day_ranges(corrections):
+        with transaction.atomic():
+            _locked_state()
+            rows: int = recompute_days(start, end)
+        recomputed += (end - start).days + 1
+        log(f"Corrected {start} - {end}: {rows} rows")
+
+    for start, end in day_ranges(
+        first + timedelta(days=offset) for offset in range((today - first).days + 1)
+    ):
+        with transaction.atomic():
+            state = _locked_state()
+            rows = recompute_days(start, end)
+            final: date = min(end, yesterday)
+            if state.rolled_up_to is None or state.rolled_up_to < final:
+                state.rolled_up_to = final
+            state.save()
+        recomputed += (end - start).days + 1
+        log(f"Rolled up {start} - {end}: {rows} rows")
+    return recomputed
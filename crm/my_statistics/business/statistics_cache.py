@@ -0,0 +1,40 @@
+import time
+from typing import Iterable, List, Type
+
+from django.core.cache import cache
+from django.db.models import Model
+
+
+def _version_key(model: Type[Model]) -> str:
+    return f"statistics:version:{model._meta.label_lower}"
+
+
+def get_table_versions(models: Iterable[Type[Model]]) -> List[int]:
+    """
+    Get the current versions of the tables of the models.
+
+    A missing version (never set or evicted) is initialized with the current
+    time, so it never repeats a version that older cache entries were built on.
+    """
+    keys: List[str] = [_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_table_version(model: Type[Model]) -> None:
+    """Invalidate the cache entries built on the table of the model."""
+    key: str = _version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def versioned_key(prefix: str, models: Iterable[Type[Model]]) -> str:
+    """Build a cache key that changes whenever one of the tables changes."""
+    versions: List[int] = get_table_versions(models)
+    return ":".join([prefix, *(str(version) for version in versions)])
@@ -1,12 +1,46 @@
-from typing import List
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple, Type
 
 from advertising.models import Advertising
 from clients.models import Customer, Lead
 from contracts.models import Contract
-from django.db.models import Subquery, Sum
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import (
+    Count,
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    Model,
+    Q,
+    QuerySet,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from services.models import Service
 
-from .statistics_models import AdsStatistics, TotalStatistics
+from ..models import AdsStatisticsView, CampaignStats, DailyCampaignStats, RollupState
+from .statistics_cache import versioned_key
+from .statistics_models import AdsStatistics, CampaignStatsDrift, TotalStatistics
+
+# The counters of the rollup, in the order of CampaignStatsDrift values
+CAMPAIGN_STATS_FIELDS: List[str] = ["leads_count", "customers_count", "income"]
+
+# RollupState of the materialized view of the advertising statistics
+ADS_STATISTICS_VIEW = "ads_statistics_view"
+
+# The tables counted by total_statistics
+TOTAL_STATISTICS_MODELS: Tuple[Type[Model], ...] = (
+    Service,
+    Advertising,
+    Lead,
+    Customer,
+)
 
 
 def count_ads_lead(ads: Advertising) -> int:
@@ -37,25 +71,351 @@ def count_ads_profit(ads: Advertising) -> float:
     return round(income - expenses, 2)
 
 
+def annotate_ads_statistics() -> QuerySet[Advertising]:
+    """
+    Compute the funnel of every campaign from the source tables.
+
+    Every lead has at most one customer and every customer has exactly one
+    contract, so the joins Advertising -> Lead -> Customer -> Contract
+    produce one row per lead and the aggregates do not count anything twice.
+    It scans all the leads, so it is only used to rebuild and check
+    CampaignStats. The counters get the actual_ prefix, Advertising exposes
+    the rollup values under the plain names.
+    """
+    money = DecimalField(max_digits=12, decimal_places=2)
+    return (
+        Advertising.objects.annotate(
+            actual_leads_count=Count("lead"),
+            actual_customers_count=Count("lead__customer"),
+            actual_income=Coalesce(
+                Sum("lead__customer__contract__cost"),
+                Value(Decimal(0)),
+                output_field=money,
+            ),
+        )
+        .annotate(
+            profit=ExpressionWrapper(
+                F("actual_income") - F("budget"), output_field=money
+            )
+        )
+        .order_by("pk")
+    )
+
+
+def rebuild_campaign_stats(batch_size: int = 1000) -> int:
+    """
+    Recompute the CampaignStats rollup from scratch.
+
+    :return: Number of the rollup rows.
+    """
+    stats: List[CampaignStats] = _actual_campaign_stats(annotate_ads_statistics())
+    with transaction.atomic():
+        _save_campaign_stats(stats, batch_size)
+    return len(stats)
+
+
+def _actual_campaign_stats(ads_qs: QuerySet[Advertising]) -> List[CampaignStats]:
+    return [
+        CampaignStats(
+            advertising_id=ads["pk"],
+            leads_count=ads["actual_leads_count"],
+            customers_count=ads["actual_customers_count"],
+            income=ads["actual_income"],
+        )
+        for ads in ads_qs.values(
+            "pk", "actual_leads_count", "actual_customers_count", "actual_income"
+        )
+    ]
+
+
+def _save_campaign_stats(stats: List[CampaignStats], batch_size: int = 1000) -> None:
+    CampaignStats.objects.bulk_create(
+        stats,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=["advertising"],
+        update_fields=CAMPAIGN_STATS_FIELDS,
+    )
+
+
+def find_campaign_stats_drift() -> List[CampaignStatsDrift]:
+    """
+    Compare the CampaignStats rollup with the source tables.
+
+    :return: The campaigns whose rollup row differs or is missing.
+    """
+    rollup: Dict[int, Tuple] = {
+        row[0]: row[1:]
+        for row in CampaignStats.objects.values_list("pk", *CAMPAIGN_STATS_FIELDS)
+    }
+    drift: List[CampaignStatsDrift] = []
+    for actual in _actual_campaign_stats(annotate_ads_statistics()):
+        expected: Tuple = tuple(getattr(actual, f) for f in CAMPAIGN_STATS_FIELDS)
+        stored: Optional[Tuple] = rollup.get(actual.advertising_id)
+        if stored != expected:
+            drift.append(CampaignStatsDrift(actual.advertising_id, stored, expected))
+    return drift
+
+
+def fix_campaign_stats_drift(drift: List[CampaignStatsDrift]) -> int:
+    """
+    Recompute the rollup rows of the drifted campaigns in bulk.
+
+    The existing rows are locked first and recomputed afterwards,
+    so a concurrent F() update either is already counted or waits
+    and is applied on top of the fixed values.
+
+    :return: Number of the fixed campaigns.
+    """
+    ads_ids: List[int] = [item.advertising_id for item in drift]
+    if not ads_ids:
+        return 0
+    with transaction.atomic():
+        list(
+            CampaignStats.objects.select_for_update()
+            .filter(pk__in=ads_ids)
+            .values_list("pk", flat=True)
+        )
+        stats: List[CampaignStats] = _actual_campaign_stats(
+            annotate_ads_statistics().filter(pk__in=ads_ids)
+        )
+        _save_campaign_stats(stats)
+    return len(stats)
+
+
 def ads_statistics() -> List[AdsStatistics]:
-    """Get statistics on advertising."""
-    ads_list: List[Advertising] = Advertising.objects.all()
+    """Get statistics on advertising from the CampaignStats rollup."""
+    money = DecimalField(max_digits=12, decimal_places=2)
+    ads_qs = (
+        Advertising.objects.annotate(
+            profit=ExpressionWrapper(
+                Coalesce(F("stats__income"), Value(Decimal(0)), output_field=money)
+                - F("budget"),
+                output_field=money,
+            )
+        )
+        .values("name", "stats__leads_count", "stats__customers_count", "profit")
+        .order_by("pk")
+    )
+    return [
+        AdsStatistics(
+            name=ads["name"],
+            leads_count=ads["stats__leads_count"] or 0,
+            customers_count=ads["stats__customers_count"] or 0,
+            profit=round(float(ads["profit"]), 2),
+        )
+        for ads in ads_qs
+    ]
+
 
+def ads_statistics_from_view() -> Tuple[List[AdsStatistics], Optional[datetime]]:
+    """
+    Get statistics on advertising from the materialized view.
+
+    The refresh does not block the readers, they see the previous state
+    of the view until it commits.
+
+    :return: The statistics and the time of the data in the view,
+     None if the view is empty.
+    """
+    # The time of the refresh comes with the rows, in the same query
+    rows = (
+        AdsStatisticsView.objects.annotate(
+            refreshed_at=Subquery(
+                RollupState.objects.filter(name=ADS_STATISTICS_VIEW).values(
+                    "updated_at"
+                )[:1]
+            )
+        )
+        .values("name", "leads_count", "customers_count", "profit", "refreshed_at")
+        .order_by("pk")
+    )
+    statistics: List[AdsStatistics] = []
+    refreshed_at: Optional[datetime] = None
+    for ads in rows:
+        statistics.append(
+            AdsStatistics(
+                name=ads["name"],
+                leads_count=ads["leads_count"],
+                customers_count=ads["customers_count"],
+                profit=round(float(ads["profit"]), 2),
+            )
+        )
+        refreshed_at = ads["refreshed_at"]
+    return statistics, refreshed_at
+
+
+def refresh_ads_statistics_view() -> None:
+    """
+    Recompute the materialized view of the advertising statistics.
+
+    REFRESH ... CONCURRENTLY builds the new contents aside and applies
+    the difference, the view stays readable all the time. Concurrent
+    refreshes wait for each other.
+    """
+    table: str = AdsStatisticsView._meta.db_table
+    # The view shows the data as of the start of the refresh
+    started: datetime = timezone.now()
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {table}")
+        # update() bypasses auto_now, which would store the end of the refresh
+        RollupState.objects.get_or_create(name=ADS_STATISTICS_VIEW)
+        RollupState.objects.filter(name=ADS_STATISTICS_VIEW).update(updated_at=started)
+
+
+def _period_filter(first: Optional[date], last: Optional[date], prefix: str = "") -> Q:
+    condition = Q()
+    if first is not None:
+        condition &= Q(**{f"{prefix}day__gte": first})
+    if last is not None:
+        condition &= Q(**{f"{prefix}day__lte": last})
+    return condition
+
+
+def ads_statistics_for_period(
+    first: Optional[date] = None, last: Optional[date] = None
+) -> List[AdsStatistics]:
+    """
+    Get statistics on advertising for the days from first to last.
+
+    The numbers come from the DailyCampaignStats rollup, so the days
+    after the last run of rollup_stats are not counted. The profit is
+    the income of the period less the whole budget.
+    """
+    money = DecimalField(max_digits=12, decimal_places=2)
+    period: Q = _period_filter(first, last, "daily_stats__")
+    ads_qs = (
+        Advertising.objects.annotate(
+            leads_count=Coalesce(Sum("daily_stats__leads_count", filter=period), 0),
+            customers_count=Coalesce(
+                Sum("daily_stats__customers_count", filter=period), 0
+            ),
+            profit=ExpressionWrapper(
+                Coalesce(
+                    Sum("daily_stats__income", filter=period),
+                    Value(Decimal(0)),
+                    output_field=money,
+                )
+                - F("budget"),
+                output_field=money,
+            ),
+        )
+        .values("name", "leads_count", "customers_count", "profit")
+        .order_by("pk")
+    )
     return [
         AdsStatistics(
-            name=ads.name,
-            leads_count=count_ads_lead(ads),
-            customers_count=count_ads_customers(ads),
-            profit=count_ads_profit(ads),
+            name=ads["name"],
+            leads_count=ads["leads_count"],
+            customers_count=ads["customers_count"],
+            profit=round(float(ads["profit"]), 2),
         )
-        for ads in ads_list
+        for ads in ads_qs
     ]
 
 
-def total_statistics() -> TotalStatistics:
+def total_statistics_for_period(
+    first: Optional[date] = None, last: Optional[date] = None
+) -> TotalStatistics:
+    """
+    Get total statistics with the leads and the customers of the days
+    from first to last, counted in the DailyCampaignStats rollup.
+    """
+    funnel: Dict[str, int] = DailyCampaignStats.objects.filter(
+        _period_filter(first, last)
+    ).aggregate(
+        leads=Coalesce(Sum("leads_count"), 0),
+        customers=Coalesce(Sum("customers_count"), 0),
+    )
     return TotalStatistics(
         products_count=Service.objects.count(),
         advertisements_count=Advertising.objects.count(),
-        leads_count=Lead.objects.count(),
-        customers_count=Customer.objects.count(),
+        leads_count=funnel["leads"],
+        customers_count=funnel["customers"],
+    )
+
+
+def estimate_row_counts(models: Tuple[Type[Model], ...]) -> Dict[Type[Model], int]:
+    """
+    Estimate the number of rows in the tables of the models.
+
+    The estimate is pg_class.reltuples maintained by VACUUM and ANALYZE,
+    so it costs one catalog lookup instead of a sequential scan.
+    Unknown tables get -1, as do never analyzed ones on PostgreSQL 14+.
+    """
+    tables: List[str] = [model._meta.db_table for model in models]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT t.name, COALESCE(c.reltuples, -1)"
+            " FROM unnest(%s::text[]) AS t(name)"
+            " LEFT JOIN pg_class c ON c.oid = to_regclass(t.name)",
+            [tables],
+        )
+        estimates: Dict[str, float] = dict(cursor.fetchall())
+
+    return {model: int(estimates[model._meta.db_table]) for model in models}
+
+
+def count_total_statistics(approximate: Optional[bool] = None) -> TotalStatistics:
+    """
+    Count total statistics.
+
+    Leads and customers are summed over the CampaignStats rollup;
+    only the leads without a campaign are counted in the source tables.
+
+    :param approximate: Use the planner estimate for the tables with at least
+     STATISTICS_APPROXIMATE_MIN_ROWS rows (STATISTICS_APPROXIMATE_COUNTS
+     by default).
+    """
+    if approximate is None:
+        approximate = settings.STATISTICS_APPROXIMATE_COUNTS
+
+    counts: Dict[Type[Model], int] = dict()
+    if approximate:
+        counts = {
+            model: estimate
+            for model, estimate in estimate_row_counts(TOTAL_STATISTICS_MODELS).items()
+            if estimate >= settings.STATISTICS_APPROXIMATE_MIN_ROWS
+        }
+
+    if Service not in counts:
+        counts[Service] = Service.objects.count()
+    if Advertising not in counts:
+        counts[Advertising] = Advertising.objects.count()
+    if Lead not in counts or Customer not in counts:
+        funnel: Dict[str, int] = CampaignStats.objects.aggregate(
+            leads=Coalesce(Sum("leads_count"), 0),
+            customers=Coalesce(Sum("customers_count"), 0),
+        )
+        if Lead not in counts:
+            counts[Lead] = (
+                funnel["leads"] + Lead.objects.filter(ads__isnull=True).count()
+            )
+        if Customer not in counts:
+            counts[Customer] = (
+                funnel["customers"]
+                + Customer.objects.filter(lead__ads__isnull=True).count()
+            )
+
+    return TotalStatistics(
+        products_count=counts[Service],
+        advertisements_count=counts[Advertising],
+        leads_count=counts[Lead],
+        customers_count=counts[Customer],
     )
+
+
+def total_statistics() -> TotalStatistics:
+    """
+    Get total statistics.
+
+    The result is cached until one of the counted tables changes
+    (see my_statistics.signals) or STATISTICS_CACHE_TIMEOUT expires.
+    """
+    key: str = versioned_key("statistics:total", TOTAL_STATISTICS_MODELS)
+    statistics: Optional[TotalStatistics] = cache.get(key)
+    if statistics is None:
+        statistics = count_total_statistics()
+        cache.set(key, statistics, settings.STATISTICS_CACHE_TIMEOUT)
+    return statistics
@@ -1,5 +1,6 @@
 from dataclasses import dataclass
-from typing import Dict
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
 
 
 @dataclass
@@ -10,6 +11,20 @@ class AdsStatistics:
     profit: float
 
 
+@dataclass
+class CampaignStatsDrift:
+    """
+    A campaign whose CampaignStats row differs from the source tables.
+
+    The values are (leads_count, customers_count, income), stored is None
+    if the rollup row is missing.
+    """
+
+    advertising_id: int
+    stored: Optional[Tuple[int, int, Decimal]]
+    actual: Tuple[int, int, Decimal]
+
+
 @dataclass
 class TotalStatistics:
     products_count: int
@@ -10,7 +10,12 @@ from contracts.models import Contract
 from django.db import IntegrityError
 from django.test import TestCase
 
-from .statistics_logic import count_ads_customers, count_ads_lead, count_ads_profit
+from .statistics_logic import (
+    ads_statistics,
+    count_ads_customers,
+    count_ads_lead,
+    count_ads_profit,
+)
 
 
 def _create_ads() -> List[Advertising]:
@@ -146,3 +151,44 @@ class CountAdsProfitTest(TestCase):
                 round(count_ads_profit(ads), 2),
                 round(ads_profit.get(ads, -ads.budget), 2),
             )
+
+
+class AdsStatisticsTest(TestCase):
+    """Test case for ads_statistics."""
+
+    def setUp(self):
+        self.ads_list = _create_ads()
+        self.leads = _create_leads(self.ads_list)
+        for lead in self.leads[::2]:
+            contract = ContractFactory.build()
+            contract.product = lead.ads.product
+            contract.save()
+            Customer.objects.create(lead=lead, contract=contract)
+
+    def tearDown(self):
+        for ads in self.ads_list:
+            ads.product.delete()
+        for lead in self.leads:
+            lead.delete()
+
+    def test_ads_statistics(self):
+        """Test that the grouped query agrees with the per-campaign helpers."""
+        statistics = ads_statistics()
+
+        self.assertEqual(len(statistics), len(self.ads_list))
+        for ads, ads_stat in zip(sorted(self.ads_list, key=lambda a: a.pk), statistics):
+            self.assertEqual(ads_stat.name, ads.name)
+            self.assertEqual(ads_stat.leads_count, count_ads_lead(ads))
+            self.assertEqual(ads_stat.customers_count, count_ads_customers(ads))
+            self.assertEqual(ads_stat.profit, count_ads_profit(ads))
+
+    def test_number_of_queries_does_not_depend_on_ads_count(self):
+        """Test that ads_statistics issues one query for any number of ads."""
+        with self.assertNumQueries(1):
+            ads_statistics()
+
+        more_ads = _create_ads()
+        _create_leads(more_ads)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(len(ads_statistics()), len(self.ads_list) + len(more_ads))
@@ -0,0 +1,34 @@
+from datetime import date
+from typing import Optional, Tuple
+
+from django import forms
+
+
+class StatisticsPeriodForm(forms.Form):
+    """
+    Period of the statistics, both days included.
+
+    Invalid days are ignored, without valid ones the statistics
+    are for all the time.
+    """
+
+    date_from = forms.DateField(
+        required=False, widget=forms.DateInput(attrs={"type": "date"})
+    )
+    date_to = forms.DateField(
+        required=False, widget=forms.DateInput(attrs={"type": "date"})
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in self.fields.values():
+            field.widget.attrs.setdefault("class", "form-control")
+
+    def period(self) -> Optional[Tuple[Optional[date], Optional[date]]]:
+        """The first and the last day or None if the period is not set."""
+        self.is_valid()
+        first: Optional[date] = self.cleaned_data.get("date_from")
+        last: Optional[date] = self.cleaned_data.get("date_to")
+        if first is None and last is None:
+            return None
+        return first, last
@@ -0,0 +1,98 @@
+import logging
+
+from clients.models import Lead
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from my_statistics.business.benchmark import (
+    SCALES,
+    find_regressions,
+    load_report,
+    run_benchmarks,
+    save_report,
+    scale_config,
+    to_report,
+)
+from my_statistics.business.data_generator import generate
+
+# The benchmark must not share the cache with the running site
+BENCHMARK_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "benchmark",
+    }
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the hot views and the statistics functions on a generated"
+        " data set in a separate database and compare with a baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", choices=list(SCALES), default="1k")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--runs", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument(
+            "--output", help="JSON file of the results (benchmark-<scale>.json)"
+        )
+        parser.add_argument("--baseline", help="JSON file of an earlier run")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.2,
+            help="Allowed relative growth over the baseline, 0.2 means 20%%",
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Keep the benchmark database with its data for the next runs",
+        )
+
+    def handle(self, *args, **kwargs):
+        scale: str = kwargs["scale"]
+        output: str = kwargs["output"] or f"benchmark-{scale}.json"
+        baseline = load_report(kwargs["baseline"]) if kwargs["baseline"] else None
+
+        logging.getLogger("crm.instrumentation").setLevel(logging.WARNING)
+        setup_test_environment()
+        test_settings = connection.settings_dict.setdefault("TEST", {})
+        test_settings["NAME"] = f"{connection.settings_dict['NAME']}_benchmark_{scale}"
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False, keepdb=kwargs["keepdb"]
+        )
+        try:
+            with override_settings(CACHES=BENCHMARK_CACHES):
+                if Lead.objects.count() < SCALES[scale]:
+                    self.stdout.write(f"Generating the {scale} data set...")
+                    generate(scale_config(scale, kwargs["seed"]), self.stdout.write)
+                    with connection.cursor() as cursor:
+                        cursor.execute("ANALYZE")
+                self.stdout.write("Running the benchmarks...")
+                results = run_benchmarks(runs=kwargs["runs"], warmup=kwargs["warmup"])
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=kwargs["keepdb"]
+            )
+            teardown_test_environment()
+
+        report = to_report(scale, results)
+        save_report(output, report)
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name}: p50 {result.p50_ms} ms, p95 {result.p95_ms} ms,"
+                f" {result.queries} queries, {result.peak_memory_kb} KiB"
+            )
+        self.stdout.write(f"Saved to {output}")
+
+        if baseline is not None:
+            regressions = find_regressions(baseline, report, kwargs["threshold"])
+            if regressions:
+                raise CommandError("Regressions:\n" + "\n".join(regressions))
+            self.stdout.write("No regressions")
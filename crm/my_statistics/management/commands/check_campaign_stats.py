@@ -0,0 +1,38 @@
+from typing import List
+
+from django.core.management import BaseCommand, CommandError
+from my_statistics.business.statistics_logic import (
+    find_campaign_stats_drift,
+    fix_campaign_stats_drift,
+)
+from my_statistics.business.statistics_models import CampaignStatsDrift
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the advertising campaign statistics rollup with the source"
+        " tables and report, or with --fix repair, the drifted campaigns."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Recompute the rollup rows of the drifted campaigns",
+        )
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write("Checking campaign statistics...")
+        drift: List[CampaignStatsDrift] = find_campaign_stats_drift()
+        for item in drift:
+            self.stdout.write(
+                f"Advertising {item.advertising_id}: stored {item.stored},"
+                f" actual {item.actual}"
+            )
+        if not drift:
+            self.stdout.write("No drift")
+        elif kwargs["fix"]:
+            fixed: int = fix_campaign_stats_drift(drift)
+            self.stdout.write(f"Fixed {fixed} campaigns")
+        else:
+            raise CommandError(f"{len(drift)} campaigns have drifted")
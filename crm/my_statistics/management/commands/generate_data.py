@@ -0,0 +1,56 @@
+from django.core.management import BaseCommand, CommandError
+from my_statistics.business.data_generator import GeneratorConfig, generate
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic data set of the given size"
+        " (services, ads, leads, customers, contracts)."
+    )
+
+    def add_arguments(self, parser):
+        defaults = GeneratorConfig()
+        parser.add_argument("--seed", type=int, default=defaults.seed)
+        for name in ("services", "ads", "leads", "customers", "contracts"):
+            parser.add_argument(
+                f"--{name}",
+                type=int,
+                default=getattr(defaults, name),
+                help=f"Number of {name} to create",
+            )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=defaults.chunk_size,
+            help="Number of rows inserted at once",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=defaults.workers,
+            help="Number of processes generating the rows",
+        )
+        parser.add_argument(
+            "--no-copy",
+            action="store_true",
+            help="Insert with bulk_create instead of COPY",
+        )
+
+    def handle(self, *args, **kwargs):
+        config = GeneratorConfig(
+            seed=kwargs["seed"],
+            services=kwargs["services"],
+            ads=kwargs["ads"],
+            leads=kwargs["leads"],
+            customers=kwargs["customers"],
+            contracts=kwargs["contracts"],
+            chunk_size=kwargs["chunk_size"],
+            workers=kwargs["workers"],
+            use_copy=not kwargs["no_copy"],
+        )
+        self.stdout.write(f"Generating data with seed {config.seed}...")
+        try:
+            generate(config, log=self.stdout.write)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write("Done")
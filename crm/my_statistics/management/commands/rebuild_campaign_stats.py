@@ -0,0 +1,11 @@
+from django.core.management import BaseCommand
+from my_statistics.business.statistics_logic import rebuild_campaign_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the advertising campaign statistics rollup from scratch."
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write("Rebuilding campaign statistics...")
+        count: int = rebuild_campaign_stats()
+        self.stdout.write(f"Done: {count} campaigns")
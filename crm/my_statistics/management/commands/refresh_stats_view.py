@@ -0,0 +1,27 @@
+import time
+
+from django.core.management import BaseCommand
+from my_statistics.business.statistics_logic import refresh_ads_statistics_view
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresh the materialized view of the advertising statistics"
+        " without blocking its readers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Keep running and refresh every INTERVAL seconds",
+        )
+
+    def handle(self, *args, **kwargs):
+        while True:
+            refresh_ads_statistics_view()
+            self.stdout.write("Refreshed the advertising statistics view")
+            if not kwargs["interval"]:
+                return
+            time.sleep(kwargs["interval"])
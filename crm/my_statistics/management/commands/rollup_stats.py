@@ -0,0 +1,32 @@
+import time
+
+from django.core.management import BaseCommand
+from my_statistics.business.rollup import rollup_daily_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Roll up the daily advertising campaign statistics of the days which"
+        " are not final yet and of the days with late changes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lookback",
+            type=int,
+            help="Final days recomputed again (STATISTICS_ROLLUP_LOOKBACK_DAYS)",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Keep running and roll up every INTERVAL seconds",
+        )
+
+    def handle(self, *args, **kwargs):
+        while True:
+            days: int = rollup_daily_stats(kwargs["lookback"], log=self.stdout.write)
+            self.stdout.write(f"Rolled up {days} days")
+            if not kwargs["interval"]:
+                return
+            time.sleep(kwargs["interval"])
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.3 on 2026-10-18 02:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('advertising', '0002_alter_advertising_budget_alter_advertising_channel_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CampaignStats',
+            fields=[
+                ('advertising', models.OneToOneField(help_text='the advertising campaign', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='advertising.advertising')),
+                ('leads_count', models.IntegerField(default=0, help_text='number of leads from the campaign')),
+                ('customers_count', models.IntegerField(default=0, help_text='number of leads from the campaign who became customers')),
+                ('income', models.DecimalField(decimal_places=2, default=0, help_text='total cost of the contracts of the campaign customers', max_digits=12)),
+            ],
+        ),
+    ]
@@ -0,0 +1,45 @@
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, DecimalField, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_campaign_stats(apps, schema_editor):
+    Advertising = apps.get_model("advertising", "Advertising")
+    CampaignStats = apps.get_model("my_statistics", "CampaignStats")
+
+    ads_qs = Advertising.objects.annotate(
+        leads_count=Count("lead"),
+        customers_count=Count("lead__customer"),
+        income=Coalesce(
+            Sum("lead__customer__contract__cost"),
+            Value(Decimal(0)),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+    ).values("pk", "leads_count", "customers_count", "income")
+    CampaignStats.objects.bulk_create(
+        [
+            CampaignStats(
+                advertising_id=ads["pk"],
+                leads_count=ads["leads_count"],
+                customers_count=ads["customers_count"],
+                income=ads["income"],
+            )
+            for ads in ads_qs
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("my_statistics", "0001_initial"),
+        ("clients", "0007_alter_lead_phone"),
+        ("contracts", "0003_alter_contract_end_date"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_campaign_stats, migrations.RunPython.noop),
+    ]
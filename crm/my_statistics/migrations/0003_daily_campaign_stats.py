@@ -0,0 +1,44 @@
+# Generated by Django 5.1.3 on 2026-10-18 03:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advertising', '0002_alter_advertising_budget_alter_advertising_channel_and_more'),
+        ('my_statistics', '0002_fill_campaignstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStatsCorrection',
+            fields=[
+                ('day', models.DateField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupState',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('rolled_up_to', models.DateField(null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyCampaignStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(help_text='the day in TIME_ZONE')),
+                ('leads_count', models.IntegerField(default=0, help_text='number of new leads')),
+                ('customers_count', models.IntegerField(default=0, help_text='number of leads who became customers')),
+                ('income', models.DecimalField(decimal_places=2, default=0, help_text='total cost of the contracts of the new customers', max_digits=12)),
+                ('advertising', models.ForeignKey(help_text='the advertising campaign', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='advertising.advertising')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'advertising'], name='daily_stats_day_ads_idx')],
+            },
+        ),
+    ]
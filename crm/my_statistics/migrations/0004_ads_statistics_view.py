@@ -0,0 +1,62 @@
+# Generated by Django 5.1.3 on 2026-10-18 04:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Every lead has at most one customer and every customer exactly one
+# contract, so the joins produce one row per lead
+CREATE_VIEW = """
+CREATE MATERIALIZED VIEW my_statistics_ads_statistics AS
+SELECT
+    ads.id AS advertising_id,
+    ads.name,
+    COUNT(lead.id) AS leads_count,
+    COUNT(customer.id) AS customers_count,
+    COALESCE(SUM(contract.cost), 0) - ads.budget AS profit
+FROM advertising_advertising ads
+LEFT JOIN clients_lead lead ON lead.ads_id = ads.id
+LEFT JOIN clients_customer customer ON customer.lead_id = lead.id
+LEFT JOIN contracts_contract contract ON contract.id = customer.contract_id
+GROUP BY ads.id;
+
+-- REFRESH ... CONCURRENTLY requires a unique index
+CREATE UNIQUE INDEX my_statistics_ads_statistics_pk
+    ON my_statistics_ads_statistics (advertising_id);
+
+INSERT INTO my_statistics_rollupstate (name, rolled_up_to, updated_at)
+VALUES ('ads_statistics_view', NULL, now())
+ON CONFLICT (name) DO UPDATE SET updated_at = EXCLUDED.updated_at;
+"""
+
+DROP_VIEW = """
+DROP MATERIALIZED VIEW my_statistics_ads_statistics;
+DELETE FROM my_statistics_rollupstate WHERE name = 'ads_statistics_view';
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advertising', '0002_alter_advertising_budget_alter_advertising_channel_and_more'),
+        ('clients', '0011_created_at'),
+        ('contracts', '0009_list_indexes'),
+        ('my_statistics', '0003_daily_campaign_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdsStatisticsView',
+            fields=[
+                ('advertising', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='+', serialize=False, to='advertising.advertising')),
+                ('name', models.CharField(max_length=100)),
+                ('leads_count', models.BigIntegerField()),
+                ('customers_count', models.BigIntegerField()),
+                ('profit', models.DecimalField(decimal_places=2, max_digits=12)),
+            ],
+            options={
+                'db_table': 'my_statistics_ads_statistics',
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL(CREATE_VIEW, DROP_VIEW),
+    ]
@@ -0,0 +1,121 @@
+from advertising.models import Advertising
+from django.db import models
+
+
+class CampaignStats(models.Model):
+    """
+    Rollup of the advertising campaign funnel, one row per campaign.
+
+    The counters are maintained incrementally by the handlers
+    in my_statistics.signals and can be recomputed from scratch
+    with the rebuild_campaign_stats command.
+    """
+
+    advertising = models.OneToOneField(
+        Advertising,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+        help_text="the advertising campaign",
+    )
+    leads_count = models.IntegerField(
+        null=False, default=0, help_text="number of leads from the campaign"
+    )
+    customers_count = models.IntegerField(
+        null=False,
+        default=0,
+        help_text="number of leads from the campaign who became customers",
+    )
+    income = models.DecimalField(
+        null=False,
+        default=0,
+        max_digits=12,
+        decimal_places=2,
+        help_text="total cost of the contracts of the campaign customers",
+    )
+
+    def __str__(self) -> str:
+        return f"Statistics of advertising ({self.advertising_id})"
+
+
+class DailyCampaignStats(models.Model):
+    """
+    Daily rollup of the advertising campaign funnel.
+
+    One row per campaign and day with leads or customers, the leads
+    without a campaign are counted in the rows without one. Leads are
+    counted on the day they were created, customers and the cost of
+    their contracts on the day the lead became the customer. The rows
+    are written by the rollup_stats command (see my_statistics.business.rollup).
+    """
+
+    day = models.DateField(help_text="the day in TIME_ZONE")
+    advertising = models.ForeignKey(
+        Advertising,
+        null=True,
+        on_delete=models.CASCADE,
+        related_name="daily_stats",
+        help_text="the advertising campaign",
+    )
+    leads_count = models.IntegerField(
+        null=False, default=0, help_text="number of new leads"
+    )
+    customers_count = models.IntegerField(
+        null=False, default=0, help_text="number of leads who became customers"
+    )
+    income = models.DecimalField(
+        null=False,
+        default=0,
+        max_digits=12,
+        decimal_places=2,
+        help_text="total cost of the contracts of the new customers",
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["day", "advertising"], name="daily_stats_day_ads_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"Statistics of advertising ({self.advertising_id}) on {self.day}"
+
+
+class DailyStatsCorrection(models.Model):
+    """A day of DailyCampaignStats to recompute after a late change."""
+
+    day = models.DateField(primary_key=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class RollupState(models.Model):
+    """Progress of a rollup: the days up to rolled_up_to are final."""
+
+    name = models.CharField(max_length=50, primary_key=True)
+    rolled_up_to = models.DateField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class AdsStatisticsView(models.Model):
+    """
+    The materialized view my_statistics_ads_statistics, the funnel
+    of every campaign computed by the database.
+
+    The view is refreshed by the refresh_stats_view command, RollupState
+    "ads_statistics_view" tells when.
+    """
+
+    advertising = models.OneToOneField(
+        Advertising,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_constraint=False,
+        related_name="+",
+    )
+    name = models.CharField(max_length=100)
+    leads_count = models.BigIntegerField()
+    customers_count = models.BigIntegerField()
+    profit = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        managed = False
+        db_table = "my_statistics_ads_statistics"
@@ -0,0 +1,260 @@
+"""
+Signal handlers keeping the CampaignStats rollup up to date.
+
+A lead adds one to leads_count of its campaign; a customer adds one
+to customers_count and the cost of its contract to income of the campaign
+of its lead. Every change is applied with an atomic F() update,
+so concurrent requests do not overwrite each other.
+
+Deleting a contract or a lead cascades to the customer first,
+so the customer handlers also cover those deletions. Leads of a deleted
+campaign are detached with a bulk SET NULL and the rollup row is removed
+together with the campaign.
+
+Changes of the leads, customers and contract costs of past days queue
+those days for the next run of rollup_stats, which recomputes them
+in DailyCampaignStats.
+
+Saving or deleting any of the tables counted by total_statistics bumps
+the version of the table after the transaction commits, which invalidates
+the cached total statistics.
+"""
+
+from decimal import Decimal
+from typing import Optional, Tuple
+
+from advertising.models import Advertising
+from clients.models import Customer, Lead
+from contracts.models import Contract
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .business.rollup import queue_corrections, queue_days
+from .business.statistics_cache import bump_table_version
+from .business.statistics_logic import TOTAL_STATISTICS_MODELS
+from .models import CampaignStats, DailyCampaignStats
+
+# (advertising pk, contract cost) that a customer contributes to the rollup
+Contribution = Tuple[Optional[int], Decimal]
+
+
+def bump_campaign_stats(
+    ads_id: Optional[int],
+    *,
+    leads: int = 0,
+    customers: int = 0,
+    income: Decimal = Decimal(0),
+    create: bool = False,
+) -> None:
+    """
+    Atomically add the given deltas to the rollup of the campaign.
+
+    :param ads_id: Advertising pk (nothing happens if it is None).
+    :param create: Create the missing rollup row. It must be False on the
+     deletion paths, where the campaign itself may be in the middle of
+     a cascade delete.
+    """
+    if ads_id is None or not (leads or customers or income):
+        return
+
+    updated: int = CampaignStats.objects.filter(advertising_id=ads_id).update(
+        leads_count=F("leads_count") + leads,
+        customers_count=F("customers_count") + customers,
+        income=F("income") + income,
+    )
+    if not updated and create:
+        CampaignStats.objects.get_or_create(advertising_id=ads_id)
+        bump_campaign_stats(ads_id, leads=leads, customers=customers, income=income)
+
+
+def _customer_contribution(lead_id: int, contract_id: int) -> Contribution:
+    """Return the campaign and the contract cost of the customer."""
+    ads_id: Optional[int] = (
+        Lead.objects.filter(pk=lead_id).values_list("ads_id", flat=True).first()
+    )
+    cost: Optional[Decimal] = (
+        Contract.objects.filter(pk=contract_id).values_list("cost", flat=True).first()
+    )
+    return ads_id, Decimal(0) if cost is None else cost
+
+
+def _apply_contribution(contribution: Contribution, sign: int, create: bool) -> None:
+    ads_id, cost = contribution
+    bump_campaign_stats(ads_id, customers=sign, income=sign * cost, create=create)
+
+
+@receiver(post_save, sender=Advertising)
+def create_campaign_stats(sender, instance: Advertising, created: bool, raw, **kwargs):
+    if created and not raw:
+        CampaignStats.objects.get_or_create(advertising=instance)
+
+
+@receiver(pre_save, sender=Lead)
+def remember_lead_campaign(sender, instance: Lead, raw, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._stats_old_ads_id = (
+        Lead.objects.filter(pk=instance.pk).values_list("ads_id", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Lead)
+def update_stats_on_lead_save(sender, instance: Lead, created: bool, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        bump_campaign_stats(instance.ads_id, leads=1, create=True)
+        return
+
+    old_ads_id: Optional[int] = getattr(instance, "_stats_old_ads_id", None)
+    if old_ads_id == instance.ads_id:
+        return
+
+    bump_campaign_stats(old_ads_id, leads=-1)
+    bump_campaign_stats(instance.ads_id, leads=1, create=True)
+    # The customer made from the lead moves to the new campaign as well
+    cost: Optional[Decimal] = (
+        Customer.objects.filter(lead=instance)
+        .values_list("contract__cost", flat=True)
+        .first()
+    )
+    if cost is not None:
+        _apply_contribution((old_ads_id, cost), -1, create=False)
+        _apply_contribution((instance.ads_id, cost), 1, create=True)
+
+
+@receiver(post_delete, sender=Lead)
+def update_stats_on_lead_delete(sender, instance: Lead, **kwargs):
+    bump_campaign_stats(instance.ads_id, leads=-1)
+
+
+@receiver(pre_save, sender=Customer)
+def remember_customer_contribution(sender, instance: Customer, raw, **kwargs):
+    if raw or instance._state.adding:
+        return
+    old = Customer.objects.filter(pk=instance.pk).values("lead_id", "contract_id")
+    instance._stats_old_contribution = _customer_contribution(**old[0]) if old else None
+
+
+@receiver(post_save, sender=Customer)
+def update_stats_on_customer_save(
+    sender, instance: Customer, created: bool, raw, **kwargs
+):
+    if raw:
+        return
+    old: Optional[Contribution] = getattr(instance, "_stats_old_contribution", None)
+    new: Contribution = _customer_contribution(instance.lead_id, instance.contract_id)
+    if created or old != new:
+        if old is not None:
+            _apply_contribution(old, -1, create=False)
+        _apply_contribution(new, 1, create=True)
+
+
+@receiver(post_delete, sender=Customer)
+def update_stats_on_customer_delete(sender, instance: Customer, **kwargs):
+    # The lead and the contract are deleted after the customer (if at all),
+    # so they can still be read here
+    contribution = _customer_contribution(instance.lead_id, instance.contract_id)
+    _apply_contribution(contribution, -1, create=False)
+
+
+@receiver(pre_save, sender=Contract)
+def remember_contract_cost(sender, instance: Contract, raw, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._stats_old_cost = (
+        Contract.objects.filter(pk=instance.pk).values_list("cost", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Contract)
+def update_stats_on_contract_save(
+    sender, instance: Contract, created: bool, raw, **kwargs
+):
+    old_cost: Optional[Decimal] = getattr(instance, "_stats_old_cost", None)
+    if raw or created or old_cost is None:
+        return
+
+    delta: Decimal = Decimal(str(instance.cost)) - old_cost
+    if not delta:
+        return
+    ads_id: Optional[int] = (
+        Customer.objects.filter(contract=instance)
+        .values_list("lead__ads_id", flat=True)
+        .first()
+    )
+    bump_campaign_stats(ads_id, income=delta, create=True)
+
+
+@receiver(post_save, sender=Lead)
+def correct_daily_stats_on_lead_save(
+    sender, instance: Lead, created: bool, raw, **kwargs
+):
+    if raw:
+        return
+    if created:
+        # Only a backdated lead belongs to a past day
+        queue_corrections([instance.created_at])
+    elif getattr(instance, "_stats_old_ads_id", None) != instance.ads_id:
+        queue_corrections(
+            [
+                instance.created_at,
+                Customer.objects.filter(lead=instance)
+                .values_list("created_at", flat=True)
+                .first(),
+            ]
+        )
+
+
+@receiver(post_delete, sender=Lead)
+def correct_daily_stats_on_lead_delete(sender, instance: Lead, **kwargs):
+    queue_corrections([instance.created_at])
+
+
+@receiver(post_save, sender=Customer)
+def correct_daily_stats_on_customer_save(
+    sender, instance: Customer, created: bool, raw, **kwargs
+):
+    # A new customer belongs to a past day only if backdated, an updated
+    # one is rare enough to recompute its day without checking the change
+    if not raw:
+        queue_corrections([instance.created_at])
+
+
+@receiver(post_delete, sender=Customer)
+def correct_daily_stats_on_customer_delete(sender, instance: Customer, **kwargs):
+    queue_corrections([instance.created_at])
+
+
+@receiver(post_save, sender=Contract)
+def correct_daily_stats_on_contract_save(
+    sender, instance: Contract, created: bool, raw, **kwargs
+):
+    old_cost: Optional[Decimal] = getattr(instance, "_stats_old_cost", None)
+    if raw or created or old_cost is None or old_cost == Decimal(str(instance.cost)):
+        return
+    queue_corrections(
+        Customer.objects.filter(contract=instance).values_list("created_at", flat=True)
+    )
+
+
+@receiver(pre_delete, sender=Advertising)
+def correct_daily_stats_on_ads_delete(sender, instance: Advertising, **kwargs):
+    # The rows of the campaign are deleted, its leads move to the rows
+    # without a campaign
+    queue_days(
+        DailyCampaignStats.objects.filter(advertising=instance).values_list(
+            "day", flat=True
+        )
+    )
+
+
+def bump_statistics_version(sender, **kwargs):
+    transaction.on_commit(lambda: bump_table_version(sender))
+
+
+for model in TOTAL_STATISTICS_MODELS:
+    post_save.connect(bump_statistics_version, sender=model)
+    post_delete.connect(bump_statistics_version, sender=model)
@@ -0,0 +1,478 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from advertising.factories import AdvertisingFactory
+from clients.factories import LeadFactory
+from clients.models import Customer, Lead, validate_phone_format
+from contracts.factories import ContractFactory
+from contracts.models import Contract
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.validators import validate_email
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .business.benchmark import find_regressions, run_benchmarks
+from .business.rollup import ROLLUP_NAME, day_bounds, rollup_daily_stats
+from .business.statistics_logic import (
+    ADS_STATISTICS_VIEW,
+    TOTAL_STATISTICS_MODELS,
+    ads_statistics,
+    ads_statistics_for_period,
+    ads_statistics_from_view,
+    annotate_ads_statistics,
+    count_total_statistics,
+    estimate_row_counts,
+    find_campaign_stats_drift,
+    refresh_ads_statistics_view,
+    total_statistics,
+    total_statistics_for_period,
+)
+from .models import (
+    AdsStatisticsView,
+    CampaignStats,
+    DailyCampaignStats,
+    DailyStatsCorrection,
+    RollupState,
+)
+
+
+class CampaignStatsTest(TestCase):
+    """Test case for keeping CampaignStats up to date."""
+
+    def setUp(self):
+        self.ads = AdvertisingFactory.create()
+        self.other_ads = AdvertisingFactory.create()
+
+    def tearDown(self):
+        self.ads.product.delete()
+        self.other_ads.product.delete()
+
+    def _create_customer(self, lead, cost: str) -> Customer:
+        contract = ContractFactory.build()
+        contract.product = lead.ads.product
+        contract.cost = Decimal(cost)
+        contract.save()
+        return Customer.objects.create(lead=lead, contract=contract)
+
+    def assertStats(self, ads, leads_count: int, customers_count: int, income: str):
+        stats = CampaignStats.objects.get(advertising=ads)
+        self.assertEqual(stats.leads_count, leads_count)
+        self.assertEqual(stats.customers_count, customers_count)
+        self.assertEqual(stats.income, Decimal(income))
+
+    def test_new_ads_has_empty_stats(self):
+        """Test that a new campaign gets an empty rollup row."""
+        self.assertStats(self.ads, 0, 0, "0")
+
+    def test_lead_and_customer_are_counted(self):
+        """Test creating and deleting leads and customers."""
+        lead = LeadFactory.create(ads=self.ads)
+        LeadFactory.create(ads=self.ads)
+        self.assertStats(self.ads, 2, 0, "0")
+
+        customer = self._create_customer(lead, "10.50")
+        self.assertStats(self.ads, 2, 1, "10.50")
+
+        customer.contract.delete()  # the customer is deleted in a cascade
+        self.assertStats(self.ads, 2, 0, "0")
+
+        lead.delete()
+        self.assertStats(self.ads, 1, 0, "0")
+
+    def test_moving_lead_to_other_ads(self):
+        """Test that the lead and its customer move to the new campaign."""
+        lead = LeadFactory.create(ads=self.ads)
+        self._create_customer(lead, "20.00")
+
+        lead.ads = self.other_ads
+        lead.save()
+
+        self.assertStats(self.ads, 0, 0, "0")
+        self.assertStats(self.other_ads, 1, 1, "20.00")
+
+    def test_changing_contract_cost(self):
+        """Test that income follows the cost of the contract."""
+        lead = LeadFactory.create(ads=self.ads)
+        customer = self._create_customer(lead, "20.00")
+
+        contract = customer.contract
+        contract.cost = Decimal("35.25")
+        contract.save()
+
+        self.assertStats(self.ads, 1, 1, "35.25")
+
+    def test_rebuild_campaign_stats(self):
+        """Test that the rebuild command repairs a drifted rollup."""
+        lead = LeadFactory.create(ads=self.ads)
+        self._create_customer(lead, "12.00")
+        CampaignStats.objects.update(leads_count=100, customers_count=0, income=0)
+
+        call_command("rebuild_campaign_stats", stdout=StringIO())
+
+        for ads in annotate_ads_statistics():
+            self.assertStats(
+                ads,
+                ads.actual_leads_count,
+                ads.actual_customers_count,
+                str(ads.actual_income),
+            )
+        self.assertStats(self.ads, 1, 1, "12.00")
+
+    def test_check_campaign_stats(self):
+        """Test that the check reports the drift and --fix repairs only it."""
+        lead = LeadFactory.create(ads=self.ads)
+        self._create_customer(lead, "7.00")
+        call_command("check_campaign_stats", stdout=StringIO())
+
+        CampaignStats.objects.filter(advertising=self.ads).update(leads_count=5)
+        CampaignStats.objects.filter(advertising=self.other_ads).delete()
+        drift = {item.advertising_id: item for item in find_campaign_stats_drift()}
+        self.assertEqual(set(drift), {self.ads.pk, self.other_ads.pk})
+        self.assertEqual(drift[self.ads.pk].stored, (5, 1, Decimal("7.00")))
+        self.assertEqual(drift[self.ads.pk].actual, (1, 1, Decimal("7.00")))
+        self.assertIsNone(drift[self.other_ads.pk].stored)
+
+        with self.assertRaises(CommandError):
+            call_command("check_campaign_stats", stdout=StringIO())
+        call_command("check_campaign_stats", "--fix", stdout=StringIO())
+
+        self.assertEqual(find_campaign_stats_drift(), [])
+        self.assertStats(self.ads, 1, 1, "7.00")
+        self.assertStats(self.other_ads, 0, 0, "0")
+
+
+class TotalStatisticsCacheTest(TestCase):
+    """Test case for caching total_statistics."""
+
+    def setUp(self):
+        cache.clear()
+        self.ads = AdvertisingFactory.create()
+
+    def tearDown(self):
+        self.ads.product.delete()
+
+    def test_total_statistics_is_cached(self):
+        """Test that the second call does not hit the database."""
+        statistics = total_statistics()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(total_statistics(), statistics)
+
+    def test_saving_lead_invalidates_cache(self):
+        """Test that a new lead is visible after the transaction commits."""
+        statistics = total_statistics()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            LeadFactory.create(ads=self.ads)
+
+        self.assertEqual(total_statistics().leads_count, statistics.leads_count + 1)
+
+    @override_settings(
+        STATISTICS_APPROXIMATE_COUNTS=True, STATISTICS_APPROXIMATE_MIN_ROWS=0
+    )
+    def test_approximate_counts(self):
+        """Test reading the row counts from the planner statistics."""
+        for _ in range(3):
+            LeadFactory.create(ads=self.ads)
+        with connection.cursor() as cursor:
+            for model in TOTAL_STATISTICS_MODELS:
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+        estimates = estimate_row_counts(TOTAL_STATISTICS_MODELS)
+        self.assertEqual(estimates[Lead], Lead.objects.count())
+
+        with self.assertNumQueries(1):
+            statistics = count_total_statistics()
+        self.assertEqual(statistics.leads_count, estimates[Lead])
+
+
+class DailyRollupTest(TestCase):
+    """Test case for the daily rollup and the statistics for a period."""
+
+    def setUp(self):
+        self.ads = AdvertisingFactory.create()
+        self.other_ads = AdvertisingFactory.create()
+        self.today = timezone.localdate()
+        self.days = [self.today - timedelta(days=ago) for ago in (10, 9, 8)]
+
+    def tearDown(self):
+        self.ads.product.delete()
+        self.other_ads.product.delete()
+
+    def moment(self, day: date) -> datetime:
+        return day_bounds(day, day)[0] + timedelta(hours=12)
+
+    def _create_customer(self, lead, cost: str, day: date) -> Customer:
+        contract = ContractFactory.build()
+        contract.product = lead.ads.product
+        contract.cost = Decimal(cost)
+        contract.name = f"Daily contract {lead.pk}"
+        contract.save()
+        return Customer.objects.create(
+            lead=lead, contract=contract, created_at=self.moment(day)
+        )
+
+    def daily(self, ads, day: date):
+        stats = DailyCampaignStats.objects.filter(advertising=ads, day=day).first()
+        if stats is None:
+            return 0, 0, Decimal(0)
+        return stats.leads_count, stats.customers_count, stats.income
+
+    def test_rollup_and_corrections(self):
+        """Test that the days are rolled up once and corrected when changed."""
+        lead = LeadFactory.create(ads=self.ads, created_at=self.moment(self.days[0]))
+        LeadFactory.create(ads=self.ads, created_at=self.moment(self.days[0]))
+        self._create_customer(lead, "10.00", self.days[1])
+
+        self.assertEqual(rollup_daily_stats(lookback_days=0), 11)
+        self.assertEqual(self.daily(self.ads, self.days[0]), (2, 0, Decimal(0)))
+        self.assertEqual(self.daily(self.ads, self.days[1]), (0, 1, Decimal(10)))
+        self.assertEqual(
+            RollupState.objects.get(name=ROLLUP_NAME).rolled_up_to,
+            self.today - timedelta(days=1),
+        )
+        # Only today is rolled up again
+        self.assertEqual(rollup_daily_stats(lookback_days=0), 1)
+        self.assertEqual(rollup_daily_stats(lookback_days=2), 3)
+
+        lead.ads = self.other_ads
+        lead.save()
+        LeadFactory.create(ads=self.ads, created_at=self.moment(self.days[2]))
+        self.assertEqual(
+            set(DailyStatsCorrection.objects.values_list("day", flat=True)),
+            set(self.days),
+        )
+        call_command("rollup_stats", lookback=0, stdout=StringIO())
+
+        self.assertFalse(DailyStatsCorrection.objects.exists())
+        self.assertEqual(self.daily(self.ads, self.days[0]), (1, 0, Decimal(0)))
+        self.assertEqual(self.daily(self.other_ads, self.days[0]), (1, 0, Decimal(0)))
+        self.assertEqual(self.daily(self.other_ads, self.days[1]), (0, 1, Decimal(10)))
+        self.assertEqual(self.daily(self.ads, self.days[2]), (1, 0, Decimal(0)))
+
+        self.other_ads.delete()
+        rollup_daily_stats(lookback_days=0)
+        self.assertEqual(self.daily(None, self.days[0]), (1, 0, Decimal(0)))
+        self.assertEqual(self.daily(None, self.days[1]), (0, 1, Decimal(10)))
+
+    def test_statistics_for_period(self):
+        """Test that the statistics views read the period from the rollup."""
+        for day in self.days:
+            lead = LeadFactory.create(ads=self.ads, created_at=self.moment(day))
+            self._create_customer(lead, "5.00", day)
+        LeadFactory.create(ads=self.other_ads, created_at=self.moment(self.days[2]))
+        rollup_daily_stats()
+
+        statistics = {
+            ads.name: ads
+            for ads in ads_statistics_for_period(self.days[1], self.days[2])
+        }
+        self.assertEqual(statistics[self.ads.name].leads_count, 2)
+        self.assertEqual(statistics[self.ads.name].customers_count, 2)
+        self.assertEqual(
+            statistics[self.ads.name].profit, round(10 - float(self.ads.budget), 2)
+        )
+        self.assertEqual(statistics[self.other_ads.name].leads_count, 1)
+        self.assertEqual(total_statistics_for_period(last=self.days[0]).leads_count, 1)
+
+        response = self.client.get(
+            reverse("my_statistics:ads_statistics"),
+            {"date_from": self.days[2].isoformat()},
+        )
+        leads = {ads.name: ads.leads_count for ads in response.context["ads"]}
+        self.assertEqual(leads[self.ads.name], 1)
+        response = self.client.get(
+            reverse("my_statistics:total_statistics"),
+            {"date_from": self.days[0].isoformat(), "date_to": "not a date"},
+        )
+        self.assertEqual(response.context["leads_count"], Lead.objects.count())
+
+
+class AdsStatisticsViewTest(TestCase):
+    """Test case for the materialized view of the advertising statistics."""
+
+    def setUp(self):
+        self.ads = AdvertisingFactory.create()
+        lead = LeadFactory.create(ads=self.ads)
+        LeadFactory.create(ads=self.ads)
+        contract = ContractFactory.build()
+        contract.product = self.ads.product
+        contract.cost = Decimal("20.00")
+        contract.name = "Materialized view contract"
+        contract.save()
+        Customer.objects.create(lead=lead, contract=contract)
+
+    def tearDown(self):
+        self.ads.product.delete()
+
+    def test_refresh_stats_view(self):
+        """Test that the refreshed view matches the rollup."""
+        self.assertFalse(AdsStatisticsView.objects.filter(pk=self.ads.pk).exists())
+        before = timezone.now()
+
+        call_command("refresh_stats_view", stdout=StringIO())
+
+        statistics, refreshed_at = ads_statistics_from_view()
+        self.assertEqual(statistics, ads_statistics())
+        self.assertGreaterEqual(refreshed_at, before)
+        row = AdsStatisticsView.objects.get(pk=self.ads.pk)
+        self.ads.refresh_from_db()
+        self.assertEqual((row.leads_count, row.customers_count), (2, 1))
+        self.assertEqual(row.profit, Decimal("20.00") - self.ads.budget)
+
+    def test_first_refresh_time(self):
+        """Test that the first refresh records when it started."""
+        RollupState.objects.filter(name=ADS_STATISTICS_VIEW).delete()
+        started = timezone.now() - timedelta(minutes=5)
+
+        with mock.patch(
+            "my_statistics.business.statistics_logic.timezone.now",
+            return_value=started,
+        ):
+            refresh_ads_statistics_view()
+
+        self.assertEqual(
+            RollupState.objects.get(name=ADS_STATISTICS_VIEW).updated_at, started
+        )
+        self.assertEqual(ads_statistics_from_view()[1], started)
+
+    @override_settings(STATISTICS_ADS_FROM_VIEW=True)
+    def test_page_shows_refresh_time(self):
+        """Test that the page reads the view and tells when it was refreshed."""
+        refresh_ads_statistics_view()
+
+        response = self.client.get(reverse("my_statistics:ads_statistics"))
+
+        self.assertEqual(response.context["ads"], ads_statistics_from_view()[0])
+        self.assertIsNotNone(response.context["refreshed_at"])
+        self.assertContains(response, "Данные на")
+
+
+class GenerateDataCommandTest(TestCase):
+    """Test case for the generate_data command."""
+
+    def generate(self, **kwargs):
+        options = dict(
+            seed=7,
+            services=3,
+            ads=4,
+            leads=50,
+            customers=10,
+            contracts=12,
+            chunk_size=7,
+            stdout=StringIO(),
+        )
+        options.update(kwargs)
+        call_command("generate_data", **options)
+
+    def test_counts_and_uniqueness(self):
+        """Test that the rows are created with unique phones and emails."""
+        self.generate()
+        self.generate(no_copy=True)
+
+        self.assertEqual(Lead.objects.count(), 100)
+        self.assertEqual(Customer.objects.count(), 20)
+        self.assertEqual(Contract.objects.count(), 24)
+        self.assertEqual(Contract.objects.values("doc").distinct().count(), 1)
+        for lead in Lead.objects.all():
+            validate_phone_format(lead.phone)
+            validate_email(lead.email)
+
+    def test_statistics_are_rebuilt(self):
+        """Test that the rollup matches the generated rows."""
+        self.generate()
+
+        for stats in CampaignStats.objects.all():
+            self.assertEqual(
+                stats.leads_count,
+                Lead.objects.filter(ads=stats.advertising_id).count(),
+            )
+            self.assertEqual(
+                stats.customers_count,
+                Customer.objects.filter(lead__ads=stats.advertising_id).count(),
+            )
+
+    def test_daily_statistics_are_rolled_up(self):
+        """Test that the generated history is rolled up by day."""
+        self.generate()
+
+        totals = DailyCampaignStats.objects.aggregate(
+            leads=Sum("leads_count"), customers=Sum("customers_count")
+        )
+        self.assertEqual(totals["leads"], Lead.objects.count())
+        self.assertEqual(totals["customers"], Customer.objects.count())
+        self.assertGreater(
+            DailyCampaignStats.objects.values("day").distinct().count(), 1
+        )
+
+    def test_seed_is_deterministic(self):
+        """Test that the same seed gives the same data."""
+
+        def names():
+            return list(
+                Lead.objects.order_by("-pk").values_list("first_name", "last_name")[:50]
+            )
+
+        self.generate()
+        first = names()
+        self.generate()
+        self.assertEqual(names(), first)
+        self.generate(seed=8)
+        self.assertNotEqual(names(), first)
+
+    def test_inconsistent_counts(self):
+        """Test that more customers than leads are rejected."""
+        with self.assertRaises(CommandError):
+            self.generate(leads=5)
+
+
+class BenchmarkTest(TestCase):
+    """Test case for the benchmark harness."""
+
+    def test_run_benchmarks(self):
+        """Test that every case is measured."""
+        LeadFactory.create()
+
+        results = run_benchmarks(runs=3, warmup=0)
+
+        self.assertIn("view:clients:leads_list", results)
+        self.assertIn("func:ads_statistics", results)
+        for result in results.values():
+            self.assertEqual(result.runs, 3)
+            self.assertLessEqual(result.p50_ms, result.p99_ms)
+        self.assertEqual(results["func:ads_statistics"].queries, 1)
+
+    def test_find_regressions(self):
+        """Test that only the growth above the threshold is reported."""
+        baseline = {
+            "results": {
+                "case": {
+                    "p50_ms": 10,
+                    "p95_ms": 20,
+                    "peak_memory_kb": 100,
+                    "queries": 2,
+                }
+            }
+        }
+        report = {
+            "results": {
+                "case": {
+                    "p50_ms": 11,
+                    "p95_ms": 30,
+                    "peak_memory_kb": 100,
+                    "queries": 3,
+                }
+            }
+        }
+
+        regressions = find_regressions(baseline, report, threshold=0.2)
+
+        self.assertEqual(len(regressions), 2)
+        self.assertIn("p95_ms", regressions[0])
+        self.assertIn("queries", regressions[1])
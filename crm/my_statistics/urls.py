@@ -1,10 +1,11 @@
 from django.urls import path
 
-from .views import get_ads_statistics, get_total_statistics
+from .views import export_ads_statistics, get_ads_statistics, get_total_statistics
 
 app_name = "my_statistics"
 
 urlpatterns = [
     path("ads/statistic/", get_ads_statistics, name="ads_statistics"),
+    path("ads/statistic/export/", export_ads_statistics, name="ads_statistics_export"),
     path("", get_total_statistics, name="total_statistics"),
 ]
@@ -1,21 +1,79 @@
-from typing import Dict, List
+from dataclasses import astuple, fields
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
 
+from django.conf import settings
+from django.contrib.auth.decorators import permission_required
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import render
 
-from .business.statistics_logic import ads_statistics, total_statistics
+from crm.exports import export_response
+
+from .business.statistics_logic import (
+    ads_statistics,
+    ads_statistics_for_period,
+    ads_statistics_from_view,
+    total_statistics,
+    total_statistics_for_period,
+)
 from .business.statistics_models import AdsStatistics, TotalStatistics
+from .forms import StatisticsPeriodForm
+
+
+def _ads_statistics(
+    form: StatisticsPeriodForm,
+) -> Tuple[List[AdsStatistics], Optional[datetime]]:
+    """The statistics on ads and the time of the view they come from."""
+    period: Optional[Tuple[Optional[date], Optional[date]]] = form.period()
+    if period is not None:
+        return ads_statistics_for_period(*period), None
+    if settings.STATISTICS_ADS_FROM_VIEW:
+        return ads_statistics_from_view()
+    return ads_statistics(), None
 
 
 def get_ads_statistics(request: HttpRequest) -> HttpResponse:
-    """View function for getting statistics on ads."""
-    statistics: List[AdsStatistics] = ads_statistics()
-    context: Dict[str, List[AdsStatistics]] = {"ads": statistics}
+    """
+    View function for getting statistics on ads.
+
+    With date_from and/or date_to the statistics are for the period.
+    With STATISTICS_ADS_FROM_VIEW they come from the materialized view,
+    and the page tells when it was refreshed.
+    """
+    form = StatisticsPeriodForm(request.GET)
+    statistics, refreshed_at = _ads_statistics(form)
+    context: Dict[str, Any] = {
+        "ads": statistics,
+        "period_form": form,
+        "refreshed_at": refreshed_at,
+    }
     return render(request, "my_statistics/ads-statistic.html", context=context)
 
 
 def get_total_statistics(request: HttpRequest) -> HttpResponse:
-    """View function for getting total statistics."""
-    statistics: TotalStatistics = total_statistics()
-    context: Dict[str, int] = statistics.to_dict()
+    """
+    View function for getting total statistics.
+
+    With date_from and/or date_to the leads and the customers are counted
+    for the period.
+    """
+    form = StatisticsPeriodForm(request.GET)
+    period: Optional[Tuple[Optional[date], Optional[date]]] = form.period()
+    statistics: TotalStatistics = (
+        total_statistics() if period is None else total_statistics_for_period(*period)
+    )
+    context: Dict[str, Any] = statistics.to_dict()
+    context["period_form"] = form
     return render(request, "my_statistics/index.html", context=context)
+
+
+@permission_required("advertising.view_advertising")
+def export_ads_statistics(request: HttpRequest) -> HttpResponse:
+    """
+    View func sending the statistics on ads of the page (with the same
+    parameters) as CSV or NDJSON.
+    """
+    statistics, _ = _ads_statistics(StatisticsPeriodForm(request.GET))
+    columns: List[str] = [field.name for field in fields(AdsStatistics)]
+    rows = (astuple(ads) for ads in statistics)
+    return export_response(request, "ads-statistics", columns, rows)
@@ -0,0 +1,82 @@
+"""
+Authentication backend caching users and their permissions.
+
+ModelBackend caches permissions only on the user object, which lives for
+one request, so every request queries the user, group and permission
+tables again. CachedModelBackend keeps the user row and the resolved set
+of permissions in the shared cache. The permission entries are keyed by
+the user id, the superuser flag (a superuser has all the permissions)
+and a version that is bumped whenever group membership, group permissions
+or user permissions change (see myauth.signals).
+
+The invalidation must reach every worker, so without a shared cache
+(AUTH_CACHE_SHARED) the backend is ModelBackend, caching the permissions
+on the user object of the request only.
+"""
+
+import time
+from typing import Optional, Set
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+PERMISSIONS_VERSION_KEY = "auth:permissions:version"
+
+
+def _user_key(user_id) -> str:
+    return f"auth:user:{user_id}"
+
+
+def get_permissions_version() -> int:
+    """Get the current version of the permissions."""
+    version: Optional[int] = cache.get(PERMISSIONS_VERSION_KEY)
+    if version is None:
+        cache.add(PERMISSIONS_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(PERMISSIONS_VERSION_KEY)
+    return version
+
+
+def bump_permissions_version() -> None:
+    """Invalidate the cached permissions of all users."""
+    try:
+        cache.incr(PERMISSIONS_VERSION_KEY)
+    except ValueError:
+        cache.add(PERMISSIONS_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def forget_user(user_id) -> None:
+    """Drop the cached row of the user."""
+    cache.delete(_user_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend reading users and permissions through the cache."""
+
+    def get_user(self, user_id):
+        if not settings.AUTH_CACHE_SHARED:
+            return super().get_user(user_id)
+        key: str = _user_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, settings.AUTH_CACHE_TIMEOUT)
+        return user if user is not None and self.user_can_authenticate(user) else None
+
+    def get_all_permissions(self, user_obj, obj=None) -> Set[str]:
+        if not settings.AUTH_CACHE_SHARED:
+            return super().get_all_permissions(user_obj, obj)
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, "_perm_cache"):
+            key: str = (
+                f"auth:permissions:{user_obj.pk}:{int(user_obj.is_superuser)}"
+                f":{get_permissions_version()}"
+            )
+            perms: Optional[Set[str]] = cache.get(key)
+            if perms is None:
+                perms = super().get_all_permissions(user_obj)
+                cache.set(key, perms, settings.AUTH_CACHE_TIMEOUT)
+            user_obj._perm_cache = perms
+        return user_obj._perm_cache
@@ -0,0 +1,16 @@
+from django.core.management import BaseCommand, CommandError
+from myauth.utils import provision_roles
+
+
+class Command(BaseCommand):
+    help = "Create the groups of myauth.roles.ROLES and grant their permissions"
+
+    def handle(self, *args, **kwargs):
+        try:
+            result = provision_roles()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(
+            f"Groups created: {result.groups_created},"
+            f" permissions granted: {result.permissions_added}"
+        )
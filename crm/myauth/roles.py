@@ -0,0 +1,27 @@
+"""
+Roles of the CRM: groups and the permissions they grant.
+
+The table is applied to the database by the provision_roles command
+(see myauth.utils.provision_roles).
+"""
+
+from typing import Dict, Tuple
+
+
+def _crud(app_label: str, model: str) -> Tuple[str, ...]:
+    return tuple(
+        f"{app_label}.{action}_{model}"
+        for action in ("add", "change", "delete", "view")
+    )
+
+
+ROLES: Dict[str, Tuple[str, ...]] = {
+    "operators": _crud("clients", "lead"),
+    "marketers": _crud("services", "service") + _crud("advertising", "advertising"),
+    "managers": (
+        *_crud("contracts", "contract"),
+        "clients.view_lead",
+        "clients.create_customer_from_lead",
+        *_crud("clients", "customer"),
+    ),
+}
@@ -0,0 +1,41 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .backends import bump_permissions_version, forget_user
+
+User = get_user_model()
+
+
+def invalidate_permissions() -> None:
+    # Bump right away for this process and once more after the commit, so
+    # a concurrent request that read the old rows before the commit cannot
+    # keep them cached under the new version
+    bump_permissions_version()
+    transaction.on_commit(bump_permissions_version)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def permissions_changed(sender, action: str, **kwargs) -> None:
+    """Invalidate the cached permissions after group or permission changes."""
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_permissions()
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def permission_owner_deleted(sender, **kwargs) -> None:
+    """Deleting rows cascades to the through tables without m2m_changed."""
+    invalidate_permissions()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs) -> None:
+    """Drop the cached row, for example after a password change."""
+    forget_user(instance.pk)
+    transaction.on_commit(lambda: forget_user(instance.pk))
@@ -0,0 +1,148 @@
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .backends import CachedModelBackend
+from .roles import ROLES
+from .utils import create_group_operators, provision_roles
+
+
+class CachedModelBackendTest(TestCase):
+    """Test case class for testing CachedModelBackend."""
+
+    def setUp(self):
+        cache.clear()
+        self.credentials = dict(username="test", password="test")
+        self.user = User.objects.create_user(**self.credentials)
+        create_group_operators()
+        self.group = Group.objects.get(name="operators")
+        self.user.groups.add(self.group)
+        self.backend = CachedModelBackend()
+
+    def test_warm_cache_has_no_queries(self):
+        """Test that a warm cache resolves the user and permissions."""
+        user = self.backend.get_user(self.user.pk)
+        self.assertTrue(user.has_perm("clients.view_lead"))
+
+        with self.assertNumQueries(0):
+            user = self.backend.get_user(self.user.pk)
+            self.assertTrue(user.has_perm("clients.view_lead"))
+            self.assertFalse(user.has_perm("contracts.view_contract"))
+
+    def test_request_has_no_auth_queries(self):
+        """Test that a warm request does not query the auth tables."""
+        self.client.login(**self.credentials)
+        url = reverse("clients:leads_list")
+        self.client.get(url)
+
+        with self.assertNumQueries(2):  # the session and the leads page
+            self.client.get(url)
+
+    def test_group_permissions_change(self):
+        """Test that changing the group permissions invalidates the cache."""
+        self.assertFalse(
+            self.backend.get_user(self.user.pk).has_perm("contracts.view_contract")
+        )
+        self.group.permissions.add(Permission.objects.get(codename="view_contract"))
+        self.assertTrue(
+            self.backend.get_user(self.user.pk).has_perm("contracts.view_contract")
+        )
+
+    def test_group_membership_change(self):
+        """Test that leaving the group invalidates the cache."""
+        self.assertTrue(
+            self.backend.get_user(self.user.pk).has_perm("clients.view_lead")
+        )
+        self.user.groups.remove(self.group)
+        self.assertFalse(
+            self.backend.get_user(self.user.pk).has_perm("clients.view_lead")
+        )
+
+    def test_user_change(self):
+        """Test that a deactivated user is not taken from the cache."""
+        self.backend.get_user(self.user.pk)
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+    def test_superuser_change(self):
+        """Test that a former superuser loses the cached permissions."""
+        self.user.is_superuser = True
+        self.user.save()
+        self.assertIn(
+            "contracts.view_contract",
+            self.backend.get_all_permissions(self.backend.get_user(self.user.pk)),
+        )
+        self.user.is_superuser = False
+        self.user.save()
+        self.assertNotIn(
+            "contracts.view_contract",
+            self.backend.get_all_permissions(self.backend.get_user(self.user.pk)),
+        )
+
+
+class LocalCacheTest(TestCase):
+    """Test case class for testing the backend without a shared cache."""
+
+    @override_settings(AUTH_CACHE_SHARED=False)
+    def test_permissions_are_not_cached_across_requests(self):
+        """Test that a revoked permission is not taken from a local cache."""
+        cache.clear()
+        user = User.objects.create_user(username="test", password="test")
+        create_group_operators()
+        group = Group.objects.get(name="operators")
+        user.groups.add(group)
+        backend = CachedModelBackend()
+        self.assertTrue(backend.get_user(user.pk).has_perm("clients.view_lead"))
+
+        # Another worker revokes the permission, the signals do not reach here
+        Group.permissions.through.objects.filter(group=group).delete()
+
+        self.assertFalse(backend.get_user(user.pk).has_perm("clients.view_lead"))
+
+
+class ProvisionRolesTest(TestCase):
+    """Test case class for testing provision_roles."""
+
+    def test_provision_roles(self):
+        """Test that the groups get exactly the permissions of the roles."""
+        result = provision_roles()
+
+        self.assertEqual(result.groups_created, len(ROLES))
+        for name, perms in ROLES.items():
+            group = Group.objects.get(name=name)
+            self.assertEqual(
+                {
+                    f"{perm.content_type.app_label}.{perm.codename}"
+                    for perm in group.permissions.select_related("content_type")
+                },
+                set(perms),
+            )
+
+    def test_rerun_is_cheap(self):
+        """Test that a rerun with nothing to change makes two queries."""
+        provision_roles()
+        with self.assertNumQueries(2):
+            result = provision_roles()
+        self.assertEqual(result.groups_created, 0)
+        self.assertEqual(result.permissions_added, 0)
+
+    def test_missing_permissions_are_added(self):
+        """Test that only the missing permissions are granted."""
+        provision_roles()
+        group = Group.objects.get(name="operators")
+        group.permissions.remove(Permission.objects.get(codename="view_lead"))
+        extra = Permission.objects.get(codename="view_service")
+        group.permissions.add(extra)
+
+        result = provision_roles()
+
+        self.assertEqual(result.permissions_added, 1)
+        self.assertTrue(group.permissions.filter(codename="view_lead").exists())
+        self.assertTrue(group.permissions.filter(pk=extra.pk).exists())
+
+    def test_unknown_permission(self):
+        """Test that an unknown permission is reported."""
+        with self.assertRaisesMessage(ValueError, "clients.fly_lead"):
+            provision_roles({"operators": ("clients.fly_lead",)})
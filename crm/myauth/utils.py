@@ -1,82 +1,110 @@
-from clients.models import Lead
-from django.contrib.auth.models import Group, Permission
-from django.contrib.contenttypes.models import ContentType
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Set, Tuple
 
+from django.contrib.auth.models import Group, Permission
+from django.db import transaction
 
-def create_group_operators():
-    """Create 'operators' group."""
-    operators, _ = Group.objects.get_or_create(name="operators")
-    per_add_lead = Permission.objects.get(codename="add_lead")
-    per_change_lead = Permission.objects.get(codename="change_lead")
-    per_delete_lead = Permission.objects.get(codename="delete_lead")
-    per_view_lead = Permission.objects.get(codename="view_lead")
+from .roles import ROLES
+from .signals import invalidate_permissions
 
-    operators.permissions.add(per_add_lead)
-    operators.permissions.add(per_change_lead)
-    operators.permissions.add(per_delete_lead)
-    operators.permissions.add(per_view_lead)
 
-    operators.save()
+@dataclass
+class ProvisionResult:
+    """Changes made by provision_roles."""
 
+    groups_created: int = 0
+    permissions_added: int = 0
 
-def create_group_marketers():
-    """Create 'marketers' group."""
-    marketers, _ = Group.objects.get_or_create(name="marketers")
-    per_add_service = Permission.objects.get(codename="add_service")
-    per_change_service = Permission.objects.get(codename="change_service")
-    per_delete_service = Permission.objects.get(codename="delete_service")
-    per_view_service = Permission.objects.get(codename="view_service")
 
-    per_add_advertising = Permission.objects.get(codename="add_advertising")
-    per_change_advertising = Permission.objects.get(codename="change_advertising")
-    per_delete_advertising = Permission.objects.get(codename="delete_advertising")
-    per_view_advertising = Permission.objects.get(codename="view_advertising")
+def resolve_permissions(perms: Iterable[str]) -> Dict[str, int]:
+    """
+    Map "app_label.codename" strings to permission pks with one query.
 
-    marketers.permissions.add(per_add_service)
-    marketers.permissions.add(per_change_service)
-    marketers.permissions.add(per_delete_service)
-    marketers.permissions.add(per_view_service)
+    :raise ValueError: If some of the permissions do not exist.
+    """
+    perms = set(perms)
+    codenames: Set[str] = {perm.split(".", 1)[1] for perm in perms}
+    resolved: Dict[str, int] = {
+        f"{app_label}.{codename}": pk
+        for pk, app_label, codename in Permission.objects.filter(
+            codename__in=codenames
+        ).values_list("pk", "content_type__app_label", "codename")
+    }
+    unknown: Set[str] = perms - resolved.keys()
+    if unknown:
+        raise ValueError(f"Unknown permissions: {', '.join(sorted(unknown))}")
+    return {perm: resolved[perm] for perm in perms}
 
-    marketers.permissions.add(per_add_advertising)
-    marketers.permissions.add(per_change_advertising)
-    marketers.permissions.add(per_delete_advertising)
-    marketers.permissions.add(per_view_advertising)
 
-    marketers.save()
+def provision_roles(roles: Dict[str, Tuple[str, ...]] = ROLES) -> ProvisionResult:
+    """
+    Create the groups of the roles and grant them the missing permissions.
 
+    Permissions granted to the groups in other ways (for example, in the admin
+    panel) are kept. When nothing is missing, only two queries are made:
+    one for the permissions and one for the groups with their permissions.
 
-def create_group_managers():
-    """Create 'marketers' group."""
-    managers, _ = Group.objects.get_or_create(name="managers")
-    per_add_contract = Permission.objects.get(codename="add_contract")
-    per_change_contract = Permission.objects.get(codename="change_contract")
-    per_delete_contract = Permission.objects.get(codename="delete_contract")
-    per_view_contract = Permission.objects.get(codename="view_contract")
-    per_view_lead = Permission.objects.get(codename="view_lead")
-
-    content_type = ContentType.objects.get_for_model(Lead)
-    per_create_customer_from_lead, _ = Permission.objects.get_or_create(
-        codename="create_customer_from_lead",
-        name="Can create customer from lead",
-        content_type=content_type,
+    :param roles: Group names mapped to "app_label.codename" permissions.
+    :raise ValueError: If some of the permissions do not exist.
+    """
+    perm_pks: Dict[str, int] = resolve_permissions(
+        perm for perms in roles.values() for perm in perms
     )
 
-    per_add_customer = Permission.objects.get(codename="add_customer")
-    per_change_customer = Permission.objects.get(codename="change_customer")
-    per_delete_customer = Permission.objects.get(codename="delete_customer")
-    per_view_customer = Permission.objects.get(codename="view_customer")
+    group_pks: Dict[str, int] = dict()
+    granted: Set[Tuple[int, int]] = set()
+    for group_pk, name, perm_pk in Group.objects.filter(
+        name__in=roles.keys()
+    ).values_list("pk", "name", "permissions"):
+        group_pks[name] = group_pk
+        if perm_pk is not None:
+            granted.add((group_pk, perm_pk))
+
+    result = ProvisionResult()
+    missing_groups: List[str] = [name for name in roles if name not in group_pks]
+    if not missing_groups and all(
+        (group_pks[name], perm_pks[perm]) in granted
+        for name, perms in roles.items()
+        for perm in perms
+    ):
+        return result
+
+    with transaction.atomic():
+        if missing_groups:
+            # Another process may create the same groups at the same time
+            Group.objects.bulk_create(
+                [Group(name=name) for name in missing_groups], ignore_conflicts=True
+            )
+            group_pks.update(
+                Group.objects.filter(name__in=missing_groups).values_list("name", "pk")
+            )
+            result.groups_created = len(missing_groups)
+
+        through = Group.permissions.through
+        missing = [
+            through(group_id=group_pks[name], permission_id=perm_pks[perm])
+            for name, perms in roles.items()
+            for perm in set(perms)
+            if (group_pks[name], perm_pks[perm]) not in granted
+        ]
+        if missing:
+            through.objects.bulk_create(missing, ignore_conflicts=True)
+            result.permissions_added = len(missing)
+            # bulk_create does not send m2m_changed
+            invalidate_permissions()
+    return result
 
-    managers.permissions.add(per_add_contract)
-    managers.permissions.add(per_change_contract)
-    managers.permissions.add(per_delete_contract)
-    managers.permissions.add(per_view_contract)
 
-    managers.permissions.add(per_view_lead)
-    managers.permissions.add(per_create_customer_from_lead)
+def create_group_operators():
+    """Create 'operators' group."""
+    provision_roles({"operators": ROLES["operators"]})
 
-    managers.permissions.add(per_add_customer)
-    managers.permissions.add(per_change_customer)
-    managers.permissions.add(per_delete_customer)
-    managers.permissions.add(per_view_customer)
 
-    managers.save()
+def create_group_marketers():
+    """Create 'marketers' group."""
+    provision_roles({"marketers": ROLES["marketers"]})
+
+
+def create_group_managers():
+    """Create 'managers' group."""
+    provision_roles({"managers": ROLES["managers"]})
@@ -0,0 +1,90 @@
+/*
+ * A form with <input data-upload-url="..."> (contracts.forms.DocumentUploadForm)
+ * sends the chosen document in chunks to the upload API before it is
+ * submitted, then submits the id of the upload instead of the file.
+ * A failed chunk is retried from the offset the server reports. If the
+ * upload cannot be opened (no permission to upload), the form is sent
+ * with the file as before.
+ */
+document.querySelectorAll("input[data-upload-url]").forEach(function (upload) {
+    const form = upload.form;
+    const file = form.querySelector("input[type=file][name=doc]");
+    if (file === null) {
+        return;
+    }
+    const chunkSize = Number(upload.dataset.chunkSize);
+    const csrf = form.querySelector("input[name=csrfmiddlewaretoken]").value;
+    const retries = 5;
+
+    function request(url, options) {
+        options.credentials = "same-origin";
+        options.headers = Object.assign({"X-CSRFToken": csrf}, options.headers);
+        return fetch(url, options).then(function (response) {
+            return response.json().catch(function () {
+                return {};
+            }).then(function (data) {
+                return {status: response.status, data: data};
+            });
+        });
+    }
+
+    function sendFrom(session, offset, attempt) {
+        if (offset >= session.size) {
+            return Promise.resolve(session);
+        }
+        const chunk = file.files[0].slice(offset, offset + chunkSize);
+        return request(session.url, {
+            method: "PUT",
+            headers: {"Upload-Offset": String(offset)},
+            body: chunk,
+        }).then(function (result) {
+            if (result.status === 200) {
+                return sendFrom(session, result.data.offset, 0);
+            }
+            if (result.status === 409 && attempt < retries) {
+                return sendFrom(session, result.data.offset, attempt + 1);
+            }
+            throw new Error(result.data.error);
+        }, function (error) {
+            if (attempt >= retries) {
+                throw error;
+            }
+            // The connection dropped, resume from what the server has
+            return request(session.url, {method: "GET"}).then(function (result) {
+                return sendFrom(session, result.data.offset, attempt + 1);
+            });
+        });
+    }
+
+    form.addEventListener("submit", function (event) {
+        if (file.files.length === 0 || upload.value) {
+            return;
+        }
+        event.preventDefault();
+        const body = new FormData();
+        body.append("filename", file.files[0].name);
+        body.append("size", String(file.files[0].size));
+        form.querySelectorAll("[type=submit]").forEach(function (button) {
+            button.disabled = true;
+        });
+        request(upload.dataset.uploadUrl, {method: "POST", body: body})
+            .then(function (result) {
+                if (result.status !== 201) {
+                    form.submit();
+                    return;
+                }
+                return sendFrom(result.data, result.data.offset, 0)
+                    .then(function (session) {
+                        upload.value = session.id;
+                        file.value = "";
+                        form.submit();
+                    });
+            })
+            .catch(function (error) {
+                form.querySelectorAll("[type=submit]").forEach(function (button) {
+                    button.disabled = false;
+                });
+                alert("Не удалось загрузить документ: " + error.message);
+            });
+    });
+});
@@ -0,0 +1,54 @@
+/*
+ * Options of <select data-lookup-url="..."> (crm.lookups.LazySelect)
+ * are loaded from the lookup endpoint page by page while the user types.
+ */
+document.querySelectorAll("select[data-lookup-url]").forEach(function (select) {
+    const search = document.createElement("input");
+    search.type = "search";
+    search.className = "form-control mb-1";
+    search.placeholder = "Поиск...";
+    select.before(search);
+
+    const more = document.createElement("button");
+    more.type = "button";
+    more.className = "btn btn-link btn-sm d-none";
+    more.textContent = "Показать ещё";
+    select.after(more);
+
+    let next = null;
+    let timer = null;
+
+    function load(append) {
+        const url = new URL(select.dataset.lookupUrl, window.location.origin);
+        url.searchParams.set("q", search.value);
+        if (append && next !== null) {
+            url.searchParams.set("after", next);
+        }
+        fetch(url, {credentials: "same-origin"})
+            .then(function (response) { return response.json(); })
+            .then(function (data) {
+                const selected = select.value;
+                if (!append) {
+                    Array.from(select.options).forEach(function (option) {
+                        if (option.value && option.value !== selected) {
+                            option.remove();
+                        }
+                    });
+                }
+                data.results.forEach(function (item) {
+                    if (String(item.id) !== selected) {
+                        select.add(new Option(item.text, item.id));
+                    }
+                });
+                next = data.next;
+                more.classList.toggle("d-none", next === null);
+            });
+    }
+
+    search.addEventListener("input", function () {
+        clearTimeout(timer);
+        timer = setTimeout(function () { load(false); }, 250);
+    });
+    more.addEventListener("click", function () { load(true); });
+    select.addEventListener("focus", function () { load(false); }, {once: true});
+});